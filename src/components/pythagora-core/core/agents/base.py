@@ -4,6 +4,8 @@ from core.agents.response import AgentResponse
 from core.config import get_config
 from core.db.models import ProjectState
 from core.llm.base import BaseLLMClient, LLMError
+from core.llm.cache import get_response_cache
+from core.llm.scheduler import RequestPriority
 from core.log import get_logger
 from core.proc.process_manager import ProcessManager
 from core.state.state_manager import StateManager
@@ -167,7 +169,7 @@ class BaseAgent:
 
         return False
 
-    def get_llm(self, name=None, stream_output=False) -> Callable:
+    def get_llm(self, name=None, stream_output=False, priority: Optional[RequestPriority] = None) -> Callable:
         """
         Get a new instance of the agent-specific LLM client.
 
@@ -176,7 +178,13 @@ class BaseAgent:
         can be overridden in case the agent needs to use a different
         model configuration.
 
+        The client instance is cheap to create, as the underlying HTTP
+        connection pool is shared through `core.llm.client_registry`.
+
         :param name: Name of the agent for configuration (default: class name).
+        :param stream_output: Whether to stream the response to the UI.
+        :param priority: Request priority when waiting for rate limits
+            (default: interactive if streaming the output, normal otherwise).
         :return: LLM client for the agent.
         """
 
@@ -188,7 +196,15 @@ class BaseAgent:
         llm_config = config.llm_for_agent(name)
         client_class = BaseLLMClient.for_provider(llm_config.provider)
         stream_handler = self.stream_handler if stream_output else None
-        llm_client = client_class(llm_config, stream_handler=stream_handler, error_handler=self.error_handler)
+        if priority is None:
+            priority = RequestPriority.INTERACTIVE if stream_output else RequestPriority.NORMAL
+        llm_client = client_class(
+            llm_config,
+            stream_handler=stream_handler,
+            error_handler=self.error_handler,
+            cache=get_response_cache(config.llm_cache),
+            priority=priority,
+        )
 
         async def client(convo, **kwargs) -> Any:
             """
@@ -11,6 +11,7 @@ from core.agents.mixins import FileDiffMixin
 from core.agents.response import AgentResponse, ResponseType
 from core.config import CODE_MONKEY_AGENT_NAME, CODE_REVIEW_AGENT_NAME, DESCRIBE_FILES_AGENT_NAME
 from core.llm.parser import JSONParser, OptionalCodeBlockParser
+from core.llm.scheduler import RequestPriority
 from core.log import get_logger
 
 log = get_logger(__name__)
@@ -136,22 +137,25 @@ class CodeMonkey(FileDiffMixin, BaseAgent):
         }
 
     async def describe_files(self) -> AgentResponse:
-        llm = self.get_llm(DESCRIBE_FILES_AGENT_NAME)
+        llm = self.get_llm(DESCRIBE_FILES_AGENT_NAME, priority=RequestPriority.BACKGROUND)
         to_describe = {
             file.path: file.content.content for file in self.current_state.files if not file.meta.get("description")
         }
 
-        for file in self.next_state.files:
+        for file in list(self.next_state.files):
             content = to_describe.get(file.path)
             if content is None:
                 continue
 
             if content == "":
-                file.meta = {
-                    **file.meta,
-                    "description": "Empty file",
-                    "references": [],
-                }
+                self.next_state.update_file_meta(
+                    file.path,
+                    {
+                        **file.meta,
+                        "description": "Empty file",
+                        "references": [],
+                    },
+                )
                 continue
 
             log.debug(f"Describing file {file.path}")
@@ -166,11 +170,14 @@ class CodeMonkey(FileDiffMixin, BaseAgent):
             )
             llm_response: FileDescription = await llm(convo, parser=JSONParser(spec=FileDescription))
 
-            file.meta = {
-                **file.meta,
-                "description": llm_response.summary,
-                "references": llm_response.references,
-            }
+            self.next_state.update_file_meta(
+                file.path,
+                {
+                    **file.meta,
+                    "description": llm_response.summary,
+                    "references": llm_response.references,
+                },
+            )
         return AgentResponse.done(self)
 
     # ------------------------------
@@ -1,22 +1,57 @@
 import json
 import sys
-from copy import deepcopy
 from typing import TYPE_CHECKING, Optional
 
 import jsonref
+from jinja2 import FileSystemBytecodeCache
 from pydantic import BaseModel
 
 from core.config import get_config
 from core.llm.convo import Convo
 from core.llm.prompt import JinjaFileTemplate
+from core.llm.token_budget import FileTokenBudget, count_file_lines
 from core.log import get_logger
 
 if TYPE_CHECKING:
     from core.agents.response import BaseAgent
+    from core.db.models import File
 
 log = get_logger(__name__)
 
 
+# Dereferenced JSON schema text for models used with `AgentConvo.require_schema`, per model
+_schema_texts: dict[type[BaseModel], str] = {}
+
+
+def _schema_text(model: type[BaseModel]) -> str:
+    """
+    Get the simplified JSON schema of the model, as shown to the LLM.
+
+    Building and dereferencing the schema is slow, and the models are static,
+    so the result is computed once per model.
+
+    :param model: Pydantic model.
+    :return: JSON schema text.
+    """
+    schema_txt = _schema_texts.get(model)
+    if schema_txt is not None:
+        return schema_txt
+
+    def remove_defs(d):
+        if isinstance(d, dict):
+            return {k: remove_defs(v) for k, v in d.items() if k != "$defs"}
+        elif isinstance(d, list):
+            return [remove_defs(v) for v in d]
+        else:
+            return d
+
+    # We want to make the schema as simple as possible to avoid confusing the LLM,
+    # so we remove (dereference) all the refs we can and show the "final" schema version.
+    schema_txt = json.dumps(remove_defs(jsonref.loads(json.dumps(model.model_json_schema()))))
+    _schema_texts[model] = schema_txt
+    return schema_txt
+
+
 class AgentConvo(Convo):
     prompt_loader: Optional[JinjaFileTemplate] = None
 
@@ -31,12 +66,24 @@ class AgentConvo(Convo):
             log.warning(f"Agent {agent.__class__.__name__} has no system prompt: {err}")
 
     @classmethod
-    def _init_templates(cls):
+    def init_templates(cls):
+        """
+        Set up the prompt template loader shared by all conversations.
+
+        All the templates are compiled on first use, and the rendered
+        partials (eg. file listings) are memoized so they're not rendered
+        again by other agents working on the same project state.
+        """
         if cls.prompt_loader is not None:
             return
 
         config = get_config()
-        cls.prompt_loader = JinjaFileTemplate(config.prompt.paths)
+        cls.prompt_loader = JinjaFileTemplate(
+            config.prompt.paths,
+            bytecode_cache=FileSystemBytecodeCache(config.prompt.cache_dir),
+            memoize_prefix="partials/",
+        )
+        cls.prompt_loader.precompile()
 
     def _get_default_template_vars(self) -> dict:
         if sys.platform == "win32":
@@ -61,20 +108,84 @@ class AgentConvo(Convo):
         """
         return json.loads(json.dumps(context, default=lambda o: str(o)))
 
+    def _prioritized_files(self) -> list["File"]:
+        """
+        Files that may be included in the prompt, most important first.
+
+        Mirrors the selection in `partials/files_list.prompt`: relevant files
+        if there are any, otherwise all the client and server files. Files
+        modified in the current task come first, then the relevant files
+        (in the order they were marked relevant), then everything else.
+        """
+        state = self.agent_instance.current_state
+        relevant_files = state.relevant_files or []
+        modified_files = state.modified_files or {}
+
+        if relevant_files:
+            files = state.relevant_file_objects
+        else:
+            files = [file for file in state.files if "client/" in file.path or "server/" in file.path]
+
+        def priority(file: "File") -> tuple[int, int]:
+            if file.path in modified_files:
+                return (0, 0)
+            if file.path in relevant_files:
+                return (1, relevant_files.index(file.path))
+            return (2, 0)
+
+        return sorted(files, key=priority)
+
+    def _files_token_budget(self) -> Optional[int]:
+        config = get_config()
+        return config.llm_for_agent(self.agent_instance.__class__.__name__).files_token_budget
+
     def render(self, name: str, **kwargs) -> str:
-        self._init_templates()
+        self.init_templates()
 
         kwargs.update(self._get_default_template_vars())
 
+        # The file contents are fitted into the agent's token budget lazily,
+        # only if the template actually includes them.
+        max_tokens = self._files_token_budget()
+        budget: Optional[FileTokenBudget] = None
+
+        def file_content(file: "File") -> str:
+            nonlocal budget
+            if max_tokens is None:
+                return file.content.content
+            if budget is None:
+                budget = FileTokenBudget(self._prioritized_files(), max_tokens)
+            return budget.content(file)
+
+        def file_lines(file: "File") -> int:
+            # Number of lines in the full content, even if only the outline or description is included
+            return count_file_lines(file)
+
+        # Used as part of the key for memoized partials that include file contents
+        file_content.cache_key = max_tokens if max_tokens is not None else "full"
+        file_lines.cache_key = "lines"
+        kwargs["file_content"] = file_content
+        kwargs["file_lines"] = file_lines
+
         # Jinja uses "/" even in Windows
         template_name = f"{self.agent_instance.agent_type}/{name}.prompt"
         log.debug(f"Loading template {template_name}")
-        return self.prompt_loader(template_name, **kwargs)
+        prompt = self.prompt_loader(template_name, **kwargs)
+
+        if budget is not None:
+            degraded = budget.degraded
+            log.debug(
+                f"File contents in {template_name}: {budget.tokens_before} tokens before, "
+                f"{budget.tokens_after} tokens after fitting into the budget of {max_tokens} tokens"
+                + (f" ({len(degraded)} files reduced: {', '.join(degraded)})" if degraded else "")
+            )
+
+        return prompt
 
     def template(self, template_name: str, **kwargs) -> "AgentConvo":
         message = self.render(template_name, **kwargs)
         self.user(message)
-        self.prompt_log.append(
+        self.log_prompt(
             {
                 "template": f"{self.agent_instance.agent_type}/{template_name}",
                 "context": self._serialize_prompt_context(kwargs),
@@ -82,12 +193,6 @@ class AgentConvo(Convo):
         )
         return self
 
-    def fork(self) -> "AgentConvo":
-        child = AgentConvo(self.agent_instance)
-        child.messages = deepcopy(self.messages)
-        child.prompt_log = deepcopy(self.prompt_log)
-        return child
-
     def trim(self, trim_index: int, trim_count: int) -> "AgentConvo":
         """
         Trim the conversation starting from the given index by 1 message.
@@ -98,17 +203,7 @@ class AgentConvo(Convo):
         return self
 
     def require_schema(self, model: BaseModel) -> "AgentConvo":
-        def remove_defs(d):
-            if isinstance(d, dict):
-                return {k: remove_defs(v) for k, v in d.items() if k != "$defs"}
-            elif isinstance(d, list):
-                return [remove_defs(v) for v in d]
-            else:
-                return d
-
-        # We want to make the schema as simple as possible to avoid confusing the LLM,
-        # so we remove (dereference) all the refs we can and show the "final" schema version.
-        schema_txt = json.dumps(remove_defs(jsonref.loads(json.dumps(model.model_json_schema()))))
+        schema_txt = _schema_text(model)
         self.user(
             f"IMPORTANT: Your response MUST conform to this JSON schema:\n```\n{schema_txt}\n```."
             f"YOU MUST NEVER add any additional fields to your response, and NEVER add additional preamble like 'Here is your JSON'."
@@ -213,7 +213,7 @@ class Orchestrator(BaseAgent, GitMixin):
         log.info("Checking for offline changes.")
         modified_files = await self.state_manager.get_modified_files_with_content()
 
-        if self.state_manager.workspace_is_empty():
+        if await self.state_manager.workspace_is_empty():
             # NOTE: this will currently get triggered on a new project, but will do
             # nothing as there's no files in the database.
             log.info("Detected empty workspace, restoring state from the database.")
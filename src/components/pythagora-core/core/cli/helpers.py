@@ -10,6 +10,7 @@ from uuid import UUID
 from core.config import Config, LLMProvider, LocalIPCConfig, ProviderConfig, UIAdapter, get_config, loader
 from core.config.env_importer import import_from_dotenv
 from core.config.version import get_version
+from core.db.audit import audit_queries
 from core.db.session import SessionManager
 from core.db.setup import run_migrations
 from core.log import setup
@@ -87,6 +88,7 @@ def parse_arguments() -> Namespace:
         --version: Show the version and exit
         --list: List all projects
         --list-json: List all projects in JSON format
+        --audit-indexes: Check the query plans of the common database queries for full table scans
         --project: Load a specific project
         --branch: Load a specific branch
         --step: Load a specific step in a project/branch
@@ -111,6 +113,11 @@ def parse_arguments() -> Namespace:
     parser.add_argument("--version", action="version", version=version)
     parser.add_argument("--list", help="List all projects", action="store_true")
     parser.add_argument("--list-json", help="List all projects in JSON format", action="store_true")
+    parser.add_argument(
+        "--audit-indexes",
+        help="Check the query plans of the common database queries for full table scans",
+        action="store_true",
+    )
     parser.add_argument("--project", help="Load a specific project", type=UUID, required=False)
     parser.add_argument("--branch", help="Load a specific branch", type=UUID, required=False)
     parser.add_argument("--step", help="Load a specific step in a project/branch", type=int, required=False)
@@ -199,7 +206,6 @@ async def list_projects_json(db: SessionManager):
 
     data = []
     for project in projects:
-        last_updated = None
         p = {
             "name": project.name,
             "id": project.id.hex,
@@ -211,18 +217,16 @@ async def list_projects_json(db: SessionManager):
                 "id": branch.id.hex,
                 "steps": [],
             }
-            for state in branch.states:
-                if not last_updated or state.created_at > last_updated:
-                    last_updated = state.created_at
+            for step in branch.steps:
                 s = {
-                    "name": state.action or f"Step #{state.step_index}",
-                    "step": state.step_index,
+                    "name": step.action or f"Step #{step.step_index}",
+                    "step": step.step_index,
                 }
                 b["steps"].append(s)
             if b["steps"]:
                 b["steps"][-1]["name"] = "Latest step"
             p["branches"].append(b)
-        p["updated_at"] = last_updated.isoformat() if last_updated else None
+        p["updated_at"] = project.updated_at.isoformat() if project.updated_at else None
         data.append(p)
 
     print(json.dumps(data, indent=2))
@@ -233,14 +237,38 @@ async def list_projects(db: SessionManager):
     List all projects in the database.
     """
     sm = StateManager(db)
-    projects = await sm.list_projects()
+    projects = await sm.list_projects(include_steps=False)
 
     print(f"Available projects ({len(projects)}):")
     for project in projects:
         print(f"* {project.name} ({project.id})")
         for branch in project.branches:
-            last_step = max(state.step_index for state in branch.states)
-            print(f"  - {branch.name} ({branch.id}) - last step: {last_step}")
+            print(f"  - {branch.name} ({branch.id}) - last step: {branch.latest_step_index}")
+
+
+async def audit_indexes(db: SessionManager) -> bool:
+    """
+    Check the query plans of the common database queries for full table scans.
+
+    :param db: Database session manager.
+    :return: True if no unexpected full table scans were found, False otherwise.
+    """
+    async with db as session:
+        plans = await audit_queries(session)
+
+    n_scans = 0
+    for plan in plans:
+        if plan.scans:
+            n_scans += 1
+            print(f"* {plan.name}: FULL SCAN of {', '.join(plan.scans)}")
+        else:
+            print(f"* {plan.name}: OK")
+        for line in plan.plan:
+            print(f"    {line}")
+
+    if n_scans:
+        print(f"{n_scans} of {len(plans)} queries scan tables without an index", file=sys.stderr)
+    return n_scans == 0
 
 
 async def load_project(
@@ -329,4 +357,12 @@ def init() -> tuple[UIBase, SessionManager, Namespace]:
     return (ui, db, args)
 
 
-__all__ = ["parse_arguments", "load_config", "list_projects_json", "list_projects", "load_project", "init"]
+__all__ = [
+    "parse_arguments",
+    "load_config",
+    "list_projects_json",
+    "list_projects",
+    "audit_indexes",
+    "load_project",
+    "init",
+]
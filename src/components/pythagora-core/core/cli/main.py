@@ -5,13 +5,25 @@ import sys
 from argparse import Namespace
 from asyncio import run
 
+from core.agents.convo import AgentConvo
 from core.agents.orchestrator import Orchestrator
-from core.cli.helpers import delete_project, init, list_projects, list_projects_json, load_project, show_config
+from core.cli.helpers import (
+    audit_indexes,
+    delete_project,
+    init,
+    list_projects,
+    list_projects_json,
+    load_project,
+    show_config,
+)
 from core.config import LLMProvider, get_config
 from core.db.session import SessionManager
 from core.db.v0importer import LegacyDatabaseImporter
 from core.llm.anthropic_client import CustomAssertionError
 from core.llm.base import APIError, BaseLLMClient
+from core.llm.client_registry import client_registry
+from core.llm.health import health_tracker
+from core.llm.scheduler import llm_scheduler
 from core.log import get_logger
 from core.state.state_manager import StateManager
 from core.telemetry import telemetry
@@ -28,6 +40,10 @@ async def cleanup(ui: UIBase):
     if not telemetry_sent:
         await telemetry.send()
         telemetry_sent = True
+    log.debug(f"LLM connection pool stats: {client_registry.stats()}")
+    log.debug(f"LLM rate limiter stats: {llm_scheduler.stats()}")
+    log.debug(f"LLM health stats: {health_tracker.stats()}")
+    await client_registry.aclose()
     await ui.stop()
 
 
@@ -85,6 +101,7 @@ async def run_project(sm: StateManager, ui: UIBase, args) -> bool:
             source=pythagora_source,
         )
 
+    await sm.flush_llm_requests()
     return success
 
 
@@ -265,6 +282,8 @@ async def async_main(
     elif args.list_json:
         await list_projects_json(db)
         return True
+    elif args.audit_indexes:
+        return await audit_indexes(db)
     if args.show_config:
         show_config()
         return True
@@ -282,6 +301,8 @@ async def async_main(
         telemetry.set("is_extension", True)
         telemetry.set("extension_version", args.extension_version)
 
+    AgentConvo.init_templates()
+
     sm = StateManager(db, ui)
     ui_started = await ui.start()
     if not ui_started:
@@ -111,6 +111,28 @@ class ProviderConfig(_StrictModel):
         None,
         description="Extra provider-specific configuration",
     )
+    max_concurrent_requests: Optional[int] = Field(
+        default=None,
+        description="Maximum number of concurrent requests to the provider (if null, only the rate limits apply)",
+        ge=1,
+    )
+
+
+class FallbackLLMConfig(_StrictModel):
+    """
+    LLM to fall back to if the agent's primary LLM is failing.
+    """
+
+    provider: LLMProvider = Field(description="LLM provider")
+    model: str = Field(description="Model to use")
+    base_url: Optional[str] = Field(
+        None,
+        description="Base URL for the API, if different from the provider configuration (eg. for Bedrock)",
+    )
+    api_key: Optional[str] = Field(
+        None,
+        description="API key to use, if different from the provider configuration",
+    )
 
 
 class AgentLLMConfig(_StrictModel):
@@ -129,6 +151,27 @@ class AgentLLMConfig(_StrictModel):
         ge=0.0,
         le=1.0,
     )
+    prompt_caching: bool = Field(
+        default=False,
+        description="Let the provider cache the stable conversation prefix (supported by Anthropic)",
+    )
+    files_token_budget: Optional[int] = Field(
+        default=None,
+        description="Maximum number of tokens for file contents in the prompt (if null, there's no limit)",
+        ge=0,
+    )
+    fallback: list[FallbackLLMConfig] = Field(
+        default_factory=list,
+        description="LLMs to fall back to (in order) if the primary LLM is failing",
+    )
+    hedge_after: Optional[float] = Field(
+        default=None,
+        description=(
+            "Send a backup request if the first token doesn't arrive within the model's p95 time to first token, "
+            "or within this many seconds until enough timings are collected (if null, requests are not hedged)"
+        ),
+        gt=0.0,
+    )
 
 
 class LLMConfig(_StrictModel):
@@ -166,6 +209,32 @@ class LLMConfig(_StrictModel):
         None,
         description="Extra provider-specific configuration",
     )
+    max_concurrent_requests: Optional[int] = Field(
+        default=None,
+        description="Maximum number of concurrent requests to the provider (if null, only the rate limits apply)",
+        ge=1,
+    )
+    prompt_caching: bool = Field(
+        default=False,
+        description="Let the provider cache the stable conversation prefix (supported by Anthropic)",
+    )
+    files_token_budget: Optional[int] = Field(
+        default=None,
+        description="Maximum number of tokens for file contents in the prompt (if null, there's no limit)",
+        ge=0,
+    )
+    fallback: list["LLMConfig"] = Field(
+        default_factory=list,
+        description="LLMs to fall back to (in order) if the primary LLM is failing",
+    )
+    hedge_after: Optional[float] = Field(
+        default=None,
+        description=(
+            "Send a backup request if the first token doesn't arrive within the model's p95 time to first token, "
+            "or within this many seconds until enough timings are collected (if null, requests are not hedged)"
+        ),
+        gt=0.0,
+    )
 
     @classmethod
     def from_provider_and_agent_configs(cls, provider: ProviderConfig, agent: AgentLLMConfig):
@@ -178,9 +247,56 @@ class LLMConfig(_StrictModel):
             connect_timeout=provider.connect_timeout,
             read_timeout=provider.read_timeout,
             extra=provider.extra,
+            max_concurrent_requests=provider.max_concurrent_requests,
+            prompt_caching=agent.prompt_caching,
+            files_token_budget=agent.files_token_budget,
+            hedge_after=agent.hedge_after,
         )
 
 
+class LLMCacheMode(str, Enum):
+    """
+    LLM response cache modes.
+    """
+
+    OFF = "off"
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class LLMCacheConfig(_StrictModel):
+    """
+    Configuration for the local LLM response cache.
+
+    In "record" mode, all responses are stored to the cache. In "replay" mode,
+    recorded responses are served from the cache without calling the LLM,
+    and only cache misses go to the network (and are recorded).
+    """
+
+    mode: LLMCacheMode = Field(
+        LLMCacheMode.OFF,
+        description="Cache mode (off, record or replay)",
+    )
+    path: str = Field(
+        join(ROOT_DIR, "data", "database", "llm_cache.db"),
+        description="Path to the SQLite database file holding the cached responses",
+    )
+    max_size: int = Field(
+        512 * 1024 * 1024,
+        description="Maximum total size (in bytes) of cached responses, least recently used are evicted first",
+        ge=0,
+    )
+    ttl: Optional[float] = Field(
+        7 * 24 * 3600.0,
+        description="Time (in seconds) after which cached responses expire (if null, they never expire)",
+        ge=0.0,
+    )
+    deterministic_only: bool = Field(
+        True,
+        description="Only cache requests with temperature 0",
+    )
+
+
 class PromptConfig(_StrictModel):
     """
     Configuration for prompt templates:
@@ -190,6 +306,10 @@ class PromptConfig(_StrictModel):
         [join(ROOT_DIR, "core", "prompts")],
         description="List of directories to search for prompt templates",
     )
+    cache_dir: Optional[str] = Field(
+        None,
+        description="Directory for caching compiled prompt templates (defaults to a directory in the system temp dir)",
+    )
 
     @field_validator("paths")
     @classmethod
@@ -220,6 +340,15 @@ class LogConfig(_StrictModel):
     )
 
 
+class SQLiteProfile(str, Enum):
+    """
+    SQLite connection settings.
+    """
+
+    DEFAULT = "default"
+    PERFORMANCE = "performance"
+
+
 class DBConfig(_StrictModel):
     """
     Configuration for database connections.
@@ -234,6 +363,33 @@ class DBConfig(_StrictModel):
         description="Database connection URL",
     )
     debug_sql: bool = Field(False, description="Log all SQL queries to the console")
+    state_snapshot_interval: Optional[int] = Field(
+        None,
+        description=(
+            "If set, project states are stored as deltas (JSON patches) against the previous state, "
+            "with a full snapshot every N steps. If not set, each state is stored in full."
+        ),
+        gt=0,
+    )
+    compress_file_contents: bool = Field(
+        True,
+        description=(
+            "Store file contents compressed (with zstd if the `zstandard` package is installed, "
+            "otherwise with zlib). Existing contents are read either way."
+        ),
+    )
+    file_content_cache_size: int = Field(
+        64,
+        description="Maximum memory (in MB) used for caching decompressed file contents",
+        ge=0,
+    )
+    sqlite_profile: SQLiteProfile = Field(
+        SQLiteProfile.PERFORMANCE,
+        description=(
+            "SQLite connection settings: 'default' uses the SQLite defaults and a new connection for each "
+            "session, 'performance' uses the WAL journal, larger caches and a small connection pool"
+        ),
+    )
 
     @field_validator("url")
     @classmethod
@@ -309,6 +465,14 @@ class FileSystemConfig(_StrictModel):
         IGNORE_SIZE_THRESHOLD,
         description="Files larger than this size should be ignored",
     )
+    use_gitignore: bool = Field(
+        False,
+        description="Also ignore the files ignored by the project's .gitignore files",
+    )
+    watch: bool = Field(
+        True,
+        description="Watch the project folder for changes (Linux only), instead of scanning all the files after each step",
+    )
 
 
 class Config(_StrictModel):
@@ -392,6 +556,7 @@ class Config(_StrictModel):
             ),
         }
     )
+    llm_cache: LLMCacheConfig = LLMCacheConfig()
     prompt: PromptConfig = PromptConfig()
     log: LogConfig = LogConfig()
     db: DBConfig = DBConfig()
@@ -409,7 +574,20 @@ class Config(_StrictModel):
         agent_name = agent_name if agent_name in self.agent else "default"
         agent_config = self.agent[agent_name]
         provider_config = self.llm[agent_config.provider]
-        return LLMConfig.from_provider_and_agent_configs(provider_config, agent_config)
+        llm_config = LLMConfig.from_provider_and_agent_configs(provider_config, agent_config)
+
+        for fallback in agent_config.fallback:
+            fallback_config = LLMConfig.from_provider_and_agent_configs(
+                self.llm[fallback.provider],
+                agent_config.model_copy(update={"provider": fallback.provider, "model": fallback.model}),
+            )
+            if fallback.base_url:
+                fallback_config.base_url = fallback.base_url
+            if fallback.api_key:
+                fallback_config.api_key = fallback.api_key
+            llm_config.fallback.append(fallback_config)
+
+        return llm_config
 
     def all_llms(self) -> list[LLMConfig]:
         """
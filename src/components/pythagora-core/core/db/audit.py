@@ -0,0 +1,166 @@
+import re
+from dataclasses import dataclass
+from uuid import uuid4
+
+from sqlalchemy import Executable, delete, distinct, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db.models import (
+    Branch,
+    ExecLog,
+    File,
+    FileContent,
+    LLMMessage,
+    LLMRequest,
+    LLMRequestMessage,
+    ProjectState,
+    Specification,
+    UserInput,
+)
+
+# Full table scans in the query plans (table name is the first group)
+SCAN_PATTERNS = {
+    "sqlite": re.compile(r"^SCAN (?:TABLE )?(\w+)(?!.* USING (?:COVERING )?INDEX)"),
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+}
+
+
+@dataclass
+class HotQuery:
+    name: str
+    statement: Executable
+    # Tables that have to be scanned in full (eg. when looking for orphans)
+    expected_scans: tuple[str, ...] = ()
+
+
+@dataclass
+class QueryPlan:
+    name: str
+    plan: list[str]
+    # Tables scanned in full, that should have been looked up using an index
+    scans: list[str]
+
+
+def get_hot_queries() -> list[HotQuery]:
+    """
+    Get the queries that are run often or on large tables.
+
+    Cascading deletes and updates (foreign keys with ON DELETE) are done by
+    the database, so they're included as the equivalent queries. The values
+    used in the queries are placeholders.
+
+    :return: List of queries to audit.
+    """
+    project_id = uuid4()
+    branch_id = uuid4()
+    state_id = uuid4()
+    step_index = 10
+
+    queries = [
+        HotQuery(
+            "Load project state files",
+            select(File).where(
+                File.branch_id == branch_id,
+                File.first_step <= step_index,
+                or_(File.last_step.is_(None), File.last_step >= step_index),
+            ),
+        ),
+        HotQuery(
+            "Load latest project state",
+            select(ProjectState)
+            .where(ProjectState.branch_id == branch_id)
+            .order_by(ProjectState.step_index.desc())
+            .limit(1),
+        ),
+        HotQuery(
+            "Delete states after step (ProjectState.delete_after)",
+            delete(ProjectState).where(ProjectState.branch_id == branch_id, ProjectState.step_index > step_index),
+        ),
+        HotQuery(
+            "Restore files after step (ProjectState.delete_after)",
+            update(File).where(File.branch_id == branch_id, File.last_step >= step_index).values(last_step=None),
+        ),
+        HotQuery(
+            "Delete orphaned file contents (FileContent.delete_orphans)",
+            delete(FileContent).where(~FileContent.id.in_(select(distinct(File.content_id)))),
+            expected_scans=("file_contents",),
+        ),
+        HotQuery(
+            "Delete orphaned specifications (Specification.delete_orphans)",
+            delete(Specification).where(~Specification.id.in_(select(distinct(ProjectState.specification_id)))),
+            expected_scans=("specifications",),
+        ),
+        HotQuery(
+            "Delete orphaned LLM messages (LLMMessage.delete_orphans)",
+            delete(LLMMessage).where(~LLMMessage.id.in_(select(distinct(LLMRequestMessage.message_id)))),
+            expected_scans=("llm_messages",),
+        ),
+        HotQuery(
+            "Load LLM request messages (LLMRequest.get_messages)",
+            select(LLMMessage.data)
+            .join(LLMRequestMessage, LLMRequestMessage.message_id == LLMMessage.id)
+            .where(LLMRequestMessage.request_id == 1)
+            .order_by(LLMRequestMessage.position),
+        ),
+        HotQuery(
+            "Check file content references (foreign key)",
+            select(File.id).where(File.content_id == "0" * 40),
+        ),
+        HotQuery(
+            "Delete project branches (cascade)",
+            delete(Branch).where(Branch.project_id == project_id),
+        ),
+    ]
+
+    for model in (ProjectState, File, LLMRequest, UserInput, ExecLog):
+        queries.append(
+            HotQuery(
+                f"Delete branch {model.__tablename__} (cascade)",
+                delete(model).where(model.branch_id == branch_id),
+            )
+        )
+
+    for model in (LLMRequest, UserInput, ExecLog):
+        queries.append(
+            HotQuery(
+                f"Unlink deleted state from {model.__tablename__} (set null)",
+                update(model).where(model.project_state_id == state_id).values(project_state_id=None),
+            )
+        )
+
+    return queries
+
+
+async def audit_queries(session: AsyncSession) -> list[QueryPlan]:
+    """
+    Check the query plans of the hot queries for full table scans.
+
+    Note that the query planner may choose to scan small tables even if
+    there's an index, so this is most useful on a populated database.
+
+    :param session: The database session.
+    :return: List of query plans.
+    """
+    dialect = session.bind.dialect
+    if dialect.name not in SCAN_PATTERNS:
+        raise ValueError(f"Query plan audit is not supported for {dialect.name} databases")
+
+    explain = "EXPLAIN QUERY PLAN" if dialect.name == "sqlite" else "EXPLAIN"
+    scan_pattern = SCAN_PATTERNS[dialect.name]
+
+    plans = []
+    for query in get_hot_queries():
+        sql = query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        result = await session.execute(text(f"{explain} {sql}"))
+        plan = [row[-1] for row in result]
+        scans = []
+        for line in plan:
+            match = scan_pattern.search(line.strip())
+            if match and match.group(1) not in query.expected_scans:
+                scans.append(match.group(1))
+        plans.append(QueryPlan(name=query.name, plan=plan, scans=list(dict.fromkeys(scans))))
+
+    return plans
+
+
+__all__ = ["HotQuery", "QueryPlan", "get_hot_queries", "audit_queries"]
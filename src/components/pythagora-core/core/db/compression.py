@@ -0,0 +1,108 @@
+import zlib
+from collections import Counter
+from os.path import dirname, join
+from typing import Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Dictionary of code fragments common in JS/TS projects (see `train_dictionary()`).
+# Compressed data depends on it, so it must never change; add a new dictionary
+# (and format) instead.
+DICTIONARY_PATH = join(dirname(__file__), "file_content.dict")
+
+# Format markers (first byte of the compressed data)
+ZLIB_V1 = 1  # zlib with the v1 dictionary
+ZSTD_V1 = 2  # zstd with the v1 dictionary
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+with open(DICTIONARY_PATH, "rb") as f:
+    DICTIONARY = f.read()
+
+_zstd_dict = None
+
+
+def _get_zstd_dict() -> "zstandard.ZstdCompressionDict":
+    global _zstd_dict
+    if _zstd_dict is None:
+        _zstd_dict = zstandard.ZstdCompressionDict(DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    return _zstd_dict
+
+
+def compress(text: str) -> Optional[bytes]:
+    """
+    Compress text using zstd if it's installed, or zlib otherwise.
+
+    Both use a preset dictionary of common JS/TS code, which helps
+    a lot with small files.
+
+    :param text: Text to compress.
+    :return: Compressed data, or None if compression wouldn't save any space.
+    """
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_get_zstd_dict())
+        packed = bytes([ZSTD_V1]) + compressor.compress(data)
+    else:
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=DICTIONARY)
+        packed = bytes([ZLIB_V1]) + compressor.compress(data) + compressor.flush()
+
+    return packed if len(packed) < len(data) else None
+
+
+def decompress(packed: bytes) -> str:
+    """
+    Decompress data created by `compress()`.
+
+    :param packed: Compressed data.
+    :return: The original text.
+    """
+    fmt, payload = packed[0], packed[1:]
+    if fmt == ZLIB_V1:
+        decompressor = zlib.decompressobj(zdict=DICTIONARY)
+        data = decompressor.decompress(payload) + decompressor.flush()
+    elif fmt == ZSTD_V1:
+        if zstandard is None:
+            raise ValueError("File content is compressed with zstd, please install the `zstandard` package")
+        data = zstandard.ZstdDecompressor(dict_data=_get_zstd_dict()).decompress(payload)
+    else:
+        raise ValueError(f"Unknown file content compression format: {fmt}")
+
+    return data.decode("utf-8")
+
+
+def train_dictionary(samples: Iterable[str], size: int = 16 * 1024) -> bytes:
+    """
+    Build a compression dictionary from sample files.
+
+    The dictionary consists of the lines that appear in the most samples
+    (weighted by length), with the most valuable ones at the end, where
+    they're cheapest to reference. This is how `file_content.dict` was built
+    from the project templates in `core/templates/tree`.
+
+    :param samples: Contents of the sample files.
+    :param size: Maximum dictionary size in bytes (zlib uses at most 32KB).
+    :return: The dictionary.
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update({line for line in sample.splitlines(keepends=True) if len(line.strip()) >= 8})
+
+    scored = sorted(((count - 1) * len(line), line) for line, count in counts.items() if count > 1)
+    lines = []
+    total = 0
+    for _, line in reversed(scored):
+        encoded = line.encode("utf-8")
+        if total + len(encoded) > size:
+            continue
+        lines.append(encoded)
+        total += len(encoded)
+
+    return b"".join(reversed(lines))
+
+
+__all__ = ["compress", "decompress", "train_dictionary"]
@@ -0,0 +1,94 @@
+from copy import deepcopy
+from typing import Any
+
+
+def _escape(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(part: str) -> str:
+    return part.replace("~1", "/").replace("~0", "~")
+
+
+def _diff(old: Any, new: Any, path: str, ops: list[dict]):
+    if isinstance(old, dict) and isinstance(new, dict) and old and new:
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": deepcopy(value)})
+            else:
+                _diff(old[key], value, f"{path}/{_escape(key)}", ops)
+
+    elif isinstance(old, list) and isinstance(new, list) and old and new:
+        for i in range(min(len(old), len(new))):
+            _diff(old[i], new[i], f"{path}/{i}", ops)
+        for i in range(len(old), len(new)):
+            ops.append({"op": "add", "path": f"{path}/{i}", "value": deepcopy(new[i])})
+        for i in reversed(range(len(new), len(old))):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+
+    elif type(old) is not type(new) or old != new:
+        ops.append({"op": "replace", "path": path, "value": deepcopy(new)})
+
+
+def make_patch(old: Any, new: Any) -> list[dict]:
+    """
+    Create a JSON Patch (RFC 6902) that transforms `old` into `new`.
+
+    Dicts are compared key by key and lists element by element, so
+    appending to or modifying an item in a list produces a small patch.
+    Empty containers and values of different types are replaced whole.
+    The values in the patch are copies, so later changes to `new` don't
+    affect the patch.
+
+    :param old: Original JSON-serializable value.
+    :param new: New JSON-serializable value.
+    :return: List of patch operations (empty if the values are equal).
+    """
+    ops = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+def apply_patch(doc: Any, patch: list[dict]) -> Any:
+    """
+    Apply a JSON Patch created by `make_patch()`.
+
+    Supports the "add", "remove" and "replace" operations. The document
+    is modified in place.
+
+    :param doc: JSON value to patch.
+    :param patch: List of patch operations.
+    :return: The patched value.
+    """
+    for op in patch:
+        if op["path"] == "":
+            doc = op.get("value")
+            continue
+
+        parts = [_unescape(part) for part in op["path"][1:].split("/")]
+        parent = doc
+        for part in parts[:-1]:
+            parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+
+        key = parts[-1]
+        if isinstance(parent, list):
+            index = len(parent) if key == "-" else int(key)
+            if op["op"] == "add":
+                parent.insert(index, op["value"])
+            elif op["op"] == "remove":
+                del parent[index]
+            else:
+                parent[index] = op["value"]
+        else:
+            if op["op"] == "remove":
+                del parent[key]
+            else:
+                parent[key] = op["value"]
+
+    return doc
+
+
+__all__ = ["make_patch", "apply_patch"]
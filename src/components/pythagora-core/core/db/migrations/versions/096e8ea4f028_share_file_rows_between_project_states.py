@@ -0,0 +1,71 @@
+"""Share file rows between project states
+
+Revision ID: 096e8ea4f028
+Revises: 15272ebaf180
+Create Date: 2026-10-17 03:08:53.935504
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "096e8ea4f028"
+down_revision: Union[str, None] = "15272ebaf180"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("files", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("branch_id", sa.Uuid(), nullable=True))
+        batch_op.add_column(sa.Column("first_step", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("last_step", sa.Integer(), nullable=True))
+
+    # Existing rows belong to a single state each, except for the latest
+    # state in the branch, whose files stay valid for the following states.
+    op.execute(
+        """
+        UPDATE files SET
+            branch_id = (SELECT branch_id FROM project_states WHERE project_states.id = files.project_state_id),
+            first_step = (SELECT step_index FROM project_states WHERE project_states.id = files.project_state_id),
+            last_step = (SELECT step_index FROM project_states WHERE project_states.id = files.project_state_id)
+        """
+    )
+    op.execute(
+        """
+        UPDATE files SET last_step = NULL
+        WHERE last_step = (SELECT MAX(step_index) FROM project_states WHERE project_states.branch_id = files.branch_id)
+        """
+    )
+
+    with op.batch_alter_table("files", schema=None) as batch_op:
+        batch_op.alter_column("branch_id", existing_type=sa.Uuid(), nullable=False)
+        batch_op.alter_column("first_step", existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index("ix_files_branch_id_first_step", ["branch_id", "first_step"], unique=False)
+        batch_op.create_foreign_key(
+            batch_op.f("fk_files_branch_id_branches"), "branches", ["branch_id"], ["id"], ondelete="CASCADE"
+        )
+
+
+def downgrade() -> None:
+    # Copy the shared rows to each state that uses them
+    op.execute(
+        """
+        INSERT INTO files (project_state_id, branch_id, content_id, path, meta, first_step, last_step)
+        SELECT project_states.id, files.branch_id, files.content_id, files.path, files.meta,
+            project_states.step_index, project_states.step_index
+        FROM files JOIN project_states ON project_states.branch_id = files.branch_id
+        WHERE project_states.step_index > files.first_step
+            AND (files.last_step IS NULL OR project_states.step_index <= files.last_step)
+        """
+    )
+
+    with op.batch_alter_table("files", schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f("fk_files_branch_id_branches"), type_="foreignkey")
+        batch_op.drop_index("ix_files_branch_id_first_step")
+        batch_op.drop_column("last_step")
+        batch_op.drop_column("first_step")
+        batch_op.drop_column("branch_id")
@@ -0,0 +1,35 @@
+"""Add latest step index to branches
+
+Revision ID: a71a202a5efb
+Revises: f6f00124e780
+Create Date: 2026-10-17 03:29:36.511781
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a71a202a5efb"
+down_revision: Union[str, None] = "f6f00124e780"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("branches", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("latest_step_index", sa.Integer(), nullable=True))
+
+    op.execute(
+        """
+        UPDATE branches SET
+            latest_step_index = (SELECT MAX(step_index) FROM project_states WHERE project_states.branch_id = branches.id)
+        """
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("branches", schema=None) as batch_op:
+        batch_op.drop_column("latest_step_index")
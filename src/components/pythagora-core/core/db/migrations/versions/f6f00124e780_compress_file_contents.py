@@ -0,0 +1,84 @@
+"""Compress file contents
+
+Revision ID: f6f00124e780
+Revises: 096e8ea4f028
+Create Date: 2026-10-17 03:14:55.868403
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f6f00124e780"
+down_revision: Union[str, None] = "096e8ea4f028"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Number of rows converted at once
+BATCH_SIZE = 500
+
+file_contents = sa.table(
+    "file_contents",
+    sa.column("id", sa.String()),
+    sa.column("content", sa.String()),
+    sa.column("compressed_content", sa.LargeBinary()),
+)
+
+
+def _convert(source: sa.Column, convert):
+    """
+    Convert the file contents stored in `source` column, in batches ordered by ID.
+
+    :param source: Column with the values to convert.
+    :param convert: Function returning the values to update (or None to skip the row).
+    """
+    conn = op.get_bind()
+    last_id = ""
+    while True:
+        rows = conn.execute(
+            sa.select(file_contents.c.id, source)
+            .where(file_contents.c.id > last_id, source.is_not(None))
+            .order_by(file_contents.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        for row_id, value in rows:
+            values = convert(value)
+            if values is not None:
+                conn.execute(file_contents.update().where(file_contents.c.id == row_id).values(**values))
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    from core.db.compression import compress
+
+    with op.batch_alter_table("file_contents", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("compressed_content", sa.LargeBinary(), nullable=True))
+        batch_op.alter_column("content", existing_type=sa.VARCHAR(), nullable=True)
+
+    def compress_row(content: str):
+        compressed = compress(content)
+        if compressed is None:
+            return None
+        return {"content": None, "compressed_content": compressed}
+
+    _convert(file_contents.c.content, compress_row)
+
+
+def downgrade() -> None:
+    from core.db.compression import decompress
+
+    _convert(
+        file_contents.c.compressed_content,
+        lambda compressed: {"content": decompress(compressed), "compressed_content": None},
+    )
+
+    with op.batch_alter_table("file_contents", schema=None) as batch_op:
+        batch_op.alter_column("content", existing_type=sa.VARCHAR(), nullable=False)
+        batch_op.drop_column("compressed_content")
@@ -8,6 +8,7 @@ from .branch import Branch
 from .exec_log import ExecLog
 from .file import File
 from .file_content import FileContent
+from .llm_message import LLMMessage, LLMRequestMessage
 from .llm_request import LLMRequest
 from .project import Project
 from .project_state import ProjectState
@@ -21,7 +22,9 @@ __all__ = [
     "ExecLog",
     "File",
     "FileContent",
+    "LLMMessage",
     "LLMRequest",
+    "LLMRequestMessage",
     "Project",
     "ProjectState",
     "Specification",
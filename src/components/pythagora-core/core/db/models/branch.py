@@ -21,11 +21,15 @@ class Branch(Base):
 
     # ID and parent FKs
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
-    project_id: Mapped[UUID] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"))
+    project_id: Mapped[UUID] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"), index=True)
 
     # Attributes
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     name: Mapped[str] = mapped_column(default=DEFAULT)
+    # Step index of the last state, kept up to date when states are added
+    # or deleted (see `ProjectState`), so the projects can be listed without
+    # querying all the states
+    latest_step_index: Mapped[Optional[int]] = mapped_column(default=None)
 
     # Relationships
     project: Mapped["Project"] = relationship(back_populates="branches", lazy="selectin")
@@ -68,7 +72,10 @@ class Branch(Base):
             .order_by(ProjectState.step_index.desc())
             .limit(1)
         )
-        return result.scalar_one_or_none()
+        state = result.scalar_one_or_none()
+        if state is not None:
+            await state.apply_deltas()
+        return state
 
     async def get_state_at_step(self, step_index: int) -> Optional["ProjectState"]:
         """
@@ -86,4 +93,7 @@ class Branch(Base):
         result = await session.execute(
             select(ProjectState).where((ProjectState.branch_id == self.id) & (ProjectState.step_index == step_index))
         )
-        return result.scalar_one_or_none()
+        state = result.scalar_one_or_none()
+        if state is not None:
+            await state.apply_deltas()
+        return state
@@ -1,30 +1,48 @@
 from typing import TYPE_CHECKING, Optional
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.db.models import Base
 
 if TYPE_CHECKING:
-    from core.db.models import FileContent, ProjectState
+    from core.db.models import Branch, FileContent, ProjectState
 
 
 class File(Base):
+    """
+    A version of a file in the project.
+
+    File rows are shared between the project states in a branch: a row is
+    part of every state from `first_step` up to and including `last_step`
+    (or all following states, if `last_step` is None). Saving, changing or
+    deleting a file in a new state creates a new row (or closes the old
+    one), so committing a state only writes the files that changed.
+    """
+
     __tablename__ = "files"
-    __table_args__ = (UniqueConstraint("project_state_id", "path"),)
+    __table_args__ = (
+        UniqueConstraint("project_state_id", "path"),
+        Index("ix_files_branch_id_first_step", "branch_id", "first_step"),
+    )
 
     # ID and parent FKs
     id: Mapped[int] = mapped_column(primary_key=True)
+    # State in which this version of the file was created
     project_state_id: Mapped[UUID] = mapped_column(ForeignKey("project_states.id", ondelete="CASCADE"))
-    content_id: Mapped[str] = mapped_column(ForeignKey("file_contents.id", ondelete="RESTRICT"))
+    branch_id: Mapped[UUID] = mapped_column(ForeignKey("branches.id", ondelete="CASCADE"))
+    content_id: Mapped[str] = mapped_column(ForeignKey("file_contents.id", ondelete="RESTRICT"), index=True)
 
     # Attributes
     path: Mapped[str] = mapped_column()
     meta: Mapped[dict] = mapped_column(default=dict, server_default="{}")
+    first_step: Mapped[int] = mapped_column()
+    last_step: Mapped[Optional[int]] = mapped_column(default=None)
 
     # Relationships
-    project_state: Mapped[Optional["ProjectState"]] = relationship(back_populates="files", lazy="raise")
+    project_state: Mapped[Optional["ProjectState"]] = relationship(lazy="raise")
+    branch: Mapped[Optional["Branch"]] = relationship(lazy="raise")
     content: Mapped["FileContent"] = relationship(back_populates="files", lazy="selectin")
 
     def clone(self) -> "File":
@@ -36,8 +54,7 @@ class File(Base):
         :return: The cloned file object.
         """
         return File(
-            project_state=None,
-            content_id=self.content_id,
+            content=self.content,
             path=self.path,
             meta=self.meta,
         )
@@ -1,14 +1,127 @@
-from typing import TYPE_CHECKING
+import sys
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Optional
 
-from sqlalchemy import delete, distinct, select
+from sqlalchemy import delete, distinct, event, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 
+from core.db.compression import compress, decompress
 from core.db.models import Base
 
 if TYPE_CHECKING:
     from core.db.models import File
 
+# Session.info key for enabling compression (see `DBConfig.compress_file_contents`)
+COMPRESS_KEY = "compress_file_contents"
+
+# Maximum number of ids looked up in a single query (see `FileContent.store_many()`)
+STORE_CHUNK_SIZE = 500
+
+# Default size of the decompressed contents cache (see `DBConfig.file_content_cache_size`)
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class FileContentCache:
+    """
+    LRU cache of decompressed file contents, keyed by the content hash.
+
+    File contents are content-addressed, so the cache is shared by all
+    project states (and sessions) in the process. The `FileContent` objects
+    only keep the stored (compressed) data, and the text is decompressed
+    when first needed, so the memory used by the text is bounded by the
+    cache size rather than growing with the number of files.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_SIZE):
+        """
+        :param max_bytes: Maximum memory used by the cached contents.
+        """
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: str, load: Callable[[], str]) -> str:
+        """
+        Get the content from the cache, loading it if needed.
+
+        :param key: Content hash.
+        :param load: Function returning the content if it's not cached.
+        :return: The content.
+        """
+        content = self.entries.get(key)
+        if content is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return content
+
+        self.misses += 1
+        content = load()
+        self.put(key, content)
+        return content
+
+    def put(self, key: str, content: str):
+        """
+        Add the content to the cache, evicting the least recently used ones if needed.
+
+        Contents larger than the cache are not cached.
+
+        :param key: Content hash.
+        :param content: The content.
+        """
+        self.discard(key)
+        size = sys.getsizeof(content)
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = content
+        self.resident_bytes += size
+        self._evict()
+
+    def discard(self, key: str):
+        content = self.entries.pop(key, None)
+        if content is not None:
+            self.resident_bytes -= sys.getsizeof(content)
+
+    def resize(self, max_bytes: int):
+        """
+        Change the cache size, evicting contents if needed.
+
+        :param max_bytes: Maximum memory used by the cached contents.
+        """
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _evict(self):
+        while self.resident_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.resident_bytes -= sys.getsizeof(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "resident_bytes": self.resident_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+
+file_content_cache = FileContentCache()
+
 
 class FileContent(Base):
     __tablename__ = "file_contents"
@@ -16,12 +129,30 @@ class FileContent(Base):
     # ID and parent FKs
     id: Mapped[str] = mapped_column(primary_key=True)
 
-    # Attributes
-    content: Mapped[str] = mapped_column()
+    # Attributes (use `content` to access the text, regardless of how it's stored)
+    plain_content: Mapped[Optional[str]] = mapped_column("content", default=None)
+    compressed_content: Mapped[Optional[bytes]] = mapped_column(default=None)
 
     # Relationships
     files: Mapped[list["File"]] = relationship(back_populates="content", lazy="raise")
 
+    @property
+    def content(self) -> str:
+        """
+        The file content as unicode string.
+
+        Compressed content is decompressed when needed, through `file_content_cache`.
+        """
+        if self.plain_content is not None:
+            return self.plain_content
+
+        return file_content_cache.get(self.id, lambda: decompress(self.compressed_content))
+
+    @content.setter
+    def content(self, value: str):
+        self.plain_content = value
+        self.compressed_content = None
+
     @classmethod
     async def store(cls, session: AsyncSession, hash: str, content: str) -> "FileContent":
         """
@@ -36,15 +167,35 @@ class FileContent(Base):
         :param content: The file content as unicode string.
         :return: The file content object.
         """
-        result = await session.execute(select(FileContent).where(FileContent.id == hash))
-        fc = result.scalar_one_or_none()
-        if fc is not None:
-            return fc
+        stored = await cls.store_many(session, {hash: content})
+        return stored[hash]
 
-        fc = cls(id=hash, content=content)
-        session.add(fc)
+    @classmethod
+    async def store_many(cls, session: AsyncSession, contents: dict[str, str]) -> dict[str, "FileContent"]:
+        """
+        Store multiple file contents in the database.
 
-        return fc
+        Existing contents are looked up with a single query (per chunk of
+        STORE_CHUNK_SIZE ids), and the missing ones are added to the session
+        together, so they're inserted in one batch on the next flush.
+
+        :param session: The database session.
+        :param contents: Dictionary mapping file content hashes to the contents.
+        :return: Dictionary mapping the hashes to the file content objects.
+        """
+        hashes = list(contents)
+        stored = {}
+        for i in range(0, len(hashes), STORE_CHUNK_SIZE):
+            result = await session.execute(
+                select(FileContent).where(FileContent.id.in_(hashes[i : i + STORE_CHUNK_SIZE]))
+            )
+            stored.update((fc.id, fc) for fc in result.scalars())
+
+        missing = [cls(id=hash, content=content) for hash, content in contents.items() if hash not in stored]
+        session.add_all(missing)
+        stored.update((fc.id, fc) for fc in missing)
+
+        return stored
 
     @classmethod
     async def delete_orphans(cls, session: AsyncSession):
@@ -56,3 +207,25 @@ class FileContent(Base):
         from core.db.models import File
 
         await session.execute(delete(FileContent).where(~FileContent.id.in_(select(distinct(File.content_id)))))
+
+
+def _compress_content(_mapper, _connection, target: FileContent):
+    """
+    Compress the content before saving it, if enabled.
+
+    The text stays available through `FileContent.content` (from the cache).
+    """
+    session = Session.object_session(target)
+    if not session or not session.info.get(COMPRESS_KEY) or target.plain_content is None:
+        return
+
+    compressed = compress(target.plain_content)
+    if compressed is None:
+        return
+
+    file_content_cache.put(target.id, target.plain_content)
+    target.plain_content = None
+    target.compressed_content = compressed
+
+
+event.listen(FileContent, "before_insert", _compress_content)
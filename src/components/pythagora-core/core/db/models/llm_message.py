@@ -0,0 +1,89 @@
+import json
+from hashlib import sha256
+
+from sqlalchemy import ForeignKey, delete, distinct, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.db.models import Base
+
+# Maximum number of ids looked up in a single query (see `LLMMessage.store_many()`)
+STORE_CHUNK_SIZE = 500
+
+
+class LLMMessage(Base):
+    """
+    Message sent to (or received from) the LLM.
+
+    Consecutive requests in a conversation repeat most of the messages,
+    so the messages are stored once, identified by their hash, and the
+    requests reference them (see `LLMRequestMessage`).
+    """
+
+    __tablename__ = "llm_messages"
+
+    # ID (hash of the message data)
+    id: Mapped[str] = mapped_column(primary_key=True)
+
+    # Attributes
+    data: Mapped[dict] = mapped_column()
+
+    @staticmethod
+    def hash(message: dict) -> str:
+        """
+        Compute the ID of the message.
+
+        :param message: The message (eg. `{"role": "user", "content": "..."}`).
+        :return: The message hash.
+        """
+        return sha256(json.dumps(message, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @classmethod
+    async def store_many(cls, session: AsyncSession, messages: list[dict]) -> list[str]:
+        """
+        Store the messages in the database, unless they're already stored.
+
+        :param session: The database session.
+        :param messages: The messages to store.
+        :return: List of message IDs, in the same order as the messages.
+        """
+        ids = [cls.hash(message) for message in messages]
+        unique = dict(zip(ids, messages))
+
+        hashes = list(unique)
+        existing = set()
+        for i in range(0, len(hashes), STORE_CHUNK_SIZE):
+            result = await session.execute(
+                select(LLMMessage.id).where(LLMMessage.id.in_(hashes[i : i + STORE_CHUNK_SIZE]))
+            )
+            existing.update(result.scalars())
+
+        session.add_all(cls(id=hash, data=message) for hash, message in unique.items() if hash not in existing)
+        return ids
+
+    @classmethod
+    async def delete_orphans(cls, session: AsyncSession):
+        """
+        Delete LLMMessage objects that are not referenced by any LLM request.
+
+        :param session: The database session.
+        """
+        await session.execute(
+            delete(LLMMessage).where(~LLMMessage.id.in_(select(distinct(LLMRequestMessage.message_id))))
+        )
+
+
+class LLMRequestMessage(Base):
+    """
+    Reference to a message in the LLM request (in order).
+    """
+
+    __tablename__ = "llm_request_messages"
+
+    # ID and parent FKs
+    request_id: Mapped[int] = mapped_column(ForeignKey("llm_requests.id", ondelete="CASCADE"), primary_key=True)
+    position: Mapped[int] = mapped_column(primary_key=True)
+    message_id: Mapped[str] = mapped_column(ForeignKey("llm_messages.id", ondelete="RESTRICT"), index=True)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__}(request_id={self.request_id}, position={self.position})>"
@@ -2,16 +2,16 @@ from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, inspect
+from sqlalchemy import ForeignKey, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
 from core.db.models import Base
-from core.llm.request_log import LLMRequestLog
+from core.db.models.llm_message import LLMMessage, LLMRequestMessage
+from core.llm.request_log import LLMRequestLog, LLMRequestStatus
 
 if TYPE_CHECKING:
-    from core.agents.base import BaseAgent
     from core.db.models import Branch, ProjectState
 
 
@@ -20,8 +20,10 @@ class LLMRequest(Base):
 
     # ID and parent FKs
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    branch_id: Mapped[UUID] = mapped_column(ForeignKey("branches.id", ondelete="CASCADE"))
-    project_state_id: Mapped[Optional[UUID]] = mapped_column(ForeignKey("project_states.id", ondelete="SET NULL"))
+    branch_id: Mapped[UUID] = mapped_column(ForeignKey("branches.id", ondelete="CASCADE"), index=True)
+    project_state_id: Mapped[Optional[UUID]] = mapped_column(
+        ForeignKey("project_states.id", ondelete="SET NULL"), index=True
+    )
 
     # Attributes
     started_at: Mapped[datetime] = mapped_column(server_default=func.now())
@@ -29,11 +31,15 @@ class LLMRequest(Base):
     provider: Mapped[str] = mapped_column()
     model: Mapped[str] = mapped_column()
     temperature: Mapped[float] = mapped_column()
-    messages: Mapped[list[dict]] = mapped_column()
+    # Only set for requests logged before the messages were stored
+    # separately; use `get_messages()` to get the messages.
+    messages: Mapped[Optional[list[dict]]] = mapped_column()
     prompts: Mapped[list[str]] = mapped_column(server_default="[]")
     response: Mapped[Optional[str]] = mapped_column()
     prompt_tokens: Mapped[int] = mapped_column()
     completion_tokens: Mapped[int] = mapped_column()
+    cache_read_tokens: Mapped[int] = mapped_column(default=0, server_default="0")
+    cache_write_tokens: Mapped[int] = mapped_column(default=0, server_default="0")
     duration: Mapped[float] = mapped_column()
     status: Mapped[str] = mapped_column()
     error: Mapped[Optional[str]] = mapped_column()
@@ -42,41 +48,104 @@ class LLMRequest(Base):
     branch: Mapped["Branch"] = relationship(back_populates="llm_requests", lazy="raise")
     project_state: Mapped["ProjectState"] = relationship(back_populates="llm_requests", lazy="raise")
 
+    message_refs: Mapped[list["LLMRequestMessage"]] = relationship(
+        cascade="all,delete-orphan",
+        order_by=LLMRequestMessage.position,
+        passive_deletes=True,
+        lazy="raise",
+    )
+
     @classmethod
-    def from_request_log(
+    async def from_request_log(
         cls,
-        project_state: "ProjectState",
-        agent: Optional["BaseAgent"],
+        session: AsyncSession,
         request_log: LLMRequestLog,
+        *,
+        branch_id: UUID,
+        project_state_id: Optional[UUID],
+        agent: Optional[str] = None,
     ) -> "LLMRequest":
         """
         Store the request log in the database.
 
+        The messages are stored separately (see `LLMMessage`), so the
+        messages repeated across requests are only stored once.
+
         Note this just creates the request log object. It is committed to the
         database only when the DB session itself is comitted.
 
-        :param project_state: Project state to associate the request log with.
-        :param agent: Agent that made the request (if the caller was an agent).
+        :param session: The database session.
         :param request_log: Request log.
+        :param branch_id: ID of the branch to associate the request log with.
+        :param project_state_id: ID of the project state to associate the request log with.
+        :param agent: Type of the agent that made the request (if the caller was an agent).
         :return: Newly created LLM request log in the database.
         """
-        session: AsyncSession = inspect(project_state).async_session
+        message_ids = await LLMMessage.store_many(session, request_log.messages)
 
         obj = cls(
-            project_state=project_state,
-            branch=project_state.branch,
-            agent=agent.agent_type,
+            branch_id=branch_id,
+            project_state_id=project_state_id,
+            started_at=request_log.started_at,
+            agent=agent,
             provider=request_log.provider,
             model=request_log.model,
             temperature=request_log.temperature,
-            messages=request_log.messages,
+            message_refs=[
+                LLMRequestMessage(position=position, message_id=message_id)
+                for position, message_id in enumerate(message_ids)
+            ],
             prompts=request_log.prompts,
             response=request_log.response,
             prompt_tokens=request_log.prompt_tokens,
             completion_tokens=request_log.completion_tokens,
+            cache_read_tokens=request_log.cache_read_tokens,
+            cache_write_tokens=request_log.cache_write_tokens,
             duration=request_log.duration,
             status=request_log.status,
             error=request_log.error,
         )
         session.add(obj)
         return obj
+
+    async def get_messages(self, session: AsyncSession) -> list[dict]:
+        """
+        Get the messages sent in the request, in order.
+
+        :param session: The database session.
+        :return: List of messages.
+        """
+        if self.messages is not None:
+            return self.messages
+
+        result = await session.execute(
+            select(LLMMessage.data)
+            .join(LLMRequestMessage, LLMRequestMessage.message_id == LLMMessage.id)
+            .where(LLMRequestMessage.request_id == self.id)
+            .order_by(LLMRequestMessage.position)
+        )
+        return list(result.scalars())
+
+    async def to_request_log(self, session: AsyncSession) -> LLMRequestLog:
+        """
+        Reconstruct the original request log (eg. for debugging).
+
+        :param session: The database session.
+        :return: The request log.
+        """
+        return LLMRequestLog(
+            provider=self.provider,
+            model=self.model,
+            temperature=self.temperature,
+            messages=await self.get_messages(session),
+            prompts=self.prompts,
+            response=self.response or "",
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            cache_read_tokens=self.cache_read_tokens,
+            cache_write_tokens=self.cache_write_tokens,
+            started_at=self.started_at,
+            duration=self.duration,
+            status=LLMRequestStatus(self.status),
+            error=self.error or "",
+        )
@@ -1,10 +1,11 @@
 import re
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import TYPE_CHECKING, Optional, Union
 from unicodedata import normalize
 from uuid import UUID, uuid4
 
-from sqlalchemy import and_, delete, inspect, select
+from sqlalchemy import and_, delete, exists, inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Mapped, mapped_column, relationship, selectinload
 from sqlalchemy.sql import func
@@ -15,6 +16,35 @@ if TYPE_CHECKING:
     from core.db.models import Branch
 
 
+@dataclass
+class StepSummary:
+    step_index: int
+    action: Optional[str]
+    created_at: datetime
+
+
+@dataclass
+class BranchSummary:
+    id: UUID
+    name: str
+    latest_step_index: int
+    # Time of the last step
+    updated_at: datetime
+    steps: list[StepSummary] = field(default_factory=list)
+
+
+@dataclass
+class ProjectSummary:
+    id: UUID
+    name: str
+    folder_name: str
+    branches: list[BranchSummary] = field(default_factory=list)
+
+    @property
+    def updated_at(self) -> Optional[datetime]:
+        return max((branch.updated_at for branch in self.branches), default=None)
+
+
 class Project(Base):
     __tablename__ = "projects"
 
@@ -102,6 +132,86 @@ class Project(Base):
         results = await session.execute(query)
         return results.scalars().all()
 
+    @staticmethod
+    async def get_summaries(
+        session: "AsyncSession",
+        include_steps: bool = True,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> list[ProjectSummary]:
+        """
+        Get the summaries of the projects, with their branches and (optionally) steps.
+
+        Unlike `get_all_projects()`, this only queries the columns needed to
+        list the projects, and doesn't load the project states. Projects
+        without any states are not included.
+
+        :param session: The SQLAlchemy session.
+        :param include_steps: Whether to include the summaries of all steps in the branches.
+        :param limit: Maximum number of projects to return (default: all).
+        :param offset: Number of projects to skip (ordered by name).
+        :return: List of project summaries.
+        """
+        from core.db.models import Branch, ProjectState
+
+        project_query = (
+            select(Project.id, Project.name, Project.folder_name)
+            .where(exists().where(Branch.project_id == Project.id, Branch.latest_step_index.is_not(None)))
+            .order_by(Project.name, Project.id)
+            .limit(limit)
+            .offset(offset)
+        )
+        projects = {
+            row.id: ProjectSummary(id=row.id, name=row.name, folder_name=row.folder_name)
+            for row in await session.execute(project_query)
+        }
+        if not projects:
+            return []
+
+        project_ids = project_query.with_only_columns(Project.id)
+        branch_query = (
+            select(
+                Branch.id,
+                Branch.project_id,
+                Branch.name,
+                Branch.latest_step_index,
+                ProjectState.created_at,
+            )
+            .join(
+                ProjectState,
+                and_(
+                    ProjectState.branch_id == Branch.id,
+                    ProjectState.step_index == Branch.latest_step_index,
+                ),
+            )
+            .where(Branch.project_id.in_(project_ids))
+            .order_by(Branch.name)
+        )
+        branches = {}
+        for row in await session.execute(branch_query):
+            branch = BranchSummary(
+                id=row.id,
+                name=row.name,
+                latest_step_index=row.latest_step_index,
+                updated_at=row.created_at,
+            )
+            branches[row.id] = branch
+            projects[row.project_id].branches.append(branch)
+
+        if include_steps:
+            step_query = (
+                select(ProjectState.branch_id, ProjectState.step_index, ProjectState.action, ProjectState.created_at)
+                .where(ProjectState.branch_id.in_(select(Branch.id).where(Branch.project_id.in_(project_ids))))
+                .order_by(ProjectState.step_index)
+            )
+            for row in await session.execute(step_query):
+                if row.branch_id in branches:
+                    branches[row.branch_id].steps.append(
+                        StepSummary(step_index=row.step_index, action=row.action, created_at=row.created_at)
+                    )
+
+        return list(projects.values())
+
     @staticmethod
     def get_folder_from_project_name(name: str):
         """
@@ -1,14 +1,18 @@
 from copy import deepcopy
 from datetime import datetime
-from typing import TYPE_CHECKING, Optional, Union
+from itertools import chain
+from typing import TYPE_CHECKING, Callable, Optional, Union
 from uuid import UUID, uuid4
 
-from sqlalchemy import ForeignKey, UniqueConstraint, delete, inspect
+from sqlalchemy import ForeignKey, UniqueConstraint, delete, event, inspect, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
+from sqlalchemy.orm.attributes import flag_modified, set_committed_value
+from sqlalchemy.orm.collections import collection_adapter
 from sqlalchemy.sql import func
+from sqlalchemy.types import JSON
 
+from core.db.json_patch import apply_patch, make_patch
 from core.db.models import Base, FileContent
 from core.log import get_logger
 
@@ -17,6 +21,22 @@ if TYPE_CHECKING:
 
 log = get_logger(__name__)
 
+# JSON fields that are stored as deltas against the previous state, with
+# the value stored in the database row in place of the full value.
+DELTA_FIELDS = {
+    "epics": [],
+    "tasks": [],
+    "steps": [],
+    "iterations": [],
+    "knowledge_base": {},
+    "relevant_files": None,
+    "modified_files": {},
+    "docs": None,
+}
+
+# Session.info key for the full snapshot interval (see `DBConfig.state_snapshot_interval`)
+SNAPSHOT_INTERVAL_KEY = "state_snapshot_interval"
+
 
 class TaskStatus:
     """Status of a task."""
@@ -58,7 +78,7 @@ class ProjectState(Base):
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     branch_id: Mapped[UUID] = mapped_column(ForeignKey("branches.id", ondelete="CASCADE"))
     prev_state_id: Mapped[Optional[UUID]] = mapped_column(ForeignKey("project_states.id", ondelete="CASCADE"))
-    specification_id: Mapped[int] = mapped_column(ForeignKey("specifications.id"))
+    specification_id: Mapped[int] = mapped_column(ForeignKey("specifications.id"), index=True)
 
     # Attributes
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
@@ -73,6 +93,8 @@ class ProjectState(Base):
     docs: Mapped[Optional[list[dict]]] = mapped_column(default=None)
     run_command: Mapped[Optional[str]] = mapped_column()
     action: Mapped[Optional[str]] = mapped_column()
+    # JSON patches of the DELTA_FIELDS against the previous state, or None for full snapshots
+    delta: Mapped[Optional[dict]] = mapped_column(JSON(none_as_null=True), default=None)
 
     # Relationships
     branch: Mapped["Branch"] = relationship(back_populates="states", lazy="selectin")
@@ -84,16 +106,36 @@ class ProjectState(Base):
         cascade="delete",
     )
     next_state: Mapped[Optional["ProjectState"]] = relationship(back_populates="prev_state", lazy="raise")
+    # File rows are shared between states (see `File`), so this is a read-only
+    # view; the changes are written to the database in `_store_files()`.
     files: Mapped[list["File"]] = relationship(
-        back_populates="project_state",
+        primaryjoin=(
+            "and_(foreign(File.branch_id) == ProjectState.branch_id, "
+            "File.first_step <= ProjectState.step_index, "
+            "or_(File.last_step.is_(None), File.last_step >= ProjectState.step_index))"
+        ),
+        viewonly=True,
         lazy="selectin",
-        cascade="all,delete-orphan",
     )
     specification: Mapped["Specification"] = relationship(back_populates="project_states", lazy="selectin")
     llm_requests: Mapped[list["LLMRequest"]] = relationship(back_populates="project_state", cascade="all", lazy="raise")
     user_inputs: Mapped[list["UserInput"]] = relationship(back_populates="project_state", cascade="all", lazy="raise")
     exec_logs: Mapped[list["ExecLog"]] = relationship(back_populates="project_state", cascade="all", lazy="raise")
 
+    @property
+    def cache_key(self) -> Optional[tuple]:
+        """
+        Key identifying the state contents, used to memoize rendered prompt partials.
+
+        Committed states don't change, with the exception of the relevant
+        files, which agents may update on the current state.
+
+        :return: Cache key, or None if the state hasn't been saved yet.
+        """
+        if self.id is None:
+            return None
+        return (self.id, tuple(self.relevant_files or ()))
+
     @property
     def unfinished_steps(self) -> list[dict]:
         """
@@ -112,8 +154,7 @@ class ProjectState(Base):
 
         :return: The current step, or None if there are no more unfinished steps.
         """
-        li = self.unfinished_steps
-        return li[0] if li else None
+        return self._first_unfinished("steps", lambda step: not step.get("completed"))
 
     @property
     def unfinished_iterations(self) -> list[dict]:
@@ -135,8 +176,9 @@ class ProjectState(Base):
 
         :return: The current iteration, or None if there are no unfinished iterations.
         """
-        li = self.unfinished_iterations
-        return li[0] if li else None
+        return self._first_unfinished(
+            "iterations", lambda iteration: iteration.get("status") not in (None, IterationStatus.DONE)
+        )
 
     @property
     def unfinished_tasks(self) -> list[dict]:
@@ -156,8 +198,7 @@ class ProjectState(Base):
 
         :return: The current task, or None if there are no unfinished tasks.
         """
-        li = self.unfinished_tasks
-        return li[0] if li else None
+        return self._first_unfinished("tasks", lambda task: task.get("status") != TaskStatus.DONE)
 
     @property
     def unfinished_epics(self) -> list[dict]:
@@ -177,8 +218,33 @@ class ProjectState(Base):
 
         :return: The current epic, or None if there are no unfinished epics.
         """
-        li = self.unfinished_epics
-        return li[0] if li else None
+        return self._first_unfinished("epics", lambda epic: not epic.get("completed"))
+
+    def _first_unfinished(self, field: str, is_unfinished: Callable[[dict], bool]) -> Optional[dict]:
+        """
+        Get the first unfinished item in a list field, using a cursor.
+
+        The cursor remembers the position of the first unfinished item, so
+        items before it aren't checked again. When the item is finished, the
+        search continues from there. The cursor is reset when the list is
+        replaced or flagged as modified (see `_reset_cursor()`), as the
+        earlier items may have changed.
+
+        :param field: Name of the list field (eg. "tasks").
+        :param is_unfinished: Function checking whether the item is unfinished.
+        :return: The first unfinished item, or None if there are none.
+        """
+        items = getattr(self, field)
+        cursors = self.__dict__.setdefault("_cursors", {})
+        cursor_items, index = cursors.get(field, (None, 0))
+        if cursor_items is not items or index > len(items):
+            index = 0
+
+        while index < len(items) and not is_unfinished(items[index]):
+            index += 1
+
+        cursors[field] = (items, index)
+        return items[index] if index < len(items) else None
 
     @property
     def relevant_file_objects(self):
@@ -214,6 +280,66 @@ class ProjectState(Base):
             step_index=1,
         )
 
+    def _has_full_values(self) -> bool:
+        """
+        Check whether the in-memory state has the full values of the delta-encoded fields.
+
+        This is the case for states stored as full snapshots, states whose
+        deltas have been applied, and states created in this session.
+        """
+        return self.delta is None or self.__dict__.get("_deltas_applied", False)
+
+    async def apply_deltas(self):
+        """
+        Reconstruct the fields of a state that's stored as a delta.
+
+        Loads the closest full snapshot preceding this state in the branch
+        and applies the deltas of all the states after it, up to and including
+        this one. Does nothing if the state is stored in full.
+
+        See `DBConfig.state_snapshot_interval` for details.
+        """
+        if self._has_full_values():
+            return
+
+        session: AsyncSession = inspect(self).async_session
+        if session is None:
+            raise ValueError("Project state instance not associated with a DB session.")
+
+        snapshot_index = (
+            await session.execute(
+                select(func.max(ProjectState.step_index)).where(
+                    ProjectState.branch_id == self.branch_id,
+                    ProjectState.step_index < self.step_index,
+                    ProjectState.delta.is_(None),
+                )
+            )
+        ).scalar_one_or_none()
+        if snapshot_index is None:
+            raise ValueError(f"No full snapshot found for project state {self.id}")
+
+        rows = await session.execute(
+            select(ProjectState.delta, *(getattr(ProjectState, field) for field in DELTA_FIELDS))
+            .where(
+                ProjectState.branch_id == self.branch_id,
+                ProjectState.step_index >= snapshot_index,
+                ProjectState.step_index <= self.step_index,
+            )
+            .order_by(ProjectState.step_index)
+        )
+
+        values = None
+        for delta, *fields in rows:
+            if values is None:
+                values = dict(zip(DELTA_FIELDS, fields))
+                continue
+            for field, patch in delta.items():
+                values[field] = apply_patch(values[field], patch)
+
+        for field, value in values.items():
+            set_committed_value(self, field, value)
+        self._deltas_applied = True
+
     async def create_next_state(self) -> "ProjectState":
         """
         Create the next project state for the branch.
@@ -230,6 +356,13 @@ class ProjectState(Base):
         if "next_state" in self.__dict__:
             raise ValueError(f"Next state already exists for state with id={self.id}.")
 
+        # The new state shares the file rows with this one until they're
+        # modified (see `_file_for_update()`).
+        # NOTE: we only need the await here because of the tests, in live, the
+        # load_project() and commit() methods on StateManager make sure that
+        # the the files are eagerly loaded.
+        files = list(await self.awaitable_attrs.files)
+
         new_state = ProjectState(
             branch=self.branch,
             prev_state=self,
@@ -240,42 +373,37 @@ class ProjectState(Base):
             steps=deepcopy(self.steps),
             iterations=deepcopy(self.iterations),
             knowledge_base=deepcopy(self.knowledge_base),
-            files=[],
             relevant_files=deepcopy(self.relevant_files),
             modified_files=deepcopy(self.modified_files),
             docs=deepcopy(self.docs),
             run_command=self.run_command,
         )
+        # The collection is a read-only view, so there's no need to track the changes
+        set_committed_value(new_state, "files", list(files))
+        new_state._base_files = files
 
         session: AsyncSession = inspect(self).async_session
         session.add(new_state)
 
-        # NOTE: we only need the await here because of the tests, in live, the
-        # load_project() and commit() methods on StateManager make sure that
-        # the the files are eagerly loaded.
-        for file in await self.awaitable_attrs.files:
-            clone = file.clone()
-            new_state.files.append(clone)
-
         return new_state
 
     def complete_step(self, step_type: str):
-        if not self.unfinished_steps:
+        if not self.current_step:
             raise ValueError("There are no unfinished steps to complete")
         if "next_state" in self.__dict__:
             raise ValueError("Current state is read-only (already has a next state).")
 
-        log.debug(f"Completing step {self.unfinished_steps[0]['type']}")
+        log.debug(f"Completing step {self.current_step['type']}")
         self.get_steps_of_type(step_type)[0]["completed"] = True
         flag_modified(self, "steps")
 
     def complete_task(self):
-        if not self.unfinished_tasks:
+        if not self.current_task:
             raise ValueError("There are no unfinished tasks to complete")
         if "next_state" in self.__dict__:
             raise ValueError("Current state is read-only (already has a next state).")
 
-        log.debug(f"Completing task {self.unfinished_tasks[0]['description']}")
+        log.debug(f"Completing task {self.current_task['description']}")
         self.set_current_task_status(TaskStatus.DONE)
         self.steps = []
         self.iterations = []
@@ -284,28 +412,28 @@ class ProjectState(Base):
         self.docs = None
         flag_modified(self, "tasks")
 
-        if not self.unfinished_tasks and self.unfinished_epics:
+        if not self.current_task and self.current_epic:
             self.complete_epic()
 
     def complete_epic(self):
-        if not self.unfinished_epics:
+        if not self.current_epic:
             raise ValueError("There are no unfinished epics to complete")
         if "next_state" in self.__dict__:
             raise ValueError("Current state is read-only (already has a next state).")
 
-        log.debug(f"Completing epic {self.unfinished_epics[0]['name']}")
-        self.unfinished_epics[0]["completed"] = True
+        log.debug(f"Completing epic {self.current_epic['name']}")
+        self.current_epic["completed"] = True
         self.tasks = []
         flag_modified(self, "epics")
 
     def complete_iteration(self):
-        if not self.unfinished_iterations:
+        if not self.current_iteration:
             raise ValueError("There are no unfinished iterations to complete")
         if "next_state" in self.__dict__:
             raise ValueError("Current state is read-only (already has a next state).")
 
-        log.debug(f"Completing iteration {self.unfinished_iterations[0]}")
-        self.unfinished_iterations[0]["status"] = IterationStatus.DONE
+        log.debug(f"Completing iteration {self.current_iteration}")
+        self.current_iteration["status"] = IterationStatus.DONE
         self.relevant_files = None
         self.modified_files = {}
         self.flag_iterations_as_modified()
@@ -371,11 +499,22 @@ class ProjectState(Base):
         :param path: The file path.
         :return: The file object, or None if not found.
         """
-        for file in self.files:
-            if file.path == path:
-                return file
+        return self._file_index.get(path)
+
+    @property
+    def _file_index(self) -> dict[str, "File"]:
+        """
+        Index of the files by path.
 
-        return None
+        The index is updated by the methods changing the files, and rebuilt
+        if the files are reloaded or changed directly (eg. appended to).
+        """
+        files = self.files
+        indexed_files, index = self.__dict__.get("_file_index_state", (None, None))
+        if indexed_files is not files or len(index) != len(files):
+            index = {file.path: file for file in files}
+            self.__dict__["_file_index_state"] = (files, index)
+        return index
 
     def get_file_content_by_path(self, path: str) -> Union[FileContent, str]:
         """
@@ -413,11 +552,14 @@ class ProjectState(Base):
         file = self.get_file_by_path(path)
         if file:
             original_content = file.content.content
+            file = self._file_for_update(file)
             file.content = content
         else:
             original_content = ""
-            file = File(path=path, content=content)
-            self.files.append(file)
+            file = File(path=path, content=content, first_step=self.step_index)
+            index = self._file_index
+            collection_adapter(self.files).append_without_event(file)
+            index[path] = file
 
         if path not in self.modified_files and not external:
             self.modified_files[path] = original_content
@@ -428,11 +570,70 @@ class ProjectState(Base):
 
         return file
 
+    def update_file_meta(self, path: str, meta: dict) -> "File":
+        """
+        Update the metadata (eg. description) of a file in the project state.
+
+        :param path: The file path.
+        :param meta: The new file metadata.
+        :return: The (unsaved) file object.
+        """
+        if "next_state" in self.__dict__:
+            raise ValueError("Current state is read-only (already has a next state).")
+
+        file = self.get_file_by_path(path)
+        if file is None:
+            raise ValueError(f"File not found: {path}")
+
+        file = self._file_for_update(file)
+        file.meta = meta
+        return file
+
+    def delete_file(self, path: str):
+        """
+        Delete a file from the project state.
+
+        :param path: The file path.
+        """
+        if "next_state" in self.__dict__:
+            raise ValueError("Current state is read-only (already has a next state).")
+
+        file = self.get_file_by_path(path)
+        if file is None:
+            raise ValueError(f"File not found: {path}")
+
+        index = self._file_index
+        collection_adapter(self.files).remove_without_event(file)
+        del index[path]
+
+    def _file_for_update(self, file: "File") -> "File":
+        """
+        Get a version of the file that can be modified in this state.
+
+        If the file row is shared with the previous states, it's replaced
+        with a copy (the original row is closed when the state is saved).
+
+        :param file: The file object from `self.files`.
+        :return: File object that can be modified.
+        """
+        if file.first_step is None or file.first_step == self.step_index:
+            return file
+
+        clone = file.clone()
+        clone.first_step = self.step_index
+        # The file objects are shared between states, so bypass the collection
+        # events (which track a single parent for each object)
+        list.__setitem__(self.files, self.files.index(file), clone)
+        self._file_index[clone.path] = clone
+        return clone
+
     async def delete_after(self):
         """
         Delete all states in the branch after this one.
         """
 
+        from core.db.models import Branch, File
+
         session: AsyncSession = inspect(self).async_session
 
         log.debug(f"Deleting all project states in branch {self.branch_id} after {self.id}")
@@ -442,6 +643,25 @@ class ProjectState(Base):
                 ProjectState.step_index > self.step_index,
             )
         )
+        await session.execute(
+            update(Branch)
+            .where(Branch.id == self.branch_id)
+            .values(latest_step_index=self.step_index)
+            .execution_options(synchronize_session=False)
+        )
+        branch = self.__dict__.get("branch")
+        if branch is not None:
+            set_committed_value(branch, "latest_step_index", self.step_index)
+        # Files created in the deleted states are deleted with them, and the
+        # ones deleted or modified in those states are part of this one again.
+        await session.execute(
+            update(File)
+            .where(
+                File.branch_id == self.branch_id,
+                File.last_step >= self.step_index,
+            )
+            .values(last_step=None)
+        )
 
     def get_last_iteration_steps(self) -> list:
         """
@@ -493,3 +713,161 @@ class ProjectState(Base):
         :return: True if the current epic is a feature, False otherwise.
         """
         return self.epics and self.current_epic and self.current_epic.get("source") == "feature"
+
+
+def _store_delta(_mapper, _connection, target: ProjectState):
+    """
+    Store the state as a delta against the previous state, if enabled.
+
+    The full values are replaced with placeholders for the duration of the
+    INSERT/UPDATE statement and restored afterwards in `_restore_full_values`,
+    so the in-memory state always has the full values.
+    """
+    session = Session.object_session(target)
+    interval = session.info.get(SNAPSHOT_INTERVAL_KEY) if session else None
+    prev_state = target.__dict__.get("prev_state")
+
+    if interval is None or prev_state is None or not prev_state._has_full_values() or target.step_index % interval == 0:
+        if target.delta is not None:
+            # Previously stored as delta, store the full values now
+            target.delta = None
+            for field in DELTA_FIELDS:
+                flag_modified(target, field)
+        return
+
+    full_values = {field: getattr(target, field) for field in DELTA_FIELDS}
+    delta = {}
+    for field, value in full_values.items():
+        patch = make_patch(getattr(prev_state, field), value)
+        if patch:
+            delta[field] = patch
+
+    target._full_values = full_values
+    target.delta = delta
+    for field, placeholder in DELTA_FIELDS.items():
+        setattr(target, field, deepcopy(placeholder))
+
+
+def _restore_full_values(_mapper, _connection, target: ProjectState):
+    full_values = target.__dict__.pop("_full_values", None)
+    if full_values is None:
+        return
+
+    for field, value in full_values.items():
+        set_committed_value(target, field, value)
+    target._deltas_applied = True
+
+
+def _update_latest_step(_mapper, connection, target: ProjectState):
+    """
+    Update the latest step index of the branch when a new state is added.
+    """
+    from core.db.models import Branch
+
+    branches = Branch.__table__
+    connection.execute(
+        branches.update()
+        .where(
+            branches.c.id == target.branch_id,
+            or_(branches.c.latest_step_index.is_(None), branches.c.latest_step_index < target.step_index),
+        )
+        .values(latest_step_index=target.step_index)
+    )
+    branch = target.__dict__.get("branch")
+    if branch is not None and (branch.latest_step_index or 0) < target.step_index:
+        set_committed_value(branch, "latest_step_index", target.step_index)
+
+
+def _update_next_state_delta(session: Session, _flush_context, _instances):
+    """
+    Recompute the delta of the next state if the previous state has been modified.
+    """
+    if session.info.get(SNAPSHOT_INTERVAL_KEY) is None:
+        return
+
+    for obj in session.dirty:
+        if not isinstance(obj, ProjectState) or not session.is_modified(obj):
+            continue
+        next_state = obj.__dict__.get("next_state")
+        if next_state is not None and inspect(next_state).persistent and inspect(next_state).session is session:
+            flag_modified(next_state, "delta")
+
+
+def _store_files(session: Session, _flush_context, _instances):
+    """
+    Write the file changes of the states being saved.
+
+    New (or modified) files are inserted as new rows created in the state,
+    and the rows of the removed (or modified) files from the previous state
+    are closed, so they're no longer part of this state. Only the latest
+    state in the branch (one without the next state) can change files.
+    """
+    for state in list(chain(session.new, session.identity_map.values())):
+        if not isinstance(state, ProjectState) or "files" not in state.__dict__:
+            continue
+        if state.__dict__.get("next_state") is not None:
+            continue
+        if not inspect(state).pending and "_base_files" not in state.__dict__ and "_stored_files" not in state.__dict__:
+            # Loaded from the database and not modified
+            continue
+
+        files = state.__dict__["files"]
+        step_index = state.step_index
+        base = state.__dict__.get("_base_files", [])
+        stored = state.__dict__.get("_stored_files", [])
+        stored_ids = {id(file) for file in stored}
+        for file in files:
+            if id(file) in stored_ids:
+                # Already handled in a previous flush
+                continue
+            # Plain attribute lookups, as this runs for every file in the project
+            values = file.__dict__
+            first_step = values["first_step"] if "first_step" in values else file.first_step
+            if first_step is None:
+                file.first_step = first_step = step_index
+            if first_step == step_index:
+                if inspect(file).transient:
+                    # Set the ID rather than the relationship, so the files don't
+                    # keep the (old) states in memory
+                    if state.id is None:
+                        state.id = uuid4()
+                    file.project_state_id = state.id
+                    file.branch = state.branch
+                    session.add(file)
+                continue
+            last_step = values["last_step"] if "last_step" in values else file.last_step
+            if last_step is not None and last_step < step_index:
+                file.last_step = None
+
+        current_ids = {id(file) for file in files}
+        for file in chain(base, stored):
+            if id(file) in current_ids:
+                continue
+            if file.first_step != step_index:
+                if file.last_step is None or file.last_step >= step_index:
+                    file.last_step = step_index - 1
+            elif inspect(file).persistent:
+                session.delete(file)
+            elif inspect(file).pending:
+                session.expunge(file)
+
+        state._stored_files = list(files)
+
+
+def _reset_cursor(target: ProjectState, initiator):
+    """
+    Reset the cursor of a list field flagged as modified (see `ProjectState._first_unfinished()`).
+    """
+    target.__dict__.get("_cursors", {}).pop(initiator.key, None)
+
+
+for _field in ("epics", "tasks", "steps", "iterations"):
+    event.listen(getattr(ProjectState, _field), "modified", _reset_cursor)
+
+event.listen(ProjectState, "before_insert", _store_delta)
+event.listen(ProjectState, "before_update", _store_delta)
+event.listen(ProjectState, "after_insert", _restore_full_values)
+event.listen(ProjectState, "after_insert", _update_latest_step)
+event.listen(ProjectState, "after_update", _restore_full_values)
+event.listen(Session, "before_flush", _update_next_state_delta)
+event.listen(Session, "before_flush", _store_files)
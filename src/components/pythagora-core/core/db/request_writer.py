@@ -0,0 +1,126 @@
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+from uuid import UUID
+
+from sqlalchemy.pool import StaticPool
+
+from core.db.models import LLMRequest
+from core.llm.request_log import LLMRequestLog
+from core.log import get_logger
+
+if TYPE_CHECKING:
+    from core.db.session import SessionManager
+
+log = get_logger(__name__)
+
+
+@dataclass
+class PendingLLMRequest:
+    request_log: LLMRequestLog
+    branch_id: UUID
+    project_state_id: Optional[UUID]
+    agent: Optional[str]
+
+
+class LLMRequestWriter:
+    """
+    Writes the LLM request logs to the database in the background.
+
+    The request logs are queued with `add()` and written in batches, using a
+    separate database session, when `schedule()` is called (after each
+    project state commit). This keeps the (potentially large) request logs
+    out of the project state transactions.
+
+    If the database uses a single shared connection (in-memory SQLite),
+    the writes can't run alongside the main session, so `schedule()`
+    writes the logs immediately instead.
+    """
+
+    def __init__(self, session_manager: "SessionManager"):
+        """
+        Initialize the writer.
+
+        :param session_manager: Session manager for the database.
+        """
+        self.session_manager = session_manager
+        self.pending: list[PendingLLMRequest] = []
+        self.task: Optional[asyncio.Task] = None
+        self.background = not isinstance(session_manager.engine.pool, StaticPool)
+
+    def add(
+        self,
+        request_log: LLMRequestLog,
+        *,
+        branch_id: UUID,
+        project_state_id: Optional[UUID],
+        agent: Optional[str] = None,
+    ):
+        """
+        Queue the request log for writing.
+
+        :param request_log: Request log.
+        :param branch_id: ID of the branch to associate the request log with.
+        :param project_state_id: ID of the project state to associate the request log with.
+        :param agent: Type of the agent that made the request (if the caller was an agent).
+        """
+        self.pending.append(PendingLLMRequest(request_log, branch_id, project_state_id, agent))
+
+    async def schedule(self):
+        """
+        Start writing the queued request logs.
+
+        Requests queued while the writer is running are picked up
+        by the same run.
+        """
+        if not self.pending:
+            return
+        if not self.background:
+            await self.flush()
+        elif self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run(retry=True))
+
+    async def flush(self):
+        """
+        Write all queued request logs and wait for the writes to finish.
+
+        Request logs that can't be written are dropped (and the error is logged).
+        """
+        if self.task is not None:
+            await self.task
+            self.task = None
+        await self._run(retry=False)
+
+    async def _run(self, retry: bool):
+        """
+        Write the queued request logs until the queue is empty.
+
+        :param retry: Whether to keep the request logs in the queue if writing
+            fails (eg. the database is locked), to retry on the next run.
+        """
+        while self.pending:
+            batch, self.pending = self.pending, []
+            try:
+                await self._write(batch)
+            except Exception as err:  # noqa
+                if retry:
+                    log.warning(f"Error writing {len(batch)} LLM request logs (will retry later): {err}")
+                    self.pending[:0] = batch
+                else:
+                    log.error(f"Error writing {len(batch)} LLM request logs: {err}", exc_info=True)
+                return
+
+    async def _write(self, batch: list[PendingLLMRequest]):
+        async with self.session_manager.SessionClass() as session:
+            for item in batch:
+                await LLMRequest.from_request_log(
+                    session,
+                    item.request_log,
+                    branch_id=item.branch_id,
+                    project_state_id=item.project_state_id,
+                    agent=item.agent,
+                )
+            await session.commit()
+
+
+__all__ = ["LLMRequestWriter"]
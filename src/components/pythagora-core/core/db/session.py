@@ -1,11 +1,29 @@
-from sqlalchemy import event
+from sqlalchemy import event, make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from core.config import DBConfig
+from core.config import DBConfig, SQLiteProfile
+from core.db.models.file_content import COMPRESS_KEY as FILE_CONTENT_COMPRESS_KEY
+from core.db.models.file_content import file_content_cache
+from core.db.models.project_state import SNAPSHOT_INTERVAL_KEY as STATE_SNAPSHOT_INTERVAL_KEY
 from core.log import get_logger
 
 log = get_logger(__name__)
 
+# Connection settings for the SQLite "performance" profile (see `DBConfig.sqlite_profile`)
+SQLITE_PERFORMANCE_PRAGMAS = {
+    # Readers don't block the writer, and commits only append to the log
+    "journal_mode": "wal",
+    # In WAL mode, this can't corrupt the database, but the last commits
+    # may be lost on power failure
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative value is the size in KiB
+    "cache_size": -64 * 1024,
+    "temp_store": "memory",
+}
+SQLITE_POOL_SIZE = 2
+
 
 class SessionManager:
     """
@@ -25,12 +43,35 @@ class SessionManager:
         :param config: Database configuration.
         """
         self.config = config
+        url = make_url(config.url)
+        self.is_sqlite = url.get_backend_name() == "sqlite"
+        self.sqlite_pragmas = {"foreign_keys": "on"}
+        engine_options = {}
+        if self.is_sqlite and config.sqlite_profile == SQLiteProfile.PERFORMANCE:
+            self.sqlite_pragmas.update(SQLITE_PERFORMANCE_PRAGMAS)
+            if url.database not in (None, "", ":memory:"):
+                # SQLite uses NullPool for database files by default, opening
+                # a new connection (and aiosqlite thread) for every session.
+                # In-memory databases use a single (static) connection already.
+                engine_options = {"poolclass": AsyncAdaptedQueuePool, "pool_size": SQLITE_POOL_SIZE}
+
         self.engine = create_async_engine(
-            self.config.url, echo=config.debug_sql, echo_pool="debug" if config.debug_sql else None
+            self.config.url,
+            echo=config.debug_sql,
+            echo_pool="debug" if config.debug_sql else None,
+            **engine_options,
+        )
+        self.SessionClass = async_sessionmaker(
+            self.engine,
+            expire_on_commit=False,
+            info={
+                STATE_SNAPSHOT_INTERVAL_KEY: config.state_snapshot_interval,
+                FILE_CONTENT_COMPRESS_KEY: config.compress_file_contents,
+            },
         )
-        self.SessionClass = async_sessionmaker(self.engine, expire_on_commit=False)
         self.session = None
         self.recursion_depth = 0
+        file_content_cache.resize(config.file_content_cache_size * 1024 * 1024)
 
         event.listen(self.engine.sync_engine, "connect", self._on_connect)
 
@@ -38,12 +79,9 @@ class SessionManager:
         """Connection event handler"""
         log.debug(f"Connected to database {self.config.url}")
 
-        if self.config.url.startswith("sqlite"):
-            # Note that SQLite uses NullPool by default, meaning every session creates a
-            # database "connection". This is fine and preferred for SQLite because
-            # it's a local file. PostgreSQL or other database use a real connection pool
-            # by default.
-            dbapi_connection.execute("pragma foreign_keys=on")
+        if self.is_sqlite:
+            for name, value in self.sqlite_pragmas.items():
+                dbapi_connection.execute(f"pragma {name}={value}")
 
     async def start(self) -> AsyncSession:
         if self.session is not None:
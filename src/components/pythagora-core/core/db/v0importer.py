@@ -162,7 +162,7 @@ class LegacyDatabaseImporter:
         :return: Number of projects saved to the new database.
         """
         async with self.session_manager as session:
-            projects = await Project.get_all_projects(session)
+            projects = await Project.get_summaries(session, include_steps=False)
 
         for project in projects:
             imported_app = info.pop(project.id.hex, None)
@@ -263,12 +263,13 @@ class LegacyDatabaseImporter:
         await self.state_manager.commit()
 
     async def save_task_files(self, files: dict):
-        for path, file_info in files.items():
-            await self.state_manager.save_file(
-                path,
-                file_info["content"],
-                metadata={
+        await self.state_manager.save_files(
+            {path: file_info["content"] for path, file_info in files.items()},
+            metadata={
+                path: {
                     "description": file_info["description"],
                     "references": [],
-                },
-            )
+                }
+                for path, file_info in files.items()
+            },
+        )
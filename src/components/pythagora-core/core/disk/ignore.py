@@ -1,7 +1,141 @@
 import os.path
-from fnmatch import fnmatch
+import re
+import stat
+from fnmatch import translate
 from typing import Optional
 
+# Project's own ignore files, applied in addition to the configured patterns
+GITIGNORE_FILE = ".gitignore"
+
+# Number of bytes read when checking whether a file is binary
+BINARY_CHECK_SIZE = 128 * 1024
+
+
+def _compile_patterns(patterns: list[str]) -> Optional[re.Pattern]:
+    """
+    Compile shell-like patterns (see `fnmatch`) into a single regular expression.
+
+    :param patterns: List of patterns.
+    :return: Compiled expression, or None if there are no patterns.
+    """
+    if not patterns:
+        return None
+    if os.name == "nt":
+        # Windows paths are case insensitive, and may use "\\" as separator
+        return re.compile("|".join(translate(pattern.replace("\\", "/")) for pattern in patterns), re.IGNORECASE)
+    return re.compile("|".join(translate(pattern) for pattern in patterns))
+
+
+def _translate_gitignore(pattern: str) -> str:
+    """
+    Translate a gitignore glob (see `man gitignore`) into a regular expression.
+
+    :param pattern: The glob, with the leading "!" and trailing "/" removed.
+    :return: Regular expression matching the paths relative to the .gitignore directory.
+    """
+    if pattern.startswith("/") or "/" in pattern:
+        anchored = True
+        pattern = pattern.lstrip("/")
+    else:
+        anchored = False
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i) and i + 2 == len(pattern) and (i == 0 or pattern[i - 1] == "/"):
+            parts.append(".*")
+            i += 2
+        elif c == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif c == "?":
+            parts.append("[^/]")
+            i += 1
+        elif c == "[":
+            # "]" right after the opening bracket (or negation) is a literal
+            start = i + 3 if pattern.startswith(("[!", "[^"), i) else i + 2
+            end = pattern.find("]", start)
+            if end < 0:
+                parts.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+
+    regex = "".join(parts)
+    # Unanchored patterns match at any depth; matching a directory also matches its contents
+    return f"{'' if anchored else '(?:.*/)?'}{regex}"
+
+
+class GitIgnore:
+    """
+    Rules from a single .gitignore file.
+    """
+
+    def __init__(self, lines: list[str]):
+        """
+        Parse the .gitignore rules.
+
+        :param lines: Lines of the .gitignore file.
+        """
+        # List of (regex, negated, directories only) tuples, in file order
+        self.rules: list[tuple[re.Pattern, bool, bool]] = []
+        flags = re.IGNORECASE if os.name == "nt" else 0
+
+        for line in lines:
+            line = line.rstrip("\n\r")
+            if not line.strip() or line.startswith("#"):
+                continue
+            if not line.endswith("\\ "):
+                line = line.rstrip(" ")
+
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            elif line.startswith("\\!") or line.startswith("\\#"):
+                line = line[1:]
+
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+
+            try:
+                regex = re.compile(_translate_gitignore(line) + r"\Z", flags)
+            except re.error:
+                # Git ignores invalid patterns as well
+                continue
+            self.rules.append((regex, negated, dir_only))
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Check the path against the rules.
+
+        :param path: Path relative to the .gitignore directory (using "/").
+        :param is_dir: Whether the path is a directory.
+        :return: True if ignored, False if explicitly not ignored (negated),
+            or None if no rule matches.
+        """
+        for regex, negated, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path):
+                return not negated
+        return None
+
 
 class IgnoreMatcher:
     """
@@ -15,6 +149,7 @@ class IgnoreMatcher:
         ignore_paths: list[str],
         *,
         ignore_size_threshold: Optional[int] = None,
+        use_gitignore: bool = False,
     ):
         """
         Initialize the IgnoreMatcher object.
@@ -24,13 +159,26 @@ class IgnoreMatcher:
         "?" for a single character). Paths are normalized, so "/" works on both
         Unix and Windows, and Windows matching is case insensitive.
 
+        If `use_gitignore` is set, the project's .gitignore files (in any
+        directory) are also honored, using the gitignore rules.
+
         :param root_path: Root path to use when checking files on disk.
         :param ignore_paths: List of patterns to ignore.
         :param ignore_size_threshold: Files larger than this size will be ignored.
+        :param use_gitignore: Whether to honor the project's .gitignore files.
         """
         self.root_path = root_path
         self.ignore_paths = ignore_paths
         self.ignore_size_threshold = ignore_size_threshold
+        self.use_gitignore = use_gitignore
+        self._regex = _compile_patterns(ignore_paths)
+
+        # Parsed .gitignore files, by directory (None if there's no .gitignore)
+        self._gitignores: dict[str, Optional[GitIgnore]] = {}
+        # Whether the directories are ignored by the .gitignore files
+        self._gitignored_dirs: dict[str, bool] = {}
+        # Binary/size verdicts, by path: (inode, size, mtime_ns, verdict)
+        self._verdicts: dict[str, tuple[int, int, int, bool]] = {}
 
     def ignore(self, path: str) -> bool:
         """
@@ -39,20 +187,50 @@ class IgnoreMatcher:
         :param path: (Relative) path to the file or directory to check
         :return: True if the path matches any of the ignore patterns, False otherwise
         """
-
-        full_path = os.path.normpath(os.path.join(self.root_path, path))
-
+        path = self._normalize(path)
         if self._is_in_ignore_list(path):
             return True
 
-        if self._is_large_file(full_path):
+        try:
+            st = os.stat(os.path.join(self.root_path, path))
+        except (OSError, ValueError):
+            # Missing files are ignored, same as any other non-regular files
+            return True
+
+        is_dir = stat.S_ISDIR(st.st_mode)
+        if self.use_gitignore and self._is_gitignored(path, is_dir):
             return True
 
-        # Binary files are always ignored
-        if self._is_binary(full_path):
+        # We don't handle directories here
+        if is_dir:
+            return False
+
+        # This also ignores things that are not regular files (eg. sockets)
+        if not stat.S_ISREG(st.st_mode):
             return True
 
-        return False
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        cached = self._verdicts.get(path)
+        if cached is not None and cached[:3] == key:
+            return cached[3]
+
+        full_path = os.path.join(self.root_path, path)
+        verdict = self._is_large_file(st.st_size) or self._is_binary(full_path)
+        self._verdicts[path] = (*key, verdict)
+        return verdict
+
+    def reload_gitignores(self):
+        """
+        Forget the cached .gitignore files, to pick up the changes to them.
+        """
+        self._gitignores.clear()
+        self._gitignored_dirs.clear()
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        # We use "/" internally on all platforms, including win32
+        path = os.path.normpath(path).replace(os.sep, "/")
+        return "" if path == "." else path
 
     def _is_in_ignore_list(self, path: str) -> bool:
         """
@@ -63,58 +241,83 @@ class IgnoreMatcher:
         :param path: The path to the file or directory to check
         :return: True if the path matches any of the ignore patterns, False otherwise.
         """
-        name = os.path.basename(path)
-        for pattern in self.ignore_paths:
-            if fnmatch(name, pattern) or fnmatch(path, pattern):
-                return True
-        return False
+        if self._regex is None:
+            return False
+        name = path.rsplit("/", 1)[-1]
+        return bool(self._regex.match(name) or self._regex.match(path))
 
-    def _is_large_file(self, full_path: str) -> bool:
+    def _get_gitignore(self, directory: str) -> Optional[GitIgnore]:
         """
-        Check if the given file is larger than the threshold.
+        Get the (parsed) .gitignore file in the directory.
 
-        This also returns True if the file doesn't or is not a regular file (eg.
-        it's a symlink), since we want to ignore those kinds of files as well.
+        :param directory: Directory path, relative to project root ("" for the root).
+        :return: The .gitignore rules, or None if there's no .gitignore file.
+        """
+        if directory not in self._gitignores:
+            gitignore = None
+            try:
+                with open(os.path.join(self.root_path, directory, GITIGNORE_FILE), "r", encoding="utf-8") as f:
+                    gitignore = GitIgnore(f.readlines())
+            except (OSError, UnicodeDecodeError):
+                pass
+            self._gitignores[directory] = gitignore
+        return self._gitignores[directory]
 
-        :param path: Full path to the file to check.
-        :return: True if the file is larger than the threshold, False otherwise.
+    def _is_gitignored(self, path: str, is_dir: bool) -> bool:
         """
-        if self.ignore_size_threshold is None:
-            return False
+        Check if the path is ignored by the project's .gitignore files.
 
-        # We don't handle directories here
-        if os.path.isdir(full_path):
-            return False
+        Rules in deeper .gitignore files take precedence, and a path inside
+        an ignored directory is always ignored.
 
-        if not os.path.isfile(full_path):
-            return True
+        :param path: Normalized path to the file or directory.
+        :param is_dir: Whether the path is a directory.
+        :return: True if the path is ignored, False otherwise.
+        """
+        if is_dir and path in self._gitignored_dirs:
+            return self._gitignored_dirs[path]
 
-        try:
-            return bool(os.path.getsize(full_path) > self.ignore_size_threshold)
-        except:  # noqa
-            return True
+        parts = path.split("/")
+        if len(parts) > 1 and self._is_gitignored("/".join(parts[:-1]), True):
+            ignored = True
+        else:
+            ignored = False
+            for base in range(len(parts)):
+                gitignore = self._get_gitignore("/".join(parts[:base]))
+                if gitignore is None:
+                    continue
+                match = gitignore.match("/".join(parts[base:]), is_dir)
+                if match is not None:
+                    ignored = match
+
+        if is_dir:
+            self._gitignored_dirs[path] = ignored
+        return ignored
+
+    def _is_large_file(self, size: int) -> bool:
+        """
+        Check if the file is larger than the threshold.
+
+        :param size: Size of the file.
+        :return: True if the file is larger than the threshold, False otherwise.
+        """
+        if self.ignore_size_threshold is None:
+            return False
+        return size > self.ignore_size_threshold
 
     def _is_binary(self, full_path: str) -> bool:
         """
         Check if the given file is binary and should be ignored.
 
-        This also returns True if the file doesn't or is not a regular file (eg.
-        it's a symlink), or can't be opened, since we want to ignore those too.
+        This also returns True if the file can't be opened,
+        since we want to ignore those too.
 
         :param path: Full path to the file to check.
         :return: True if the file should be ignored, False otherwise.
         """
-
-        # We don't handle directories here
-        if os.path.isdir(full_path):
-            return False
-
-        if not os.path.isfile(full_path):
-            return True
-
         try:
             with open(full_path, "r", encoding="utf-8") as f:
-                f.read(128 * 1024)
+                f.read(BINARY_CHECK_SIZE)
             return False
         except:  # noqa
             # If we can't open the file for any reason (eg. PermissionError), it's
@@ -0,0 +1,145 @@
+import json
+import os
+import os.path
+import time
+from typing import Iterable, Optional
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+# Location of the scan cache file, relative to the project root
+SCAN_CACHE_PATH = ".gpt-pilot/scan-cache.json"
+
+# Files modified this recently (in ns) may be modified again without changing
+# their mtime (file systems have coarse timestamps), so they're not cached.
+RACY_INTERVAL_NS = 2_000_000_000
+
+# Bump when the cache file format changes, to discard the old caches
+SCAN_CACHE_VERSION = 1
+
+
+class ScanCache:
+    """
+    Content hashes of files on disk, keyed by their stat() information.
+
+    If a file's size, modification time and inode haven't changed since
+    it was hashed, it's assumed to have the same content, so unchanged
+    files don't need to be read when scanning the workspace for changes.
+
+    The cache is persisted to a JSON file so it's reused across runs.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the cache, loading the entries from the cache file (if it exists).
+
+        :param path: Full path to the cache file (None for a memory-only cache).
+        """
+        self.path = path
+        self.entries: dict[str, tuple[int, int, int, str]] = {}
+        self.dirty = False
+        self.load()
+
+    @staticmethod
+    def _key(stat: os.stat_result) -> tuple[int, int, int]:
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[str]:
+        """
+        Get the content hash of the file, if it hasn't changed since it was cached.
+
+        :param path: Path to the file, relative to project root.
+        :param stat: Current stat() result for the file.
+        :return: The content hash, or None if the file isn't cached or has changed.
+        """
+        entry = self.entries.get(path)
+        if entry is None or tuple(entry[:3]) != self._key(stat):
+            return None
+        return entry[3]
+
+    def set(self, path: str, stat: os.stat_result, hash: str):
+        """
+        Cache the content hash of the file.
+
+        The stat() result must be taken before reading the file contents,
+        so that the changes made while hashing are detected in the next scan.
+
+        :param path: Path to the file, relative to project root.
+        :param stat: The stat() result for the file.
+        :param hash: Hash of the file content.
+        """
+        if stat.st_mtime_ns >= time.time_ns() - RACY_INTERVAL_NS:
+            self.discard(path)
+            return
+        entry = (*self._key(stat), hash)
+        if self.entries.get(path) != entry:
+            self.entries[path] = entry
+            self.dirty = True
+
+    def discard(self, path: str):
+        """
+        Remove the file from the cache.
+
+        :param path: Path to the file, relative to project root.
+        """
+        if self.entries.pop(path, None) is not None:
+            self.dirty = True
+
+    def prune(self, paths: Iterable[str]):
+        """
+        Remove the files that are no longer in the workspace from the cache.
+
+        :param paths: Paths of the files in the workspace.
+        """
+        stale = self.entries.keys() - set(paths)
+        for path in stale:
+            del self.entries[path]
+        if stale:
+            self.dirty = True
+
+    def clear(self):
+        """
+        Remove all files from the cache (forcing a full rescan).
+        """
+        if self.entries:
+            self.entries = {}
+            self.dirty = True
+
+    def load(self):
+        """
+        Load the cache entries from the cache file.
+
+        Missing or invalid cache file just results in an empty cache.
+        """
+        if self.path is None or not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != SCAN_CACHE_VERSION:
+                return
+            self.entries = {path: tuple(entry) for path, entry in data["files"].items()}
+        except Exception as err:  # noqa
+            log.debug(f"Ignoring invalid scan cache {self.path}: {err}")
+
+    def save(self):
+        """
+        Save the cache entries to the cache file, if they were changed.
+        """
+        if self.path is None or not self.dirty:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": SCAN_CACHE_VERSION, "files": self.entries}, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as err:
+            log.warning(f"Failed to save scan cache {self.path}: {err}")
+
+
+__all__ = ["ScanCache", "SCAN_CACHE_PATH"]
@@ -1,15 +1,76 @@
+from __future__ import annotations
+
+import asyncio
 import os
 import os.path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from hashlib import sha1
 from pathlib import Path
+from typing import Callable, Iterable, Optional, TypeVar
 
-from core.disk.ignore import IgnoreMatcher
+from core.disk.ignore import GITIGNORE_FILE, IgnoreMatcher
+from core.disk.scan_cache import SCAN_CACHE_PATH, ScanCache
+from core.disk.watcher import InotifyWatcher
 from core.log import get_logger
 
 log = get_logger(__name__)
 
+T = TypeVar("T")
+
+# Number of files read or written in parallel (see `LocalDiskVFS.read_many()`)
+IO_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+# Maximum total size of the files being read or written at once
+MAX_IN_FLIGHT_BYTES = 64 * 1024 * 1024
+# Small files are processed in batches of up to this size, to reduce the thread switching overhead
+BATCH_BYTES = 256 * 1024
+BATCH_FILES = 64
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="vfs-io")
+    return _executor
+
+
+class _ByteBudget:
+    """
+    Limit on the total size of the files being processed at once.
+
+    A file larger than the limit is processed on its own.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+        try:
+            yield
+        finally:
+            async with self.cond:
+                self.used -= size
+                self.cond.notify_all()
+
 
 class VirtualFileSystem:
+    """
+    Interface to the project files.
+
+    The async methods (`aread()`, `asave()`, `aremove()`, `alist()` and the
+    bulk operations) should be used from the agents, as they don't block
+    the event loop. The sync methods do the same, but block; they're kept
+    for the tests and for code that can't await.
+    """
+
     def save(self, path: str, content: str):
         """
         Save content to a file. Use for both new and updated files.
@@ -71,7 +132,10 @@ class VirtualFileSystem:
         :param prefix: Optional prefix to filter files for.
         :return: List of file paths.
         """
-        retval = sorted(self._get_file_list())
+        return self._sort_and_filter(self._get_file_list(), prefix)
+
+    def _sort_and_filter(self, file_list: Iterable[str], prefix: Optional[str]) -> list[str]:
+        retval = sorted(file_list)
         if prefix:
             retval = self._filter_by_prefix(retval, prefix)
         return retval
@@ -80,10 +144,121 @@ class VirtualFileSystem:
         content = self.read(path)
         return self.hash_string(content)
 
+    def get_hashes(self, rescan: bool = False) -> dict[str, str]:
+        """
+        Return the content hashes of all the files in the project.
+
+        The hashes are the same as `hash_string()` of the file contents,
+        so they can be compared with `FileContent` IDs.
+
+        :param rescan: Whether to re-read all the files, ignoring any cached information.
+        :return: Dictionary of file paths and their content hashes.
+        """
+        return {path: self.hash(path) for path in self.list()}
+
     @staticmethod
     def hash_string(content: str) -> str:
         return sha1(content.encode("utf-8")).hexdigest()
 
+    def close(self):
+        """
+        Release any resources held by the file system (eg. file watchers).
+        """
+        pass
+
+    async def asave(self, path: str, content: str):
+        """
+        Save content to a file, without blocking the event loop.
+
+        See `save()`.
+
+        :param path: Path to the file, relative to project root.
+        :param content: Content to save.
+        """
+        self.save(path, content)
+
+    async def aread(self, path: str) -> str:
+        """
+        Read file contents, without blocking the event loop.
+
+        See `read()`.
+
+        :param path: Path to the file, relative to project root.
+        :return: File contents.
+        """
+        return self.read(path)
+
+    async def aremove(self, path: str):
+        """
+        Remove a file, without blocking the event loop.
+
+        See `remove()`.
+
+        :param path: Path to the file, relative to project root.
+        """
+        self.remove(path)
+
+    async def alist(self, prefix: str = None) -> list[str]:
+        """
+        Return a list of files in the project, without blocking the event loop.
+
+        See `list()`.
+
+        :param prefix: Optional prefix to filter files for.
+        :return: List of file paths.
+        """
+        return self.list(prefix)
+
+    async def scan(self, rescan: bool = False) -> dict[str, str]:
+        """
+        Return the content hashes of all the files in the project.
+
+        This is the same as `get_hashes()`, but the files are read
+        without blocking the event loop (where supported).
+
+        :param rescan: Whether to re-read all the files, ignoring any cached information.
+        :return: Dictionary of file paths and their content hashes.
+        """
+        return self.get_hashes(rescan=rescan)
+
+    async def read_many(self, paths: Iterable[str]) -> dict[str, str]:
+        """
+        Read multiple files.
+
+        Files that can't be read (eg. they were removed) are skipped.
+
+        :param paths: Paths to the files, relative to project root.
+        :return: Dictionary of file paths and their contents.
+        """
+        contents = {}
+        for path in paths:
+            try:
+                contents[path] = self.read(path)
+            except ValueError as err:
+                log.debug(f"Skipping file {path}: {err}")
+        return contents
+
+    async def hash_many(self, paths: Iterable[str], sizes: Optional[dict[str, int]] = None) -> dict[str, str]:
+        """
+        Compute the content hashes of multiple files.
+
+        Files that can't be read (eg. they were removed) are skipped.
+
+        :param paths: Paths to the files, relative to project root.
+        :param sizes: File sizes, if already known (used to limit the memory use).
+        :return: Dictionary of file paths and their content hashes.
+        """
+        return {path: self.hash_string(content) for path, content in (await self.read_many(paths)).items()}
+
+    async def save_many(self, files: dict[str, str]):
+        """
+        Save multiple files.
+
+        :param files: Dictionary of file paths and their contents.
+        """
+        for path, content in files.items():
+            self.save(path, content)
+
 
 class MemoryVFS(VirtualFileSystem):
     files: dict[str, str]
@@ -119,7 +294,18 @@ class LocalDiskVFS(VirtualFileSystem):
         create: bool = True,
         allow_existing: bool = True,
         ignore_matcher: IgnoreMatcher = None,
+        watch: bool = False,
     ):
+        """
+        Initialize the local disk file system.
+
+        :param root: Root directory of the project.
+        :param create: Whether to create the root directory if it doesn't exist.
+        :param allow_existing: Whether to allow using an existing root directory.
+        :param ignore_matcher: Ignore matcher for the project files.
+        :param watch: Whether to watch the project folder for changes, so that
+            `get_hashes()` only needs to check the changed files (Linux only).
+        """
         if not os.path.isdir(root):
             if create:
                 os.makedirs(root)
@@ -134,16 +320,41 @@ class LocalDiskVFS(VirtualFileSystem):
 
         self.root = root
         self.ignore_matcher = ignore_matcher
+        self.scan_cache = ScanCache(os.path.join(root, SCAN_CACHE_PATH))
+
+        # With a watcher, the last scan is kept and updated with the changes
+        self.watcher: Optional[InotifyWatcher] = None
+        self._hashes: Optional[dict[str, str]] = None
+        if watch and InotifyWatcher.is_supported():
+            try:
+                self.watcher = InotifyWatcher(root, ignore_matcher)
+            except OSError as err:
+                log.warning(f"Can't watch {root} for changes, falling back to scanning: {err}")
 
     def get_full_path(self, path: str) -> str:
         return os.path.abspath(os.path.normpath(os.path.join(self.root, path)))
 
     def save(self, path: str, content: str):
+        stat = self._write_file(path, content)
+        self.scan_cache.set(path, stat, self.hash_string(content))
+        log.debug(f"Saved file {path} ({len(content)} bytes) to {self.get_full_path(path)}")
+
+    async def asave(self, path: str, content: str):
+        stat = await self._run_in_executor(self._write_file, path, content)
+        # The scan cache is only updated from the event loop thread
+        self.scan_cache.set(path, stat, self.hash_string(content))
+        log.debug(f"Saved file {path} ({len(content)} bytes) to {self.get_full_path(path)}")
+
+    @staticmethod
+    async def _run_in_executor(func: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+
+    def _write_file(self, path: str, content: str) -> os.stat_result:
         full_path = self.get_full_path(path)
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
         with open(full_path, "w", encoding="utf-8") as f:
             f.write(content)
-        log.debug(f"Saved file {path} ({len(content)} bytes) to {full_path}")
+        return os.stat(full_path)
 
     def read(self, path: str) -> str:
         full_path = self.get_full_path(path)
@@ -154,21 +365,138 @@ class LocalDiskVFS(VirtualFileSystem):
         with open(full_path, "r", encoding="utf-8") as f:
             return f.read()
 
+    async def aread(self, path: str) -> str:
+        return await self._run_in_executor(self.read, path)
+
     def remove(self, path: str):
+        if self._remove_file(path):
+            self.scan_cache.discard(path)
+
+    async def aremove(self, path: str):
+        if await self._run_in_executor(self._remove_file, path):
+            self.scan_cache.discard(path)
+
+    def _remove_file(self, path: str) -> bool:
+        """
+        Remove the file from disk, unless it's ignored.
+
+        :param path: Path to the file, relative to project root.
+        :return: True if the file was removed, False otherwise.
+        """
         if self.ignore_matcher.ignore(path):
-            return
+            return False
 
         full_path = self.get_full_path(path)
-        if os.path.isfile(full_path):
+        if not os.path.isfile(full_path):
+            return False
+
+        try:
+            os.remove(full_path)
+            log.debug(f"Removed file {path} from {full_path}")
+            return True
+        except Exception as err:  # noqa
+            log.error(f"Failed to remove file {path}: {err}", exc_info=True)
+            return False
+
+    async def alist(self, prefix: str = None) -> list[str]:
+        if self.watcher is not None and self._hashes is not None:
+            files = await self.scan()
+        else:
+            files = await self._run_in_executor(self._walk, self.root)
+        return self._sort_and_filter(files, prefix)
+
+    async def _map_files(self, sizes: dict[str, Optional[int]], func: Callable[[str], Optional[T]]) -> dict[str, T]:
+        """
+        Run the function for each file in the thread pool, keeping the event loop responsive.
+
+        At most `IO_WORKERS` batches of files are processed at once, and their
+        total size is limited to `MAX_IN_FLIGHT_BYTES`.
+
+        :param sizes: Paths of the files to process and their sizes (None if unknown).
+        :param func: Function to run, returning None if the file should be skipped.
+        :return: Dictionary of file paths and the (non-None) function results.
+        """
+        budget = _ByteBudget(MAX_IN_FLIGHT_BYTES)
+        pending = iter(sizes.items())
+        results = {}
+
+        def run_batch(batch: list[str]) -> list[Optional[T]]:
+            return [func(path) for path in batch]
+
+        def next_batch() -> tuple[list[str], int]:
+            batch = []
+            batch_size = 0
+            for path, size in pending:
+                if size is None:
+                    try:
+                        size = os.path.getsize(self.get_full_path(path))
+                    except OSError:
+                        size = 0
+                batch.append(path)
+                batch_size += size
+                if batch_size >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+                    break
+            return batch, batch_size
+
+        async def worker():
+            while True:
+                batch, batch_size = next_batch()
+                if not batch:
+                    return
+                async with budget.reserve(batch_size):
+                    batch_results = await self._run_in_executor(run_batch, batch)
+                for path, result in zip(batch, batch_results):
+                    if result is not None:
+                        results[path] = result
+
+        await asyncio.gather(*(worker() for _ in range(min(IO_WORKERS, len(sizes)))))
+        # Keep the order of the paths
+        return {path: results[path] for path in sizes if path in results}
+
+    async def read_many(self, paths: Iterable[str]) -> dict[str, str]:
+        def read(path: str) -> Optional[str]:
             try:
-                os.remove(full_path)
-                log.debug(f"Removed file {path} from {full_path}")
-            except Exception as err:  # noqa
-                log.error(f"Failed to remove file {path}: {err}", exc_info=True)
+                return self.read(path)
+            except (OSError, ValueError) as err:
+                log.debug(f"Skipping file {path}: {err}")
+                return None
+
+        return await self._map_files(dict.fromkeys(paths), read)
+
+    async def hash_many(self, paths: Iterable[str], sizes: Optional[dict[str, int]] = None) -> dict[str, str]:
+        sizes = sizes or {}
+        return await self._map_files({path: sizes.get(path) for path in paths}, self._read_hash)
+
+    async def save_many(self, files: dict[str, str]):
+        stats = await self._map_files(
+            {path: len(content) for path, content in files.items()},
+            lambda path: self._write_file(path, files[path]),
+        )
+        # The scan cache is only updated from the event loop thread
+        for path, stat in stats.items():
+            self.scan_cache.set(path, stat, self.hash_string(files[path]))
+        log.debug(f"Saved {len(stats)} files to {self.root}")
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        self._hashes = None
 
     def _get_file_list(self) -> list[str]:
+        if self.watcher is not None and self._hashes is not None:
+            return list(self.get_hashes())
+        return self._walk(self.root)
+
+    def _walk(self, top: str) -> list[str]:
+        """
+        List the (non-ignored) files in the directory, recursively.
+
+        :param top: Full path to the directory.
+        :return: List of file paths, relative to project root.
+        """
         files = []
-        for dpath, dirnames, filenames in os.walk(self.root):
+        for dpath, dirnames, filenames in os.walk(top):
             # Modify in place to prevent recursing into ignored directories
             dirnames[:] = [
                 d
@@ -182,7 +510,162 @@ class LocalDiskVFS(VirtualFileSystem):
                     # We use "/" internally on all platforms, including win32
                     files.append(Path(path).as_posix())
 
+        # The scan cache is stored in the project folder, but is not a project file
+        if SCAN_CACHE_PATH in files:
+            files.remove(SCAN_CACHE_PATH)
         return files
 
+    def get_hashes(self, rescan: bool = False) -> dict[str, str]:
+        """
+        Return the content hashes of all the files in the project.
+
+        Files whose size, modification time and inode haven't changed
+        since the last scan are not read (see `ScanCache`). If the project
+        folder is watched, only the files changed since the last scan are
+        checked (see `InotifyWatcher`).
+
+        :param rescan: Whether to re-read all the files, ignoring the scan cache.
+        :return: Dictionary of file paths and their content hashes.
+        """
+        hashes, to_hash = self._prepare_scan(rescan)
+        hashed = {}
+        for path in to_hash:
+            hash = self._read_hash(path)
+            if hash is not None:
+                hashed[path] = hash
+        return self._finish_scan(hashes, hashed, to_hash)
+
+    async def scan(self, rescan: bool = False) -> dict[str, str]:
+        hashes, to_hash = self._prepare_scan(rescan)
+        hashed = await self.hash_many(list(to_hash), sizes={path: st.st_size for path, st in to_hash.items()})
+        return self._finish_scan(hashes, hashed, to_hash)
+
+    def _prepare_scan(self, rescan: bool) -> tuple[dict[str, str], dict[str, os.stat_result]]:
+        """
+        Find the files that need to be hashed in this scan.
+
+        :param rescan: Whether to ignore the scan cache.
+        :return: Tuple with the hashes of the unchanged files, and the
+            stat() results of the files that need to be (re)hashed.
+        """
+        # Always pick up the changes, so they're not applied again after a rescan
+        changes = self._get_changes()
+        if changes is not None and any(path.rsplit("/", 1)[-1] == GITIGNORE_FILE for path in changes):
+            # The ignore rules changed, so the watched directories and the last scan are outdated
+            self.watcher.reset()
+            changes = None
+        if rescan:
+            self.scan_cache.clear()
+            changes = None
+
+        if changes is not None:
+            hashes = dict(self._hashes)
+            paths = self._apply_changes(hashes, changes)
+        else:
+            self.ignore_matcher.reload_gitignores()
+            hashes = {}
+            paths = self._walk(self.root)
+
+        to_hash = {}
+        for path in paths:
+            try:
+                # Stat before reading, so changes made while reading are picked up next time
+                stat = os.stat(self.get_full_path(path))
+            except OSError as err:
+                log.debug(f"Skipping file {path}: {err}")
+                continue
+            hash = self.scan_cache.get(path, stat)
+            if hash is not None:
+                hashes[path] = hash
+            else:
+                to_hash[path] = stat
+        return hashes, to_hash
+
+    def _finish_scan(
+        self,
+        hashes: dict[str, str],
+        hashed: dict[str, str],
+        to_hash: dict[str, os.stat_result],
+    ) -> dict[str, str]:
+        """
+        Record the newly hashed files in the scan cache.
+
+        :param hashes: Hashes of the unchanged files.
+        :param hashed: Hashes of the files that were read in this scan.
+        :param to_hash: The stat() results of the files that were read.
+        :return: Dictionary of file paths and their content hashes.
+        """
+        for path, hash in hashed.items():
+            self.scan_cache.set(path, to_hash[path], hash)
+            hashes[path] = hash
+        if self.watcher is not None:
+            self._hashes = hashes
+
+        self.scan_cache.prune(hashes)
+        self.scan_cache.save()
+        return dict(hashes)
+
+    def _read_hash(self, path: str) -> Optional[str]:
+        """
+        Read the file and compute its content hash.
+
+        :param path: Path to the file, relative to project root.
+        :return: The content hash, or None if the file can't be read.
+        """
+        try:
+            return self.hash(path)
+        except (OSError, ValueError) as err:
+            # The file was removed (or changed into something we can't read) during the scan
+            log.debug(f"Skipping file {path}: {err}")
+            return None
+
+    def _get_changes(self) -> Optional[set[str]]:
+        """
+        Get the paths changed since the last scan from the watcher.
+
+        :return: Set of changed paths, or None if a full scan is needed.
+        """
+        if self.watcher is None:
+            return None
+
+        try:
+            changes = self.watcher.get_changes()
+        except OSError as err:
+            log.warning(f"Can't watch {self.root} for changes, falling back to scanning: {err}")
+            self.close()
+            return None
+
+        if self._hashes is None:
+            # The changes made before the first scan will be picked up by it
+            return None
+        return changes
+
+    def _apply_changes(self, hashes: dict[str, str], changes: set[str]) -> list[str]:
+        """
+        Remove the changed paths from the last scan.
+
+        :param hashes: Hashes from the last scan (updated in place).
+        :param changes: Changed file or directory paths, relative to project root.
+        :return: List of (existing, non-ignored) files that need to be checked.
+        """
+        paths = []
+        for path in changes:
+            if path == SCAN_CACHE_PATH:
+                continue
+
+            # The path may have been a directory that was deleted or replaced with a file
+            prefix = path + "/"
+            for stale in [p for p in hashes if p.startswith(prefix)]:
+                del hashes[stale]
+            hashes.pop(path, None)
+
+            full_path = self.get_full_path(path)
+            if os.path.isdir(full_path):
+                if not self.ignore_matcher.ignore(path):
+                    paths.extend(self._walk(full_path))
+            elif os.path.isfile(full_path) and not self.ignore_matcher.ignore(path):
+                paths.append(path)
+        return paths
+
 
 __all__ = ["VirtualFileSystem", "MemoryVFS", "LocalDiskVFS"]
@@ -0,0 +1,225 @@
+import ctypes
+import ctypes.util
+import os
+import os.path
+import struct
+import sys
+from pathlib import Path
+from typing import Optional
+
+from core.disk.ignore import IgnoreMatcher
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+# inotify constants (see `man 7 inotify`)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _get_libc() -> Optional[ctypes.CDLL]:
+    global _libc
+    if _libc is None and sys.platform.startswith("linux"):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+
+class InotifyWatcher:
+    """
+    Journal of changes in the project folder, using Linux inotify.
+
+    All the (non-ignored) directories in the project are watched, and the
+    paths of created, modified and deleted entries are collected until they're
+    picked up with `get_changes()`. Ignored directories (eg. `node_modules`)
+    are not watched at all, so bursts of changes there cost nothing, and
+    repeated changes to the same path are coalesced into a single entry.
+
+    The events are buffered by the kernel, so no background thread is needed.
+    If the buffer overflows, or a watched directory is moved, the journal can't
+    be trusted and `get_changes()` asks for a full rescan instead.
+    """
+
+    def __init__(self, root: str, ignore_matcher: IgnoreMatcher):
+        """
+        Start watching the project folder.
+
+        :param root: Root directory of the project.
+        :param ignore_matcher: Ignore matcher for the project files.
+        """
+        self.root = root
+        self.ignore_matcher = ignore_matcher
+        self.fd = None
+        self.watches: dict[int, str] = {}
+        self.changes: set[str] = set()
+        self.needs_rescan = False
+        self._start()
+
+    @staticmethod
+    def is_supported() -> bool:
+        """
+        Check whether inotify is available on this system.
+        """
+        return _get_libc() is not None
+
+    def _start(self):
+        libc = _get_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self.fd = fd
+        self.watches = {}
+        self.changes = set()
+        self.needs_rescan = False
+        self._watch_tree("")
+
+    def _watch_tree(self, top: str):
+        """
+        Watch the directory and all its non-ignored subdirectories.
+
+        :param top: Directory path, relative to project root ("" for the root itself).
+        """
+        libc = _get_libc()
+        for dpath, dirnames, _ in os.walk(os.path.join(self.root, top)):
+            rel_dir = os.path.relpath(dpath, self.root)
+            rel_dir = "" if rel_dir == "." else Path(rel_dir).as_posix()
+
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(dpath), WATCH_MASK)
+            if wd < 0:
+                # Usually this means the watch limit (fs.inotify.max_user_watches) was reached
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"Can't watch {dpath}: {os.strerror(errno)}")
+            self.watches[wd] = rel_dir
+
+            dirnames[:] = [d for d in dirnames if not self.ignore_matcher.ignore(self._join(rel_dir, d))]
+
+    @staticmethod
+    def _join(rel_dir: str, name: str) -> str:
+        # We use "/" internally on all platforms, including win32
+        return f"{rel_dir}/{name}" if rel_dir else name
+
+    def _read_events(self):
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                self._handle_event(wd, mask, name)
+
+    def _handle_event(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            self.needs_rescan = True
+            return
+
+        rel_dir = self.watches.get(wd)
+        if mask & IN_IGNORED:
+            # The watch was removed (the directory was deleted)
+            self.watches.pop(wd, None)
+            return
+        if rel_dir is None:
+            return
+
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            # The parent directory reports deletions, but moved directories
+            # would keep their (now wrong) paths in the watch list
+            if mask & IN_MOVE_SELF or rel_dir == "":
+                self.needs_rescan = True
+            return
+
+        path = self._join(rel_dir, name)
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            if self.ignore_matcher.ignore(path):
+                return
+            try:
+                self._watch_tree(path)
+            except FileNotFoundError:
+                pass
+
+        self.changes.add(path)
+
+    def get_changes(self) -> Optional[set[str]]:
+        """
+        Get the paths changed since the last call.
+
+        The paths may point to files or directories (for directories, all
+        the files in them should be checked), and may no longer exist.
+
+        If the changes can't be reliably tracked, the watcher is reset
+        and None is returned, meaning the whole project should be rescanned.
+
+        :return: Set of changed paths (relative to project root), or None.
+        """
+        self._read_events()
+        if self.needs_rescan:
+            log.debug(f"Change journal for {self.root} is incomplete, rescanning")
+            self.reset()
+            return None
+
+        changes, self.changes = self.changes, set()
+        return changes
+
+    def reset(self):
+        """
+        Restart watching the project folder, discarding the collected changes.
+
+        Use this when the set of ignored directories may have changed.
+        """
+        self.close()
+        self._start()
+
+    def close(self):
+        """
+        Stop watching the project folder.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __del__(self):
+        self.close()
+
+
+__all__ = ["InotifyWatcher"]
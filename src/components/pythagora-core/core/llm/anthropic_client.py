@@ -7,7 +7,11 @@ from anthropic import AsyncAnthropic, RateLimitError
 from httpx import Timeout
 
 from core.config import LLMProvider
+from core.llm.client_registry import client_registry
 from core.llm.convo import Convo
+from core.llm.parser import IncrementalParser, StreamParseError
+from core.llm.request_log import LLMRequestLog
+from core.llm.token_budget import count_tokens
 from core.log import get_logger
 
 from .base import BaseLLMClient
@@ -18,6 +22,14 @@ log = get_logger(__name__)
 MAX_TOKENS = 4096
 MAX_TOKENS_SONNET = 8192
 
+# Anthropic allows at most 4 prompt cache breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Marks the end of the (large and rarely changing) file listing in the prompt,
+# see `prompts/partials/files_list.prompt`
+FILES_LIST_END_MARKER = "~~END_OF_RELEVANT_FILES_IMPLEMENTATION~~"
+
 
 class CustomAssertionError(Exception):
     pass
@@ -35,6 +47,7 @@ class AnthropicClient(BaseLLMClient):
                 connect=self.config.connect_timeout,
                 read=self.config.read_timeout,
             ),
+            http_client=client_registry.get(self.config),
         )
         self.stream_handler = self.stream_handler
 
@@ -65,18 +78,117 @@ class AnthropicClient(BaseLLMClient):
                 )
         return messages
 
+    @property
+    def prompt_caching(self) -> bool:
+        """
+        Whether prompt caching should be used for this client.
+
+        Prompt caching is enabled per agent in the configuration, and
+        is not available when using Anthropic through AWS Bedrock.
+        """
+        if not self.config.prompt_caching:
+            return False
+        return "bedrock/anthropic" not in (self.config.base_url or "")
+
+    @staticmethod
+    def _split_text_blocks(content: str) -> list[dict]:
+        """
+        Split message content into text blocks, with the file listing in a separate block.
+
+        The block ending with the file listing is a good cache breakpoint,
+        as it's usually the largest stable part of the prompt.
+
+        :param content: Message content.
+        :return: List of text blocks.
+        """
+        idx = content.find(FILES_LIST_END_MARKER)
+        if idx == -1:
+            return [{"type": "text", "text": content}]
+
+        idx += len(FILES_LIST_END_MARKER)
+        head, tail = content[:idx], content[idx:]
+        blocks = [{"type": "text", "text": head, "files_list": True}]
+        if tail.strip():
+            blocks.append({"type": "text", "text": tail})
+        return blocks
+
+    def _adapt_messages_for_caching(self, convo: Convo) -> tuple[list[dict], list[dict]]:
+        """
+        Adapt the conversation for the Anthropic Claude model, with prompt cache breakpoints.
+
+        The leading system messages are sent as the system prompt, while the rest of the
+        conversation is split into text blocks. Cache breakpoints are placed (in order of
+        priority) at the end of the system prompt, at the end of the first file listing and
+        at the end of the conversation, so the next request in the same conversation reuses
+        the whole prefix.
+
+        :param convo: Conversation to adapt.
+        :return: Tuple of (system prompt blocks, messages).
+        """
+        system = []
+        messages = []
+        for msg in convo.messages:
+            if msg["role"] == "function":
+                raise ValueError("Anthropic Claude doesn't support function calling")
+
+            if msg["role"] == "system" and not messages:
+                system.append({"type": "text", "text": msg["content"]})
+                continue
+
+            role = "user" if msg["role"] in ["user", "system"] else "assistant"
+            blocks = self._split_text_blocks(msg["content"])
+            if messages and messages[-1]["role"] == role:
+                messages[-1]["content"].extend(blocks)
+            else:
+                messages.append({"role": role, "content": blocks})
+
+        if not messages:
+            # Claude requires at least one (user) message
+            messages = [{"role": "user", "content": system}]
+            system = []
+
+        breakpoints = []
+        if system:
+            breakpoints.append(system[-1])
+        files_list_blocks = [block for msg in messages for block in msg["content"] if block.get("files_list")]
+        if files_list_blocks:
+            breakpoints.append(files_list_blocks[0])
+        breakpoints.append(messages[-1]["content"][-1])
+
+        for block in breakpoints[:MAX_CACHE_BREAKPOINTS]:
+            block["cache_control"] = CACHE_CONTROL
+        for msg in messages:
+            for block in msg["content"]:
+                block.pop("files_list", None)
+
+        return system, messages
+
     async def _make_request(
-        self, convo: Convo, temperature: Optional[float] = None, json_mode: bool = False, retry_count: int = 1
+        self,
+        convo: Convo,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        request_log: Optional[LLMRequestLog] = None,
+        stream_parser: Optional[IncrementalParser] = None,
+        retry_count: int = 1,
     ) -> Tuple[str, int, int]:
         async def single_attempt() -> Tuple[str, int, int]:
-            messages = self._adapt_messages(convo)
             completion_kwargs = {
                 "max_tokens": MAX_TOKENS,
                 "model": self.config.model,
-                "messages": messages,
                 "temperature": self.config.temperature if temperature is None else temperature,
             }
 
+            if self.prompt_caching:
+                system, messages = self._adapt_messages_for_caching(convo)
+                if system:
+                    completion_kwargs["system"] = system
+                stream_messages = self.client.beta.prompt_caching.messages.stream
+            else:
+                messages = self._adapt_messages(convo)
+                stream_messages = self.client.messages.stream
+            completion_kwargs["messages"] = messages
+
             if "trybricks" in self.config.base_url:
                 completion_kwargs["extra_headers"] = {"x-request-timeout": f"{int(float(self.config.read_timeout))}s"}
 
@@ -90,18 +202,38 @@ class AnthropicClient(BaseLLMClient):
                 completion_kwargs["response_format"] = {"type": "json_object"}
 
             response = []
-            async with self.client.messages.stream(**completion_kwargs) as stream:
+            complete = False
+            async with stream_messages(**completion_kwargs) as stream:
                 async for content in stream.text_stream:
                     response.append(content)
                     if self.stream_handler:
                         await self.stream_handler(content)
-
-                try:
-                    final_message = await stream.get_final_message()
-                    final_message.content  # Access content to verify it exists
-                except AssertionError:
-                    log.debug("Anthropic package AssertionError")
-                    raise CustomAssertionError("No final message received.")
+                    try:
+                        done = stream_parser is not None and stream_parser.feed(content)
+                    except StreamParseError:
+                        # Leaving the context manager closes the stream
+                        if self.stream_handler:
+                            await self.stream_handler(None)
+                        raise
+                    if done:
+                        # Got the complete response, leaving the context manager closes the stream
+                        complete = True
+                        break
+
+                if complete:
+                    # The final message won't arrive, the usage reported at the start
+                    # of the stream has the input tokens (output tokens are estimated)
+                    usage = stream.current_message_snapshot.usage
+                    output_tokens = count_tokens("".join(response))
+                else:
+                    try:
+                        final_message = await stream.get_final_message()
+                        final_message.content  # Access content to verify it exists
+                    except AssertionError:
+                        log.debug("Anthropic package AssertionError")
+                        raise CustomAssertionError("No final message received.")
+                    usage = final_message.usage
+                    output_tokens = usage.output_tokens
 
             response_str = "".join(response)
 
@@ -109,7 +241,11 @@ class AnthropicClient(BaseLLMClient):
             if self.stream_handler:
                 await self.stream_handler(None)
 
-            return response_str, final_message.usage.input_tokens, final_message.usage.output_tokens
+            if request_log is not None:
+                request_log.cache_read_tokens += getattr(usage, "cache_read_input_tokens", None) or 0
+                request_log.cache_write_tokens += getattr(usage, "cache_creation_input_tokens", None) or 0
+
+            return response_str, usage.input_tokens, output_tokens
 
         for attempt in range(retry_count + 1):
             try:
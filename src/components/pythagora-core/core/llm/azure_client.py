@@ -2,6 +2,7 @@ from httpx import Timeout
 from openai import AsyncAzureOpenAI
 
 from core.config import LLMProvider
+from core.llm.client_registry import client_registry
 from core.llm.openai_client import OpenAIClient
 from core.log import get_logger
 
@@ -26,4 +27,5 @@ class AzureClient(OpenAIClient):
                 connect=self.config.connect_timeout,
                 read=self.config.read_timeout,
             ),
+            http_client=client_registry.get(self.config),
         )
@@ -3,15 +3,22 @@ import datetime
 import json
 from enum import Enum
 from time import time
-from typing import Any, Callable, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Optional, Tuple
 
 import httpx
 
 from core.config import LLMConfig, LLMProvider
 from core.llm.convo import Convo
+from core.llm.health import health_tracker
+from core.llm.parser import IncrementalParser, StreamParseError
 from core.llm.request_log import LLMRequestLog, LLMRequestStatus
+from core.llm.scheduler import RequestPriority, llm_scheduler
+from core.llm.token_budget import CHARS_PER_TOKEN
 from core.log import get_logger
 
+if TYPE_CHECKING:
+    from core.llm.cache import LLMResponseCache
+
 log = get_logger(__name__)
 
 
@@ -51,16 +58,23 @@ class BaseLLMClient:
         *,
         stream_handler: Optional[Callable] = None,
         error_handler: Optional[Callable] = None,
+        cache: Optional["LLMResponseCache"] = None,
+        priority: RequestPriority = RequestPriority.NORMAL,
     ):
         """
         Initialize the client with the given configuration.
 
         :param config: Configuration for the client.
         :param stream_handler: Optional handler for streamed responses.
+        :param error_handler: Optional handler for LLM API errors.
+        :param cache: Optional LLM response cache.
+        :param priority: Priority of the requests when waiting for rate limits.
         """
         self.config = config
         self.stream_handler = stream_handler
         self.error_handler = error_handler
+        self.cache = cache
+        self.priority = priority
         self._init_client()
 
     def _init_client(self):
@@ -71,6 +85,8 @@ class BaseLLMClient:
         convo: Convo,
         temperature: Optional[float] = None,
         json_mode: bool = False,
+        request_log: Optional[LLMRequestLog] = None,
+        stream_parser: Optional[IncrementalParser] = None,
     ) -> tuple[str, int, int]:
         """
         Call the Anthropic Claude model with the given conversation.
@@ -80,10 +96,177 @@ class BaseLLMClient:
 
         :param convo: Conversation to send to the LLM.
         :param json_mode: If True, the response is expected to be JSON.
+        :param request_log: Optional request log to record provider-specific usage details in.
+        :param stream_parser: Optional incremental parser to feed the response chunks to. The
+            stream is stopped when the parser reports the response is complete, and any
+            `StreamParseError` it raises aborts the request.
         :return: Tuple containing the full response content, number of input tokens, and number of output tokens.
         """
         raise NotImplementedError()
 
+    def _client_for(self, config: LLMConfig, stream_handler: Optional[Callable]) -> "BaseLLMClient":
+        """
+        Create a client for another LLM (or the same one with a different stream handler).
+
+        Used for fallback and hedged requests. The new client shares this client's
+        error handler and priority, but not the response cache (the response is
+        cached by the original client).
+
+        :param config: Configuration of the LLM to use.
+        :param stream_handler: Stream handler for the new client.
+        :return: LLM client.
+        """
+        if config is self.config:
+            client_class = type(self)
+        else:
+            client_class = BaseLLMClient.for_provider(config.provider)
+        return client_class(
+            config,
+            stream_handler=stream_handler,
+            error_handler=self.error_handler,
+            priority=self.priority,
+        )
+
+    async def _attempt(
+        self,
+        client: "BaseLLMClient",
+        convo: Convo,
+        tokens: int,
+        temperature: float,
+        json_mode: bool,
+        request_log: LLMRequestLog,
+        parser: Optional[Callable] = None,
+    ) -> tuple[str, int, int]:
+        """
+        Make a single request through the scheduler, tracking the LLM health.
+
+        If the parser supports it (has a `streaming()` method), the response is
+        also checked while it's being streamed (see `core.llm.parser.IncrementalParser`).
+
+        :param client: Client for the LLM to use (this client or a fallback).
+        :param convo: Conversation to send to the LLM.
+        :param tokens: Estimated number of prompt tokens.
+        :param temperature: Temperature to use.
+        :param json_mode: If True, the response is expected to be JSON.
+        :param request_log: Request log to record provider-specific usage details in.
+        :param parser: Optional parser for the response.
+        :return: Tuple containing the full response content, number of input tokens, and number of output tokens.
+        """
+        stream_parser = parser.streaming() if hasattr(parser, "streaming") else None
+        if not isinstance(stream_parser, IncrementalParser):
+            stream_parser = None
+
+        async with llm_scheduler.slot(client.config, tokens, self.priority):
+            try:
+                result = await client._make_request(
+                    convo,
+                    temperature=temperature,
+                    json_mode=json_mode,
+                    request_log=request_log,
+                    stream_parser=stream_parser,
+                )
+            except StreamParseError:
+                # The LLM is working fine, it's the response that's wrong
+                raise
+            except Exception:
+                health_tracker.record_failure(client.config)
+                raise
+
+        health_tracker.record_success(client.config)
+        return result
+
+    async def _hedged_attempt(
+        self,
+        client: "BaseLLMClient",
+        hedge_after: float,
+        convo: Convo,
+        tokens: int,
+        temperature: float,
+        json_mode: bool,
+        request_log: LLMRequestLog,
+        parser: Optional[Callable] = None,
+    ) -> tuple[str, int, int]:
+        """
+        Make the request, sending a backup request if the first token doesn't arrive in time.
+
+        The backup request goes to the next healthy LLM in the fallback chain (or
+        to the same LLM if there is none). Whichever request streams the first
+        token wins: its response is passed on to the stream handler, and the other
+        request is cancelled. If one of the requests fails, the other one is
+        awaited instead.
+
+        :param client: Client for the LLM to use (this client or a fallback).
+        :param hedge_after: Seconds to wait for the first token before sending the backup request.
+        :return: Tuple containing the full response content, number of input tokens, and number of output tokens.
+        """
+        candidates = [self.config] + self.config.fallback
+        backup_config = next(
+            (config for config in candidates if config is not client.config and health_tracker.is_healthy(config)),
+            client.config,
+        )
+        configs = [client.config, backup_config]
+        winner: Optional[int] = None
+        first_token = asyncio.Event()
+
+        async def attempt(index: int) -> tuple[str, int, int]:
+            config = configs[index]
+            t0 = time()
+
+            async def stream_handler(content: Optional[str]):
+                nonlocal winner
+                if winner is None and content:
+                    winner = index
+                    health_tracker.record_ttft(config, time() - t0)
+                    first_token.set()
+                if winner == index and self.stream_handler:
+                    await self.stream_handler(content)
+
+            attempt_client = self._client_for(config, stream_handler)
+            return await self._attempt(attempt_client, convo, tokens, temperature, json_mode, request_log, parser)
+
+        tasks = {0: asyncio.create_task(attempt(0))}
+        token_wait = asyncio.create_task(first_token.wait())
+        try:
+            done, _ = await asyncio.wait(
+                [tasks[0], token_wait], timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                log.info(
+                    f"No response from {client.config.provider.value} model {client.config.model} in "
+                    f"{hedge_after:.1f}s, sending a backup request to {backup_config.provider.value} "
+                    f"model {backup_config.model}"
+                )
+                tasks[1] = asyncio.create_task(attempt(1))
+
+            errors = []
+            while True:
+                if winner is None:
+                    for index, task in list(tasks.items()):
+                        if not task.done():
+                            continue
+                        del tasks[index]
+                        if task.exception() is None:
+                            # Finished without streaming anything (eg. empty response)
+                            winner = index
+                            if self.stream_handler:
+                                await self.stream_handler(None)
+                            tasks[index] = task
+                            break
+                        errors.append(task.exception())
+
+                if winner is not None:
+                    request_log.provider = configs[winner].provider
+                    request_log.model = configs[winner].model
+                    return await tasks[winner]
+
+                if not tasks:
+                    raise errors[0]
+
+                await asyncio.wait(list(tasks.values()) + [token_wait], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in list(tasks.values()) + [token_wait]:
+                task.cancel()
+
     async def _adapt_messages(self, convo: Convo) -> list[dict[str, str]]:
         """
         Adapt the conversation messages to the format expected by the LLM.
@@ -110,6 +293,34 @@ class BaseLLMClient:
                 )
         return messages
 
+    async def _get_cached_response(self, cache_key: str, parser: Optional[Callable]) -> Tuple[bool, Any, str]:
+        """
+        Look up the response in the cache and parse it with the configured parser.
+
+        Cached responses that can no longer be parsed (eg. because the parser
+        or the expected schema changed) are removed from the cache.
+
+        :param cache_key: Cache key for the request.
+        :param parser: Optional parser for the response.
+        :return: Tuple of (hit, parsed response, raw response).
+        """
+        cached = await self.cache.aget(cache_key)
+        if cached is None:
+            return False, None, ""
+
+        try:
+            response = parser(cached.response) if parser else cached.response
+        except ValueError as err:
+            log.debug(f"Cached response could not be parsed, discarding it: {err}")
+            await self.cache.aremove(cache_key)
+            return False, None, ""
+
+        if self.stream_handler:
+            await self.stream_handler(cached.response)
+            await self.stream_handler(None)
+
+        return True, response, cached.response
+
     async def __call__(
         self,
         convo: Convo,
@@ -130,7 +341,21 @@ class BaseLLMClient:
         response content (str) and returns the parsed response.
         On parse error, the parser should raise a ValueError with
         a descriptive error message that will be sent back to the LLM
-        to retry, up to max_retries.
+        to retry, up to max_retries. Parsers that support incremental
+        parsing (eg. `JSONParser`) also check the response as it's being
+        streamed, stopping the stream as soon as the response is complete
+        and retrying immediately if it can't be parsed.
+
+        If the client has a response cache, deterministic requests are
+        recorded to it, and in replay mode, served from it without calling
+        the LLM.
+
+        Requests are sent through the LLM scheduler, which delays them
+        (by client priority) if they would exceed the provider rate limits.
+
+        If the LLM has fallbacks configured, each retry goes to the first
+        healthy LLM in the chain. If hedging is configured, a backup request
+        is sent when the first token doesn't arrive in time.
 
         :param convo: Conversation to send to the LLM.
         :param parser: Optional parser for the response.
@@ -153,12 +378,27 @@ class BaseLLMClient:
             prompts=convo.prompt_log,
         )
 
-        prompt_length_kb = len(json.dumps(convo.messages).encode("utf-8")) / 1024
+        prompt_length = len(json.dumps(convo.messages).encode("utf-8"))
+        prompt_length_kb = prompt_length / 1024
         log.debug(
             f"Calling {self.provider.value} model {self.config.model} (temp={temperature}), prompt length: {prompt_length_kb:.1f} KB"
         )
         t0 = time()
 
+        cache_key = None
+        if self.cache and self.cache.should_cache(temperature):
+            cache_key = self.cache.key(self.provider.value, self.config.model, temperature, json_mode, convo.messages)
+            if self.cache.replay:
+                hit, response, raw_response = await self._get_cached_response(cache_key, parser)
+                if hit:
+                    request_log.messages = convo.messages[:]
+                    request_log.response = raw_response
+                    request_log.cached = True
+                    request_log.duration = time() - t0
+                    log.debug(f"Serving {self.provider.value} model {self.config.model} response from cache")
+                    return response, request_log
+
+        candidates = [self.config] + self.config.fallback
         remaining_retries = max_retries
         while True:
             if remaining_retries == 0:
@@ -179,6 +419,11 @@ class BaseLLMClient:
                 raise APIError(last_error_msg)
 
             remaining_retries -= 1
+            llm_config = health_tracker.select(candidates)
+            client = self._client_for(llm_config, self.stream_handler) if llm_config is not self.config else self
+            hedge_after = self._hedge_after(llm_config)
+            request_log.provider = llm_config.provider
+            request_log.model = llm_config.model
             request_log.messages = convo.messages[:]
             request_log.response = None
             request_log.status = LLMRequestStatus.SUCCESS
@@ -186,11 +431,22 @@ class BaseLLMClient:
             response = None
 
             try:
-                response, prompt_tokens, completion_tokens = await self._make_request(
-                    convo,
-                    temperature=temperature,
-                    json_mode=json_mode,
-                )
+                request_args = (convo, prompt_length // CHARS_PER_TOKEN, temperature, json_mode, request_log, parser)
+                if hedge_after is None:
+                    response, prompt_tokens, completion_tokens = await self._attempt(client, *request_args)
+                else:
+                    response, prompt_tokens, completion_tokens = await self._hedged_attempt(
+                        client, hedge_after, *request_args
+                    )
+            except StreamParseError as err:
+                # The response was aborted mid-stream because it can't be parsed
+                request_log.response = err.response
+                request_log.error = f"Error parsing response: {err}"
+                request_log.status = LLMRequestStatus.ERROR
+                log.debug(f"Aborted LLM response stream: {err}, asking LLM to retry", exc_info=True)
+                convo.assistant(err.response)
+                convo.user(f"Error parsing response: {err}. Please output your response EXACTLY as requested.")
+                continue
             except (openai.APIConnectionError, anthropic.APIConnectionError, groq.APIConnectionError) as err:
                 log.warning(f"API connection error: {err}", exc_info=True)
                 request_log.error = str(f"API connection error: {err}")
@@ -210,12 +466,15 @@ class BaseLLMClient:
                 log.warning(f"Rate limit error: {err}", exc_info=True)
                 request_log.error = str(f"Rate limit error: {err}")
                 request_log.status = LLMRequestStatus.ERROR
-                wait_time = self.rate_limit_sleep(err)
+                wait_time = client.rate_limit_sleep(err)
                 if wait_time:
-                    message = f"We've hit {self.config.provider.value} rate limit. Sleeping for {wait_time.seconds} seconds..."
-                    if self.error_handler:
-                        await self.error_handler(LLMError.RATE_LIMITED, message)
-                    await asyncio.sleep(wait_time.seconds)
+                    # Hold back all requests to this provider/model, the retry waits in the scheduler
+                    llm_scheduler.get_limiter(client.config).backoff(max(0.0, wait_time.total_seconds()))
+                    if health_tracker.select(candidates) is client.config:
+                        # No healthy fallback to switch to, we'll have to wait
+                        message = f"We've hit {client.config.provider.value} rate limit. Sleeping for {wait_time.seconds} seconds..."
+                        if self.error_handler:
+                            await self.error_handler(LLMError.RATE_LIMITED, message)
                     continue
                 else:
                     # RateLimitError that shouldn't be retried, eg. insufficient funds
@@ -303,12 +562,34 @@ class BaseLLMClient:
         t1 = time()
         request_log.duration = t1 - t0
 
+        # Responses from the fallback LLMs are not cached under the primary LLM's key
+        if cache_key and request_log.model == self.config.model:
+            await self.cache.aput(
+                cache_key, request_log.response, request_log.prompt_tokens, request_log.completion_tokens
+            )
+
         log.debug(
             f"Total {self.provider.value} response time {request_log.duration:.2f}s, {request_log.prompt_tokens} prompt tokens, {request_log.completion_tokens} completion tokens used"
         )
+        if request_log.cache_read_tokens or request_log.cache_write_tokens:
+            log.debug(
+                f"Prompt cache: {request_log.cache_read_tokens} tokens read, {request_log.cache_write_tokens} tokens written"
+            )
 
         return response, request_log
 
+    def _hedge_after(self, config: LLMConfig) -> Optional[float]:
+        """
+        Number of seconds to wait for the first token before hedging the request.
+
+        :param config: Configuration of the LLM the request is sent to.
+        :return: The LLM's observed p95 time to first token (or the configured
+            default until enough timings are collected), or None if hedging is disabled.
+        """
+        if self.config.hedge_after is None:
+            return None
+        return health_tracker.ttft_p95(config) or self.config.hedge_after
+
     async def api_check(self) -> bool:
         """
         Perform an LLM API check.
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from hashlib import sha256
+from time import time
+from typing import Optional
+
+from core.config import LLMCacheConfig, LLMCacheMode
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+
+class CachedResponse:
+    """
+    A response served from the LLM response cache.
+    """
+
+    def __init__(self, response: str, prompt_tokens: int, completion_tokens: int):
+        self.response = response
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of LLM responses, backed by a local SQLite database.
+
+    Responses are keyed by the provider, model, temperature, JSON mode and
+    the hash of the conversation messages, so identical requests (eg. when
+    resuming or retrying a project) can be served without calling the LLM.
+
+    Entries older than the configured TTL are ignored and purged, and
+    the least recently used entries are evicted when the total size of the
+    cached responses exceeds the configured maximum.
+
+    The async methods (`aget()`, `aput()`, `aremove()`) run the queries in a
+    worker thread, so that they don't stall the other requests' streams.
+
+    Example usage:
+
+    >>> cache = LLMResponseCache(config.llm_cache)
+    >>> key = cache.key("openai", "gpt-4o", 0.0, False, convo.messages)
+    >>> cached = await cache.aget(key)
+    >>> if cached is None:
+    ...     await cache.aput(key, response, prompt_tokens, completion_tokens)
+    """
+
+    def __init__(self, config: LLMCacheConfig):
+        self.config = config
+        self.hits = 0
+        self.misses = 0
+
+        if config.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(config.path)), exist_ok=True)
+
+        self.db = sqlite3.connect(config.path, isolation_level=None, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "  key TEXT PRIMARY KEY,"
+            "  response TEXT NOT NULL,"
+            "  prompt_tokens INTEGER NOT NULL,"
+            "  completion_tokens INTEGER NOT NULL,"
+            "  size INTEGER NOT NULL,"
+            "  created_at REAL NOT NULL,"
+            "  accessed_at REAL NOT NULL"
+            ")"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed_at ON responses (accessed_at)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_responses_created_at ON responses (created_at)")
+
+        # The connection is used from worker threads, one query at a time
+        self.lock = threading.Lock()
+        # Running total of the cached response sizes, so it doesn't need to be recomputed on each put
+        self.total_size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.mode != LLMCacheMode.OFF
+
+    @property
+    def replay(self) -> bool:
+        return self.config.mode == LLMCacheMode.REPLAY
+
+    def should_cache(self, temperature: float) -> bool:
+        """
+        Check whether a request with the given temperature should be cached.
+
+        :param temperature: Temperature used for the request.
+        :return: True if the request should be looked up/stored in the cache.
+        """
+        if not self.enabled:
+            return False
+        return temperature == 0 or not self.config.deterministic_only
+
+    @staticmethod
+    def key(provider: str, model: str, temperature: float, json_mode: bool, messages: list[dict]) -> str:
+        """
+        Compute the cache key for the request.
+
+        :return: Hex digest uniquely identifying the request.
+        """
+        messages_hash = sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+        key_data = json.dumps([provider, model, temperature, json_mode, messages_hash])
+        return sha256(key_data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        Look up a cached response.
+
+        :param key: Cache key (see `key()`).
+        :return: The cached response, or None if not found or expired.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT response, prompt_tokens, completion_tokens, created_at, size FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            now = time()
+            if row is not None and self.config.ttl is not None and row[3] + self.config.ttl < now:
+                self._delete(key)
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return CachedResponse(row[0], row[1], row[2])
+
+    async def aget(self, key: str) -> Optional[CachedResponse]:
+        """
+        Look up a cached response, without blocking the event loop.
+
+        See `get()`.
+        """
+        return await asyncio.to_thread(self.get, key)
+
+    def put(self, key: str, response: str, prompt_tokens: int, completion_tokens: int):
+        """
+        Store the response in the cache, evicting old entries if needed.
+
+        :param key: Cache key (see `key()`).
+        :param response: Raw (unparsed) LLM response.
+        :param prompt_tokens: Number of prompt tokens used for the original request.
+        :param completion_tokens: Number of completion tokens used for the original request.
+        """
+        now = time()
+        size = len(response.encode("utf-8"))
+        with self.lock:
+            self._delete(key)
+            self.db.execute(
+                "INSERT INTO responses "
+                "(key, response, prompt_tokens, completion_tokens, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, response, prompt_tokens, completion_tokens, size, now, now),
+            )
+            self.total_size += size
+            self._evict()
+
+    async def aput(self, key: str, response: str, prompt_tokens: int, completion_tokens: int):
+        """
+        Store the response in the cache, without blocking the event loop.
+
+        See `put()`.
+        """
+        await asyncio.to_thread(self.put, key, response, prompt_tokens, completion_tokens)
+
+    def remove(self, key: str):
+        """
+        Remove the entry from the cache (eg. if it can no longer be parsed).
+
+        :param key: Cache key (see `key()`).
+        """
+        with self.lock:
+            self._delete(key)
+
+    async def aremove(self, key: str):
+        """
+        Remove the entry from the cache, without blocking the event loop.
+
+        See `remove()`.
+        """
+        await asyncio.to_thread(self.remove, key)
+
+    def _delete(self, key: str):
+        row = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_size -= row[0]
+
+    def evict(self):
+        """
+        Purge expired entries and evict least recently used ones over the size limit.
+        """
+        with self.lock:
+            self._evict()
+
+    def _evict(self):
+        if self.config.ttl is not None:
+            cutoff = time() - self.config.ttl
+            expired_size = self.db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?", (cutoff,)
+            ).fetchone()[0]
+            if expired_size:
+                self.db.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+                self.total_size -= expired_size
+
+        if self.total_size <= self.config.max_size:
+            return
+
+        to_delete = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+            if self.total_size <= self.config.max_size:
+                break
+            to_delete.append((key,))
+            self.total_size -= size
+
+        self.db.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        log.debug(f"Evicted {len(to_delete)} entries from the LLM response cache")
+
+    def close(self):
+        self.db.close()
+
+
+_caches: dict[str, LLMResponseCache] = {}
+
+
+def get_response_cache(config: LLMCacheConfig) -> Optional[LLMResponseCache]:
+    """
+    Get the (shared) response cache for the given configuration.
+
+    :param config: Cache configuration.
+    :return: The response cache, or None if caching is disabled.
+    """
+    if config.mode == LLMCacheMode.OFF:
+        return None
+
+    cache = _caches.get(config.path)
+    if cache is None:
+        cache = LLMResponseCache(config)
+        _caches[config.path] = cache
+    else:
+        cache.config = config
+    return cache
+
+
+__all__ = ["CachedResponse", "LLMResponseCache", "get_response_cache"]
@@ -0,0 +1,195 @@
+import asyncio
+from typing import Any, Optional
+
+import httpx
+
+from core.config import LLMConfig
+from core.llm.scheduler import llm_scheduler
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+# Connection pool limits for each shared HTTP client
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 60.0  # seconds
+
+
+def _http2_available() -> bool:
+    """
+    Check whether HTTP/2 support (the optional `h2` package) is installed.
+    """
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of pooled HTTP clients used by the LLM clients.
+
+    Creating an SDK client (`AsyncOpenAI`, `AsyncAnthropic`, ...) is cheap, but each
+    one normally brings its own `httpx.AsyncClient`, and with it a fresh connection
+    pool and TLS handshake. The registry hands out one long-lived HTTP client per
+    (provider, base URL, API key, timeouts) combination, so all agents talking to
+    the same endpoint share the keep-alive connections. The rate limit headers of
+    all responses are passed on to the LLM scheduler (see `core.llm.scheduler`).
+
+    This class is a singleton, use the `client_registry` global variable to access it:
+
+    >>> from core.llm.client_registry import client_registry
+    >>> http_client = client_registry.get(llm_config)
+    >>> client_registry.stats()
+    >>> await client_registry.aclose()
+    """
+
+    def __init__(self):
+        self.clients: dict[tuple, httpx.AsyncClient] = {}
+        self.loops: dict[tuple, Optional[asyncio.AbstractEventLoop]] = {}
+        self.num_requests: dict[tuple, int] = {}
+        # Clients replaced because their event loop went away: (key, client, number of requests)
+        self.stale_clients: list[tuple[tuple, httpx.AsyncClient, int]] = []
+
+    @staticmethod
+    def _key(config: LLMConfig) -> tuple:
+        return (
+            config.provider.value,
+            config.base_url,
+            config.api_key,
+            config.connect_timeout,
+            config.read_timeout,
+        )
+
+    @staticmethod
+    def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    def _create_client(self, key: tuple, config: LLMConfig) -> httpx.AsyncClient:
+        async def count_request(request: httpx.Request):
+            self.num_requests[key] = self.num_requests.get(key, 0) + 1
+
+        async def track_rate_limits(response: httpx.Response):
+            llm_scheduler.update_from_headers(response.headers)
+
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                max(config.connect_timeout, config.read_timeout),
+                connect=config.connect_timeout,
+                read=config.read_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            http2=_http2_available(),
+            follow_redirects=True,
+            event_hooks={"request": [count_request], "response": [track_rate_limits]},
+        )
+
+    def get(self, config: LLMConfig) -> httpx.AsyncClient:
+        """
+        Get the shared HTTP client for the given LLM configuration.
+
+        The client is created on first use. Connections in the pool are bound
+        to the event loop they were opened in, so if the client was created
+        in a different (now stale) event loop, a new one is created instead.
+        The replaced client is kept until `aclose()`, so its connections are
+        closed and it's still included in `stats()`.
+
+        :param config: LLM configuration.
+        :return: Shared HTTP client to pass to the SDK client.
+        """
+        key = self._key(config)
+        loop = self._current_loop()
+
+        client = self.clients.get(key)
+        if client is not None and not client.is_closed:
+            client_loop = self.loops.get(key)
+            if client_loop is None or loop is None or client_loop is loop:
+                if client_loop is None:
+                    self.loops[key] = loop
+                return client
+            self.stale_clients.append((key, client, self.num_requests.get(key, 0)))
+
+        log.debug(f"Creating shared HTTP client for {config.provider.value} ({config.base_url or 'default endpoint'})")
+        client = self._create_client(key, config)
+        self.clients[key] = client
+        self.loops[key] = loop
+        self.num_requests[key] = 0
+        return client
+
+    @staticmethod
+    def _pool_stats(client: httpx.AsyncClient) -> tuple[int, int]:
+        """
+        Count open and idle connections in the client's connection pool.
+
+        Uses httpcore internals, so it degrades gracefully to zero counts
+        if the transport doesn't expose the pool.
+        """
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None) or []
+        idle = 0
+        for conn in connections:
+            try:
+                if conn.is_idle():
+                    idle += 1
+            except Exception:  # noqa
+                pass
+        return len(connections), idle
+
+    def stats(self) -> list[dict[str, Any]]:
+        """
+        Return connection pool statistics for all the shared clients.
+
+        :return: List of dicts, one for each shared client.
+        """
+        result = []
+        clients = [(key, client, self.num_requests.get(key, 0), False) for key, client in self.clients.items()]
+        clients += [(key, client, num_requests, True) for key, client, num_requests in self.stale_clients]
+        for key, client, num_requests, stale in clients:
+            provider, base_url, _api_key, connect_timeout, read_timeout = key
+            open_connections, idle_connections = self._pool_stats(client)
+            result.append(
+                {
+                    "provider": provider,
+                    "base_url": base_url,
+                    "connect_timeout": connect_timeout,
+                    "read_timeout": read_timeout,
+                    "requests": num_requests,
+                    "open_connections": open_connections,
+                    "idle_connections": idle_connections,
+                    "closed": client.is_closed,
+                    "stale": stale,
+                }
+            )
+        return result
+
+    async def aclose(self):
+        """
+        Close all the shared clients and their connection pools.
+
+        Safe to call multiple times (eg. both from normal shutdown and exit handlers).
+        """
+        clients = list(self.clients.values()) + [client for _, client, _ in self.stale_clients]
+        self.clients.clear()
+        self.stale_clients.clear()
+        self.loops.clear()
+        self.num_requests.clear()
+
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as err:  # noqa
+                log.debug(f"Error closing shared HTTP client: {err}")
+
+
+client_registry = ClientRegistry()
+
+
+__all__ = ["ClientRegistry", "client_registry"]
@@ -1,4 +1,3 @@
-from copy import deepcopy
 from typing import Any, Iterator, Optional
 
 
@@ -8,12 +7,19 @@ class Convo:
 
     Holds messages and an optional metadata log (list of dicts with
     prompt information).
+
+    Forking is copy-on-write: the forked conversation shares the message
+    and prompt log lists with the parent until either of them is modified,
+    at which point the modified one makes a shallow copy of the lists.
+    Messages themselves are never modified once added, so they are shared
+    between all the forks.
     """
 
     ROLES = ["system", "user", "assistant", "function"]
 
-    messages: list[dict[str, str]]
-    prompt_log: list[dict[str, Any]]
+    _messages: list[dict[str, str]]
+    _prompt_log: list[dict[str, Any]]
+    _shared: bool
 
     def __init__(self, content: Optional[str] = None):
         """
@@ -21,12 +27,61 @@ class Convo:
 
         :param content: Initial system message (optional).
         """
-        self.messages = []
-        self.prompt_log = []
+        self._messages = []
+        self._prompt_log = []
+        self._shared = False
 
         if content is not None:
             self.system(content)
 
+    @property
+    def messages(self) -> list[dict[str, str]]:
+        """
+        Messages in the conversation.
+
+        The list may be shared with other forks of this conversation, so
+        it must not be modified in place; use `add()` or assign a new list.
+        """
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages: list[dict[str, str]]):
+        # The caller may still hold a reference to the list, so treat it as shared
+        self._messages = messages
+        self._shared = True
+
+    @property
+    def prompt_log(self) -> list[dict[str, Any]]:
+        """
+        Metadata about the prompts used in the conversation.
+
+        As with `messages`, the list may be shared with other forks.
+        """
+        return self._prompt_log
+
+    @prompt_log.setter
+    def prompt_log(self, prompt_log: list[dict[str, Any]]):
+        self._prompt_log = prompt_log
+        self._shared = True
+
+    def _unshare(self):
+        """
+        Make private copies of the lists shared with other forks, before modifying them.
+        """
+        if self._shared:
+            self._messages = self._messages[:]
+            self._prompt_log = self._prompt_log[:]
+            self._shared = False
+
+    def log_prompt(self, entry: dict[str, Any]):
+        """
+        Add an entry to the prompt log.
+
+        :param entry: Prompt information.
+        """
+        self._unshare()
+        self._prompt_log.append(entry)
+
     @staticmethod
     def _dedent(text: str) -> str:
         """
@@ -69,7 +124,8 @@ class Convo:
         if name is not None:
             message["name"] = name
 
-        self.messages.append(message)
+        self._unshare()
+        self._messages.append(message)
         return self
 
     def system(self, content: str, name: Optional[str] = None) -> "Convo":
@@ -119,15 +175,17 @@ class Convo:
         """
         Create an identical copy of the conversation.
 
-        This performs a deep copy of all the message
-        contents, so you can safely modify both the
-        parent and the child conversation.
+        This is a constant-time operation: the child shares the messages
+        with the parent and copies them (shallowly) only when either is
+        modified, so you can safely modify both the parent and the child
+        conversation.
 
         :return: A copy of the conversation.
         """
-        child = Convo()
-        child.messages = deepcopy(self.messages)
-        child.prompt_log = deepcopy(self.prompt_log)
+        child = self.__class__.__new__(self.__class__)
+        child.__dict__.update(self.__dict__)
+        child._shared = True
+        self._shared = True
         return child
 
     def after(self, parent: "Convo") -> "Convo":
@@ -144,7 +202,7 @@ class Convo:
             index += 1
 
         child = Convo()
-        child.messages = [deepcopy(msg) for msg in self.messages[index:]]
+        child._messages = self._messages[index:]
         return child
 
     def last(self) -> Optional[dict[str, str]]:
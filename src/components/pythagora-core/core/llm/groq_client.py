@@ -7,7 +7,10 @@ from httpx import Timeout
 
 from core.config import LLMProvider
 from core.llm.base import BaseLLMClient
+from core.llm.client_registry import client_registry
 from core.llm.convo import Convo
+from core.llm.parser import IncrementalParser, StreamParseError
+from core.llm.request_log import LLMRequestLog
 from core.log import get_logger
 
 log = get_logger(__name__)
@@ -26,6 +29,7 @@ class GroqClient(BaseLLMClient):
                 connect=self.config.connect_timeout,
                 read=self.config.read_timeout,
             ),
+            http_client=client_registry.get(self.config),
         )
 
     async def _make_request(
@@ -33,6 +37,8 @@ class GroqClient(BaseLLMClient):
         convo: Convo,
         temperature: Optional[float] = None,
         json_mode: bool = False,
+        request_log: Optional[LLMRequestLog] = None,
+        stream_parser: Optional[IncrementalParser] = None,
     ) -> tuple[str, int, int]:
         completion_kwargs = {
             "model": self.config.model,
@@ -48,17 +54,27 @@ class GroqClient(BaseLLMClient):
         prompt_tokens = 0
         completion_tokens = 0
 
-        async for chunk in stream:
-            if not chunk.choices:
-                continue
-
-            content = chunk.choices[0].delta.content
-            if not content:
-                continue
-
-            response.append(content)
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+
+                content = chunk.choices[0].delta.content
+                if not content:
+                    continue
+
+                response.append(content)
+                if self.stream_handler:
+                    await self.stream_handler(content)
+                if stream_parser is not None and stream_parser.feed(content):
+                    # Got the complete response, no need to wait for the rest of the stream
+                    await stream.close()
+                    break
+        except StreamParseError:
+            await stream.close()
             if self.stream_handler:
-                await self.stream_handler(content)
+                await self.stream_handler(None)
+            raise
 
         response_str = "".join(response)
 
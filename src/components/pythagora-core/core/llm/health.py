@@ -0,0 +1,137 @@
+from collections import deque
+from time import monotonic
+from typing import Any, Optional
+
+from core.config import LLMConfig
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+# After a failure, the LLM is considered unhealthy for COOLDOWN seconds,
+# doubling with each consecutive failure up to MAX_COOLDOWN.
+COOLDOWN = 30.0
+MAX_COOLDOWN = 600.0
+
+# Number of recent time-to-first-token samples kept per LLM, and the
+# minimum number of samples needed before we trust the percentile.
+TTFT_SAMPLES = 100
+MIN_TTFT_SAMPLES = 20
+
+
+class LLMHealth:
+    """
+    Health and latency of a single LLM (provider endpoint, API key and model).
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        self.ttft: deque[float] = deque(maxlen=TTFT_SAMPLES)
+
+    def ttft_percentile(self, percentile: float) -> Optional[float]:
+        if len(self.ttft) < MIN_TTFT_SAMPLES:
+            return None
+        samples = sorted(self.ttft)
+        return samples[min(len(samples) - 1, int(len(samples) * percentile))]
+
+
+class HealthTracker:
+    """
+    Process-wide tracker of LLM health, used for failover and hedging.
+
+    An LLM that fails (connection errors, timeouts, rate limits, server
+    errors) is skipped in favor of the configured fallbacks for a cooldown
+    period that grows with consecutive failures, and is used again after
+    the cooldown or once a request to it succeeds.
+
+    The tracker also collects time-to-first-token timings, used to decide
+    when a stalled request should be hedged.
+
+    This class is a singleton, use the `health_tracker` global variable to access it:
+
+    >>> from core.llm.health import health_tracker
+    >>> config = health_tracker.select([llm_config] + llm_config.fallback)
+    >>> health_tracker.record_failure(config)
+    """
+
+    def __init__(self):
+        self.llms: dict[tuple, LLMHealth] = {}
+
+    def get(self, config: LLMConfig) -> LLMHealth:
+        # Different API keys have separate quotas, so they fail over independently
+        key = (config.provider.value, config.base_url, config.api_key, config.model)
+        health = self.llms.get(key)
+        if health is None:
+            health = LLMHealth()
+            self.llms[key] = health
+        return health
+
+    def is_healthy(self, config: LLMConfig) -> bool:
+        return monotonic() >= self.get(config).unhealthy_until
+
+    def record_success(self, config: LLMConfig):
+        health = self.get(config)
+        if health.failures:
+            log.info(f"LLM {config.provider.value} {config.model} is healthy again")
+        health.failures = 0
+        health.unhealthy_until = 0.0
+
+    def record_failure(self, config: LLMConfig):
+        health = self.get(config)
+        health.failures += 1
+        cooldown = min(COOLDOWN * 2 ** (health.failures - 1), MAX_COOLDOWN)
+        health.unhealthy_until = monotonic() + cooldown
+        log.debug(
+            f"LLM {config.provider.value} {config.model} failed ({health.failures} consecutive failures), "
+            f"avoiding it for {cooldown:.0f}s"
+        )
+
+    def record_ttft(self, config: LLMConfig, seconds: float):
+        self.get(config).ttft.append(seconds)
+
+    def ttft_p95(self, config: LLMConfig) -> Optional[float]:
+        """
+        Observed 95th percentile time to first token for the LLM.
+
+        :param config: LLM configuration.
+        :return: p95 time to first token in seconds, or None if there aren't enough samples.
+        """
+        return self.get(config).ttft_percentile(0.95)
+
+    def select(self, configs: list[LLMConfig]) -> LLMConfig:
+        """
+        Select the LLM to use from the list of candidates (in order of preference).
+
+        :param configs: Primary LLM configuration followed by the fallbacks.
+        :return: The first healthy LLM, or the one that will recover the soonest if none are healthy.
+        """
+        for config in configs:
+            if self.is_healthy(config):
+                return config
+        return min(configs, key=lambda config: self.get(config).unhealthy_until)
+
+    def stats(self) -> list[dict[str, Any]]:
+        """
+        Return the health and latency of all the LLMs used so far.
+
+        :return: List of dicts, one for each LLM.
+        """
+        now = monotonic()
+        return [
+            {
+                "provider": provider,
+                "base_url": base_url,
+                "model": model,
+                "failures": health.failures,
+                "healthy": now >= health.unhealthy_until,
+                "ttft_p50": health.ttft_percentile(0.5),
+                "ttft_p95": health.ttft_percentile(0.95),
+            }
+            for (provider, base_url, _api_key, model), health in self.llms.items()
+        ]
+
+
+health_tracker = HealthTracker()
+
+
+__all__ = ["HealthTracker", "health_tracker"]
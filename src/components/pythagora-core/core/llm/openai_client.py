@@ -8,7 +8,11 @@ from openai import AsyncOpenAI, RateLimitError
 
 from core.config import LLMProvider
 from core.llm.base import BaseLLMClient
+from core.llm.client_registry import client_registry
 from core.llm.convo import Convo
+from core.llm.parser import IncrementalParser, StreamParseError
+from core.llm.request_log import LLMRequestLog
+from core.llm.token_budget import count_tokens
 from core.log import get_logger
 
 log = get_logger(__name__)
@@ -28,6 +32,7 @@ class OpenAIClient(BaseLLMClient):
                 connect=self.config.connect_timeout,
                 read=self.config.read_timeout,
             ),
+            http_client=client_registry.get(self.config),
         )
 
     async def _make_request(
@@ -35,6 +40,8 @@ class OpenAIClient(BaseLLMClient):
         convo: Convo,
         temperature: Optional[float] = None,
         json_mode: bool = False,
+        request_log: Optional[LLMRequestLog] = None,
+        stream_parser: Optional[IncrementalParser] = None,
     ) -> tuple[str, int, int]:
         completion_kwargs = {
             "model": self.config.model,
@@ -52,22 +59,34 @@ class OpenAIClient(BaseLLMClient):
         response = []
         prompt_tokens = 0
         completion_tokens = 0
-
-        async for chunk in stream:
-            if chunk.usage:
-                prompt_tokens += chunk.usage.prompt_tokens
-                completion_tokens += chunk.usage.completion_tokens
-
-            if not chunk.choices:
-                continue
-
-            content = chunk.choices[0].delta.content
-            if not content:
-                continue
-
-            response.append(content)
+        complete = False
+
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    prompt_tokens += chunk.usage.prompt_tokens
+                    completion_tokens += chunk.usage.completion_tokens
+
+                if not chunk.choices:
+                    continue
+
+                content = chunk.choices[0].delta.content
+                if not content:
+                    continue
+
+                response.append(content)
+                if self.stream_handler:
+                    await self.stream_handler(content)
+                if stream_parser is not None and stream_parser.feed(content):
+                    # Got the complete response, no need to wait for the rest of the stream
+                    complete = True
+                    await stream.close()
+                    break
+        except StreamParseError:
+            await stream.close()
             if self.stream_handler:
-                await self.stream_handler(content)
+                await self.stream_handler(None)
+            raise
 
         response_str = "".join(response)
 
@@ -75,7 +94,11 @@ class OpenAIClient(BaseLLMClient):
         if self.stream_handler:
             await self.stream_handler(None)
 
-        if prompt_tokens == 0 and completion_tokens == 0:
+        if complete and prompt_tokens == 0 and completion_tokens == 0:
+            # The usage is reported at the end of the stream, which we didn't wait for
+            prompt_tokens = sum(3 + count_tokens(msg["content"]) for msg in convo.messages)
+            completion_tokens = count_tokens(response_str)
+        elif prompt_tokens == 0 and completion_tokens == 0:
             # See https://cookbook.openai.com/examples/how_to_count_tokens_with_tiktoken
             prompt_tokens = sum(3 + len(tokenizer.encode(msg["content"])) for msg in convo.messages)
             completion_tokens = len(tokenizer.encode(response_str))
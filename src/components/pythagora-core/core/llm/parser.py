@@ -1,9 +1,18 @@
 import json
 import re
 from enum import Enum
-from typing import List, Optional, Union
+from typing import Any, List, Optional, Union
 
 from pydantic import BaseModel, ValidationError, create_model
+from pydantic_core import from_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Validation errors that are expected while the JSON is still incomplete
+PARTIAL_JSON_ERRORS = {"missing", "too_short", "union_tag_not_found"}
 
 
 class CodeBlock(BaseModel):
@@ -16,6 +25,225 @@ class ParsedBlocks(BaseModel):
     blocks: List[CodeBlock]
 
 
+class StreamParseError(ValueError):
+    """
+    Raised while streaming if the partial response can't possibly be parsed.
+
+    The partial response is included so it can be sent back to the LLM
+    along with the error when retrying.
+    """
+
+    def __init__(self, message: str, response: str):
+        super().__init__(message)
+        self.response = response
+
+
+class IncrementalParser:
+    """
+    Base class for parsers that check the LLM response while it's being streamed.
+
+    An incremental parser is created for each request (see the `streaming()`
+    method on the parsers that support it) and fed the response chunks as they
+    arrive. It can stop the stream as soon as the expected output is complete,
+    or abort the request early if the output is malformed. The complete
+    response is still parsed by the regular parser.
+    """
+
+    def __init__(self):
+        self.chunks: list[str] = []
+
+    @property
+    def text(self) -> str:
+        """Response received so far."""
+        return "".join(self.chunks)
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Process the next chunk of the response.
+
+        :param chunk: Response chunk.
+        :return: True if the response is complete and the stream can be stopped.
+        :raises StreamParseError: If the partial response can't be parsed.
+        """
+        self.chunks.append(chunk)
+        return False
+
+
+class IncrementalCodeBlockParser(IncrementalParser):
+    """
+    Stop the stream as soon as the (single) Markdown code block is closed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.line = ""
+        self.opened = False
+
+    def feed(self, chunk: str) -> bool:
+        super().feed(chunk)
+        lines = (self.line + chunk).split("\n")
+        self.line = lines.pop()
+
+        for line in lines:
+            if line.startswith("```"):
+                if self.opened:
+                    return True
+                self.opened = True
+
+        return self.opened and self.line.startswith("```")
+
+
+class IncrementalJSONParser(IncrementalParser):
+    """
+    Validate the JSON response while it's being streamed.
+
+    Each time a value is completed (a comma or a closing bracket arrives),
+    the JSON received so far is checked for syntax errors and validated
+    against the spec, ignoring errors in the objects and lists that are still
+    open. Errors abort the stream (in strict mode). The stream is stopped as
+    soon as the top-level JSON value (and the code block it's in, if any)
+    is closed.
+    """
+
+    def __init__(self, parser: "JSONParser"):
+        super().__init__()
+        self.parser = parser
+        self.prefix = ""
+        self.fenced: Optional[bool] = None
+        self.json_chunks: list[str] = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.closed = False
+        self.after = ""
+
+    def _start(self, chunk: str) -> Optional[str]:
+        """
+        Skip the leading whitespace and code block fence.
+
+        :return: Start of the JSON in the chunk, or None if we don't know yet.
+        """
+        self.prefix += chunk
+        text = self.prefix.lstrip()
+        if text.startswith("```"):
+            if "\n" not in text:
+                return None
+            self.fenced = True
+            return text.split("\n", 1)[1]
+        if not text or text in ("`", "``"):
+            return None
+        self.fenced = False
+        return text
+
+    def _scan(self, text: str) -> tuple[Optional[int], int]:
+        """
+        Track the JSON nesting level through the text.
+
+        :return: Tuple of (position after the last completed value in the text, or None,
+            nesting level at that position).
+        """
+        cut, cut_depth = None, 0
+        for i, char in enumerate(text):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                cut, cut_depth = i + 1, self.depth
+                if self.depth <= 0:
+                    self.closed = True
+                    break
+            elif char == ",":
+                cut, cut_depth = i, self.depth
+        return cut, cut_depth
+
+    @staticmethod
+    def _open_containers(data: Any, depth: int) -> set[tuple]:
+        """
+        Locations of the objects and lists that are still open.
+
+        These are the root value and its last (most recent) children, down to
+        the current nesting level.
+        """
+        path = []
+        locations = {()}
+        for _ in range(depth - 1):
+            if isinstance(data, dict) and data:
+                key = next(reversed(data))
+            elif isinstance(data, list) and data:
+                key = len(data) - 1
+            else:
+                break
+            path.append(key)
+            locations.add(tuple(path))
+            data = data[key]
+        return locations
+
+    def _validate(self, text: str, depth: int):
+        try:
+            data = from_json(text, allow_partial=True)
+        except ValueError as err:
+            raise StreamParseError(f"JSON is not valid: {err}", self.text) from err
+
+        if self.parser.spec is None or not isinstance(data, dict):
+            return
+
+        try:
+            self.parser.spec.model_validate(data)
+        except ValidationError as err:
+            open_containers = self._open_containers(data, depth)
+            errors = [
+                error
+                for error in err.errors()
+                if error["type"] not in PARTIAL_JSON_ERRORS and tuple(error["loc"]) not in open_containers
+            ]
+            if errors:
+                errtxt = self.parser.errors_to_markdown(errors)
+                raise StreamParseError(f"Invalid JSON format:\n{errtxt}", self.text) from err
+
+    def _closing_fence(self, text: str) -> bool:
+        """
+        Check whether the code block around the JSON has been closed.
+        """
+        self.after += text
+        return any(line.lstrip().startswith("```") for line in self.after.split("\n")[1:])
+
+    def feed(self, chunk: str) -> bool:
+        super().feed(chunk)
+
+        if self.closed:
+            return not self.fenced or self._closing_fence(chunk)
+
+        check_start = False
+        if not self.json_chunks:
+            chunk = self._start(chunk) if self.fenced is None else chunk.lstrip()
+            if not chunk:
+                return False
+            # Check early that the response actually starts with JSON
+            check_start = not chunk.startswith(("{", "["))
+
+        cut, cut_depth = self._scan(chunk)
+        if self.closed:
+            # The complete JSON is validated by the regular parser
+            self.json_chunks.append(chunk[:cut])
+            return not self.fenced or self._closing_fence(chunk[cut:])
+
+        if self.parser.strict and cut is not None:
+            self._validate("".join(self.json_chunks) + chunk[:cut], cut_depth)
+        elif self.parser.strict and check_start:
+            self._validate(chunk, self.depth)
+        self.json_chunks.append(chunk)
+        return False
+
+
 class DescriptiveCodeBlockParser:
     """
     Parse Markdown code blocks with their descriptions from a string.
@@ -111,6 +339,12 @@ class CodeBlockParser(MultiCodeBlockParser):
     checking that there's exactly one block.
     """
 
+    def streaming(self) -> IncrementalParser:
+        """
+        Create an incremental parser that stops the stream when the code block is closed.
+        """
+        return IncrementalCodeBlockParser()
+
     def __call__(self, text: str) -> str:
         blocks = super().__call__(text)
         # FIXME: if there are more than 1 code block, this means the output actually contains ```,
@@ -133,6 +367,44 @@ class OptionalCodeBlockParser:
         return text
 
 
+def _json_loads(text: str) -> Any:
+    """
+    Decode JSON, using orjson if it's installed (it's several times faster).
+
+    :param text: JSON text.
+    :return: Decoded data.
+    :raises ValueError: If the text is not valid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+# Extended models (spec fields + original_response) created by JSONParser, per spec
+_extended_models: dict[type[BaseModel], type[BaseModel]] = {}
+
+
+def extended_model(spec: type[BaseModel]) -> type[BaseModel]:
+    """
+    Get the model that extends `spec` with the `original_response` field.
+
+    The model is created once per spec and reused for all the responses
+    parsed with it, as creating pydantic models is expensive.
+
+    :param spec: Pydantic model used to parse the response.
+    :return: Extended model class.
+    """
+    model = _extended_models.get(spec)
+    if model is None:
+        model = create_model(
+            f"Extended{spec.__name__}",
+            original_response=(str, ...),
+            **{field_name: (field.annotation, field.default) for field_name, field in spec.model_fields.items()},
+        )
+        _extended_models[spec] = model
+    return model
+
+
 class JSONParser:
     def __init__(self, spec: Optional[BaseModel] = None, strict: bool = True):
         self.spec = spec
@@ -143,6 +415,12 @@ class JSONParser:
     def schema(self):
         return self.spec.model_json_schema() if self.spec else None
 
+    def streaming(self) -> IncrementalParser:
+        """
+        Create an incremental parser that validates the JSON while it's streamed.
+        """
+        return IncrementalJSONParser(self)
+
     @staticmethod
     def errors_to_markdown(errors: list) -> str:
         error_txt = []
@@ -165,36 +443,34 @@ class JSONParser:
                 else:
                     return None
 
-        try:
-            data = json.loads(text.strip())
-        except json.JSONDecodeError as e:
-            if self.strict:
-                raise ValueError(f"JSON is not valid: {e}") from e
-            else:
-                return None
+        text = text.strip()
         if self.spec is None:
-            return data
+            try:
+                return _json_loads(text)
+            except ValueError as e:
+                if self.strict:
+                    raise ValueError(f"JSON is not valid: {e}") from e
+                else:
+                    return None
 
         try:
-            model = self.spec(**data)
+            model = self.spec.model_validate_json(text)
         except ValidationError as err:
-            errtxt = self.errors_to_markdown(err.errors())
+            errors = err.errors()
+            if errors and errors[0]["type"] == "json_invalid":
+                raise ValueError(f"JSON is not valid: {errors[0]['msg']}") from err
+            errtxt = self.errors_to_markdown(errors)
             raise ValueError(f"Invalid JSON format:\n{errtxt}") from err
         except Exception as err:
             raise ValueError(f"Error parsing JSON: {err}") from err
 
-        # Create a new model that includes the original model fields and the original text
-        ExtendedModel = create_model(
-            f"Extended{self.spec.__name__}",
-            original_response=(str, ...),
-            **{field_name: (field.annotation, field.default) for field_name, field in self.spec.__fields__.items()},
+        # The fields have already been validated, so we can skip validation for the extended model
+        ExtendedModel = extended_model(self.spec)
+        return ExtendedModel.model_construct(
+            original_response=self.original_response,
+            **{field_name: getattr(model, field_name) for field_name in self.spec.model_fields},
         )
 
-        # Instantiate the extended model
-        extended_model = ExtendedModel(original_response=self.original_response, **model.dict())
-
-        return extended_model
-
 
 class EnumParser:
     def __init__(self, spec: Enum, ignore_case: bool = True):
@@ -1,7 +1,27 @@
+from collections import OrderedDict
 from os.path import isdir
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 
-from jinja2 import BaseLoader, Environment, FileSystemLoader, StrictUndefined, TemplateNotFound
+from jinja2 import (
+    BaseLoader,
+    BytecodeCache,
+    Environment,
+    FileSystemLoader,
+    StrictUndefined,
+    Template,
+    TemplateNotFound,
+    meta,
+)
+from jinja2.runtime import Context
+
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+# Maximum number of rendered partials kept in memory
+MAX_RENDERED_PARTIALS = 64
+
+_MISSING = object()
 
 
 class FormatTemplate:
@@ -9,15 +29,126 @@ class FormatTemplate:
         return template.format(**kwargs)
 
 
+class PromptEnvironment(Environment):
+    """
+    Jinja environment that memoizes rendered partial templates.
+
+    Templates whose name starts with `memoize_prefix` (eg. "partials/") are
+    rendered once for each combination of values of the variables they (and
+    the templates they include) use, and the rendered text is reused for
+    subsequent renders and includes. This way, several agents rendering
+    prompts for the same project state don't each re-render the same file
+    listing.
+
+    Simple values (strings, numbers, booleans, None) are part of the key as
+    they are. Other objects are keyed by their `cache_key` attribute (see
+    `ProjectState.cache_key`). If any of the variables can't be keyed, the
+    partial is rendered normally.
+    """
+
+    def __init__(self, *args, memoize_prefix: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.memoize_prefix = memoize_prefix
+        self.rendered: OrderedDict[tuple, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_template(self, name, parent=None, globals=None) -> Template:
+        template = super().get_template(name, parent, globals)
+        if (
+            self.memoize_prefix
+            and template.name
+            and template.name.startswith(self.memoize_prefix)
+            and not getattr(template, "_memoized", False)
+        ):
+            self._memoize(template)
+        return template
+
+    def _template_variables(self, name: str, seen: Optional[set[str]] = None) -> Optional[set[str]]:
+        """
+        Find the context variables used by the template and the templates it includes.
+
+        :param name: Template name.
+        :param seen: Templates already visited (for recursive includes).
+        :return: Variable names, or None if the template includes templates dynamically.
+        """
+        seen = set() if seen is None else seen
+        seen.add(name)
+
+        source, _, _ = self.loader.get_source(self, name)
+        ast = self.parse(source)
+        variables = meta.find_undeclared_variables(ast) - set(self.globals)
+        for included in meta.find_referenced_templates(ast):
+            if included is None:
+                return None
+            if included in seen:
+                continue
+            included_variables = self._template_variables(included, seen)
+            if included_variables is None:
+                return None
+            variables |= included_variables
+        return variables
+
+    @staticmethod
+    def _value_key(value: Any) -> Any:
+        if value is _MISSING:
+            return ("<undefined>",)
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        cache_key = getattr(value, "cache_key", None)
+        if cache_key is None:
+            raise TypeError(f"Can't use {type(value).__name__} as a cache key")
+        return (type(value).__name__, cache_key)
+
+    def _memoize(self, template: Template):
+        template._memoized = True
+        variables = self._template_variables(template.name)
+        if variables is None:
+            return
+
+        name = template.name
+        variables = sorted(variables)
+        render = template.root_render_func
+
+        def root_render_func(context: Context) -> Iterator[str]:
+            try:
+                key = (name,) + tuple(self._value_key(context.get(var, _MISSING)) for var in variables)
+                hash(key)
+            except TypeError:
+                yield from render(context)
+                return
+
+            rendered = self.rendered.get(key)
+            if rendered is not None:
+                self.hits += 1
+                self.rendered.move_to_end(key)
+            else:
+                self.misses += 1
+                rendered = self.concat(render(context))
+                self.rendered[key] = rendered
+                if len(self.rendered) > MAX_RENDERED_PARTIALS:
+                    self.rendered.popitem(last=False)
+            yield rendered
+
+        template.root_render_func = root_render_func
+
+
 class BaseJinjaTemplate:
-    def __init__(self, loader: Optional[BaseLoader]):
-        self.env = Environment(
+    def __init__(
+        self,
+        loader: Optional[BaseLoader],
+        bytecode_cache: Optional[BytecodeCache] = None,
+        memoize_prefix: Optional[str] = None,
+    ):
+        self.env = PromptEnvironment(
             loader=loader,
             autoescape=False,
             lstrip_blocks=True,
             trim_blocks=True,
             keep_trailing_newline=True,
             undefined=StrictUndefined,
+            bytecode_cache=bytecode_cache,
+            memoize_prefix=memoize_prefix,
         )
 
 
@@ -31,11 +162,39 @@ class JinjaStringTemplate(BaseJinjaTemplate):
 
 
 class JinjaFileTemplate(BaseJinjaTemplate):
-    def __init__(self, template_dirs: list[str]):
+    def __init__(
+        self,
+        template_dirs: list[str],
+        bytecode_cache: Optional[BytecodeCache] = None,
+        memoize_prefix: Optional[str] = None,
+    ):
+        """
+        Create a loader for the templates in the given directories.
+
+        :param template_dirs: Directories to search for templates.
+        :param bytecode_cache: Cache for the compiled templates (optional).
+        :param memoize_prefix: Memoize the rendered templates whose name starts
+            with this prefix (optional, see `PromptEnvironment`).
+        """
         for td in template_dirs:
             if not isdir(td):
                 raise ValueError(f"Template directory does not exist: {td}")
-        super().__init__(FileSystemLoader(template_dirs))
+        super().__init__(FileSystemLoader(template_dirs), bytecode_cache, memoize_prefix)
+
+    def precompile(self) -> int:
+        """
+        Compile all the templates ahead of time.
+
+        The compiled templates are kept in memory (and stored in the bytecode
+        cache, if configured), so rendering them later is fast.
+
+        :return: Number of templates compiled.
+        """
+        names = self.env.list_templates()
+        for name in names:
+            self.env.get_template(name)
+        log.debug(f"Precompiled {len(names)} prompt templates")
+        return len(names)
 
     def __call__(self, template: str, **kwargs: dict[str, Any]) -> str:
         try:
@@ -45,4 +204,4 @@ class JinjaFileTemplate(BaseJinjaTemplate):
         return tpl.render(**kwargs)
 
 
-__all__ = ["FormatTemplate", "JinjaStringTemplate", "JinjaFileTemplate"]
+__all__ = ["FormatTemplate", "PromptEnvironment", "JinjaStringTemplate", "JinjaFileTemplate"]
@@ -21,10 +21,13 @@ class LLMRequestLog(BaseModel):
     response: str = ""
     prompt_tokens: int = 0
     completion_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
     started_at: datetime = Field(default_factory=datetime.now)
     duration: float = 0.0
     status: LLMRequestStatus = LLMRequestStatus.SUCCESS
     error: str = ""
+    cached: bool = False
 
 
 __all__ = ["LLMRequestLog", "LLMRequestStatus"]
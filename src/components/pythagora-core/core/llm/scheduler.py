@@ -0,0 +1,372 @@
+import asyncio
+import heapq
+import re
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from enum import IntEnum
+from itertools import count
+from time import monotonic
+from typing import AsyncIterator, Mapping, Optional
+
+from core.config import LLMConfig
+from core.log import get_logger
+
+log = get_logger(__name__)
+
+# Assumed reset window for providers that report remaining capacity without a reset time (eg. Azure)
+DEFAULT_RESET_SECONDS = 10.0
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+# Rate limit header names: (limit, remaining, reset) for requests and tokens.
+# OpenAI, Groq and Azure use the `x-ratelimit-*` headers with reset durations
+# (eg. "6m0s", "20ms"), Anthropic uses `anthropic-ratelimit-*` with RFC 3339
+# timestamps. Anthropic reports input and output tokens separately on newer
+# API versions, in which case the input token limit is the one we track.
+REQUEST_HEADERS = [
+    ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+    (
+        "anthropic-ratelimit-requests-limit",
+        "anthropic-ratelimit-requests-remaining",
+        "anthropic-ratelimit-requests-reset",
+    ),
+]
+TOKEN_HEADERS = [
+    ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+    ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset"),
+    (
+        "anthropic-ratelimit-input-tokens-limit",
+        "anthropic-ratelimit-input-tokens-remaining",
+        "anthropic-ratelimit-input-tokens-reset",
+    ),
+]
+
+
+class RequestPriority(IntEnum):
+    """
+    Priority of an LLM request, lower values are scheduled first.
+    """
+
+    INTERACTIVE = 0  # the user is watching the response stream
+    NORMAL = 1
+    BACKGROUND = 2  # eg. describing files
+
+
+def parse_reset(value: str, now: Optional[datetime] = None) -> Optional[float]:
+    """
+    Parse a rate limit reset header into the number of seconds until reset.
+
+    Supports both durations ("1h2m3s", "7.66s", "20ms") and RFC 3339 timestamps.
+
+    :param value: Header value.
+    :param now: Current time (for testing).
+    :return: Seconds until reset, or None if the value can't be parsed.
+    """
+    value = value.strip()
+    matches = DURATION_PATTERN.findall(value)
+    if matches and "".join(num + unit for num, unit in matches) == value:
+        return sum(float(num) * DURATION_UNITS[unit] for num, unit in matches)
+
+    try:
+        reset_time = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+    if reset_time.tzinfo is None:
+        reset_time = reset_time.replace(tzinfo=timezone.utc)
+    if now is None:
+        now = datetime.now(tz=timezone.utc)
+    return max(0.0, (reset_time - now).total_seconds())
+
+
+class RateLimitBucket:
+    """
+    Remaining capacity (requests or tokens) as last reported by the provider.
+
+    Between responses, the remaining capacity is decremented locally for
+    each request we start, so concurrent requests don't all assume the same
+    capacity. Once the reset time passes, the bucket is considered full.
+    """
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+
+    def available(self, now: float) -> Optional[int]:
+        """
+        Remaining capacity, or None if unknown or the bucket has been reset.
+        """
+        if self.remaining is None or now >= self.reset_at:
+            return None
+        return self.remaining
+
+    def consume(self, amount: int, now: float):
+        if self.available(now) is not None:
+            self.remaining = max(0, self.remaining - amount)
+
+    def update(self, limit: Optional[str], remaining: Optional[str], reset: Optional[str], now: float):
+        try:
+            if limit is not None:
+                self.limit = int(limit)
+            if remaining is None:
+                return
+            self.remaining = int(remaining)
+        except ValueError:
+            return
+
+        reset_seconds = parse_reset(reset) if reset else None
+        self.reset_at = now + (DEFAULT_RESET_SECONDS if reset_seconds is None else reset_seconds)
+
+
+class RateLimiter:
+    """
+    Request and token buckets and the queue of waiting requests for one provider/model.
+
+    Waiting requests are started strictly in (priority, arrival) order, so
+    a large request at the head of the queue is not starved by smaller ones.
+    """
+
+    def __init__(self, name: str, max_concurrent: Optional[int] = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.requests = RateLimitBucket()
+        self.tokens = RateLimitBucket()
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.num_waited = 0
+        self._waiters: list[tuple[int, int, asyncio.Future, int]] = []
+        self._seq = count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _retry_at(self, tokens: int, now: float) -> Optional[float]:
+        """
+        Check whether a request estimated to use `tokens` tokens can start now.
+
+        :return: None if the request can start, otherwise the time at which to check again
+            (or `now` if the request has to wait for a running request to finish).
+        """
+        if now < self.blocked_until:
+            return self.blocked_until
+
+        if self.max_concurrent is not None and self.in_flight >= self.max_concurrent:
+            return now
+
+        remaining_requests = self.requests.available(now)
+        if remaining_requests is not None and remaining_requests <= 0:
+            return self.requests.reset_at
+
+        remaining_tokens = self.tokens.available(now)
+        if remaining_tokens is not None and remaining_tokens < tokens:
+            # A request larger than the whole token limit can never fit in the
+            # bucket, so let it through once nothing else is running and let
+            # the provider decide.
+            if not (self.tokens.limit is not None and tokens > self.tokens.limit and self.in_flight == 0):
+                return self.tokens.reset_at
+
+        return None
+
+    def _start(self, tokens: int, now: float):
+        self.in_flight += 1
+        self.requests.consume(1, now)
+        self.tokens.consume(tokens, now)
+
+    def _wake(self):
+        """
+        Start as many waiting requests as the limits allow, in priority order.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        now = monotonic()
+        while self._waiters:
+            _priority, _seq, future, tokens = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            retry_at = self._retry_at(tokens, now)
+            if retry_at is not None:
+                if retry_at > now:
+                    loop = future.get_loop()
+                    if not loop.is_closed():
+                        self._timer = loop.call_later(retry_at - now, self._wake)
+                return
+
+            heapq.heappop(self._waiters)
+            self._start(tokens, now)
+            future.set_result(None)
+
+    async def acquire(self, tokens: int, priority: RequestPriority):
+        """
+        Wait until a request estimated to use `tokens` tokens can be sent.
+
+        :param tokens: Estimated number of prompt tokens.
+        :param priority: Request priority.
+        """
+        now = monotonic()
+        if not self._waiters and self._retry_at(tokens, now) is None:
+            self._start(tokens, now)
+            return
+
+        self.num_waited += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future, tokens))
+        log.debug(f"Waiting for rate limit capacity for {self.name} ({len(self._waiters)} requests queued)")
+        self._wake()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # We were already given the slot, give it back
+                self.release()
+            else:
+                self._wake()
+            raise
+
+    def release(self):
+        """
+        Mark a request as finished and start waiting requests if possible.
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        self._wake()
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Update the buckets from the rate limit headers of a provider response.
+
+        :param headers: Response headers.
+        """
+        now = monotonic()
+        for bucket, names in ((self.requests, REQUEST_HEADERS), (self.tokens, TOKEN_HEADERS)):
+            for limit, remaining, reset in names:
+                if remaining in headers:
+                    bucket.update(headers.get(limit), headers[remaining], headers.get(reset), now)
+                    break
+
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                self.backoff(float(retry_after))
+            except ValueError:
+                pass
+
+        if self._waiters:
+            self._wake()
+
+    def backoff(self, seconds: float):
+        """
+        Don't start any new requests for the given number of seconds.
+
+        :param seconds: Number of seconds to wait.
+        """
+        self.blocked_until = max(self.blocked_until, monotonic() + seconds)
+
+
+_current_limiter: ContextVar[Optional[RateLimiter]] = ContextVar("current_rate_limiter", default=None)
+
+
+class LLMScheduler:
+    """
+    Process-wide scheduler for LLM requests.
+
+    Tracks the rate limits reported by each provider (per API key and model)
+    and queues requests so that we stay under the limits instead of running
+    into rate limit errors when many agents (eg. parallel CodeMonkey steps)
+    call the LLM at once. Waiting requests are started by priority, so the
+    interactive (streamed) responses go before background work.
+
+    The rate limit headers are read from all the responses going through
+    the shared HTTP clients (see `core.llm.client_registry`), and attributed
+    to the request currently being made in the same task.
+
+    This class is a singleton, use the `llm_scheduler` global variable to access it:
+
+    >>> from core.llm.scheduler import llm_scheduler
+    >>> async with llm_scheduler.slot(llm_config, tokens=1000, priority=RequestPriority.INTERACTIVE):
+    ...     response = await make_request()
+    """
+
+    def __init__(self):
+        self.limiters: dict[tuple, RateLimiter] = {}
+
+    def get_limiter(self, config: LLMConfig) -> RateLimiter:
+        """
+        Get the rate limiter for the given LLM configuration.
+
+        :param config: LLM configuration.
+        :return: Rate limiter shared by all requests to the same provider, API key and model.
+        """
+        key = (config.provider.value, config.base_url, config.api_key, config.model)
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(f"{config.provider.value} {config.model}", config.max_concurrent_requests)
+            self.limiters[key] = limiter
+        else:
+            limiter.max_concurrent = config.max_concurrent_requests
+        return limiter
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        config: LLMConfig,
+        tokens: int = 0,
+        priority: RequestPriority = RequestPriority.NORMAL,
+    ) -> AsyncIterator[RateLimiter]:
+        """
+        Wait for the rate limits to allow the request and hold a slot while it runs.
+
+        :param config: LLM configuration.
+        :param tokens: Estimated number of prompt tokens.
+        :param priority: Request priority.
+        """
+        limiter = self.get_limiter(config)
+        await limiter.acquire(tokens, priority)
+        token = _current_limiter.set(limiter)
+        try:
+            yield limiter
+        finally:
+            _current_limiter.reset(token)
+            limiter.release()
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Update the rate limits of the request currently being made in this task.
+
+        Called for each response received by the shared HTTP clients. Responses
+        received outside of a scheduler slot are ignored.
+
+        :param headers: Response headers.
+        """
+        limiter = _current_limiter.get()
+        if limiter is not None:
+            limiter.update_from_headers(headers)
+
+    def stats(self) -> list[dict]:
+        """
+        Return the current state of the rate limiters.
+
+        :return: List of dicts, one for each provider/model.
+        """
+        now = monotonic()
+        return [
+            {
+                "name": limiter.name,
+                "in_flight": limiter.in_flight,
+                "queued": len(limiter._waiters),
+                "waited": limiter.num_waited,
+                "requests_remaining": limiter.requests.available(now),
+                "tokens_remaining": limiter.tokens.available(now),
+            }
+            for limiter in self.limiters.values()
+        ]
+
+
+llm_scheduler = LLMScheduler()
+
+
+__all__ = ["RequestPriority", "RateLimiter", "LLMScheduler", "llm_scheduler", "parse_reset"]
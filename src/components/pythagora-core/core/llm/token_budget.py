@@ -0,0 +1,210 @@
+import re
+from enum import Enum
+from typing import TYPE_CHECKING
+
+from core.log import get_logger
+
+if TYPE_CHECKING:
+    from core.db.models import File
+
+log = get_logger(__name__)
+
+# Rough number of characters per token, used if the tokenizer is not available
+CHARS_PER_TOKEN = 4
+
+# Lines kept in the file outline: imports/exports, class and function
+# declarations (JS/TS and Python), and route/middleware definitions.
+OUTLINE_PATTERN = re.compile(
+    r"^\s*("
+    r"import\s|from\s+\S+\s+import\s|export\s|module\.exports|"
+    r"(async\s+)?function[\s*]|(abstract\s+)?class\s|interface\s|type\s+\w+\s*=|"
+    r"(async\s+)?def\s|"
+    r"(const|let|var)\s+\w+\s*=\s*(async\s*)?(\([^)]*\)|\w+)\s*=>|"
+    r"(const|let|var)\s+\w+\s*=\s*require\(|"
+    r"(app|router)\.(get|post|put|patch|delete|use|listen)\("
+    r")"
+)
+
+_tokenizer = None
+_tokenizer_loaded = False
+_token_counts: dict[str, int] = {}
+_line_counts: dict[str, int] = {}
+
+
+class FileView(str, Enum):
+    """
+    How much of the file is included in the prompt.
+    """
+
+    FULL = "full"
+    OUTLINE = "outline"
+    DESCRIPTION = "description"
+
+
+def _get_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        try:
+            import tiktoken
+
+            _tokenizer = tiktoken.get_encoding("cl100k_base")
+        except Exception as err:  # noqa
+            log.warning(f"Tokenizer not available, estimating token counts from text length: {err}")
+            _tokenizer = None
+
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the number of tokens in the text.
+
+    Uses the `cl100k_base` tokenizer (which is a good enough approximation
+    for other providers as well), or a length-based estimate if the
+    tokenizer is not available.
+
+    :param text: Text to count tokens for.
+    :return: Number of tokens.
+    """
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def count_file_tokens(file: "File") -> int:
+    """
+    Count the number of tokens in the file content.
+
+    As file contents are content-addressed, the counts are cached
+    by content hash.
+
+    :param file: File to count tokens for.
+    :return: Number of tokens.
+    """
+    content_id = file.content.id
+    if content_id not in _token_counts:
+        _token_counts[content_id] = count_tokens(file.content.content)
+    return _token_counts[content_id]
+
+
+def count_file_lines(file: "File") -> int:
+    """
+    Count the number of lines in the file content.
+
+    Like token counts, the line counts are cached by content hash, so
+    templates can show them without decoding the content on every render.
+
+    :param file: File to count lines for.
+    :return: Number of lines.
+    """
+    content_id = file.content.id
+    if content_id not in _line_counts:
+        _line_counts[content_id] = len(file.content.content.splitlines())
+    return _line_counts[content_id]
+
+
+def outline(content: str) -> str:
+    """
+    Extract an outline (imports, exports, class and function signatures) from source code.
+
+    :param content: Source code.
+    :return: The outline, one signature per line.
+    """
+    return "\n".join(line.rstrip() for line in content.splitlines() if OUTLINE_PATTERN.match(line))
+
+
+def describe(file: "File") -> str:
+    """
+    Short placeholder for a file whose content is omitted from the prompt.
+
+    :param file: File to describe.
+    :return: The placeholder text.
+    """
+    description = file.meta.get("description") if file.meta else None
+    return f"[Content omitted to fit the prompt size limit. File description: {description or 'not available'}]"
+
+
+class FileTokenBudget:
+    """
+    Fit the file contents included in a prompt into a token budget.
+
+    Files are given in priority order (most important first). If the
+    full contents of all files don't fit, the lowest-priority files are
+    first reduced to their outline (signatures), and if that's still
+    not enough, to just the file description.
+
+    Example usage:
+
+    >>> budget = FileTokenBudget(files, 50000)
+    >>> budget.content(files[0])
+    """
+
+    def __init__(self, files: list["File"], max_tokens: int):
+        self.files = files
+        self.max_tokens = max_tokens
+        self.views: dict[str, FileView] = {}
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._outlines: dict[str, str] = {}
+        self._allocate()
+
+    def _outline(self, file: "File") -> str:
+        content_id = file.content.id
+        if content_id not in self._outlines:
+            self._outlines[content_id] = (
+                "[Outline only, full content omitted to fit the prompt size limit]\n" + outline(file.content.content)
+            )
+        return self._outlines[content_id]
+
+    def _cost(self, file: "File", view: FileView) -> int:
+        if view == FileView.FULL:
+            return count_file_tokens(file)
+        elif view == FileView.OUTLINE:
+            return count_tokens(self._outline(file))
+        else:
+            return count_tokens(describe(file))
+
+    def _allocate(self):
+        costs = {file.path: self._cost(file, FileView.FULL) for file in self.files}
+        self.views = {file.path: FileView.FULL for file in self.files}
+        self.tokens_before = total = sum(costs.values())
+
+        for view in (FileView.OUTLINE, FileView.DESCRIPTION):
+            for file in reversed(self.files):
+                if total <= self.max_tokens:
+                    break
+                if view == FileView.OUTLINE and not outline(file.content.content):
+                    # Nothing to outline (eg. not source code), fall back to the description
+                    continue
+                cost = self._cost(file, view)
+                if cost < costs[file.path]:
+                    total -= costs[file.path] - cost
+                    costs[file.path] = cost
+                    self.views[file.path] = view
+
+        self.tokens_after = total
+
+    @property
+    def degraded(self) -> dict[str, FileView]:
+        """Files that don't have their full content included."""
+        return {path: view for path, view in self.views.items() if view != FileView.FULL}
+
+    def content(self, file: "File") -> str:
+        """
+        Get the file content to include in the prompt.
+
+        :param file: File to get the content for.
+        :return: Full content, outline or description, depending on the allocated budget.
+        """
+        view = self.views.get(file.path, FileView.FULL)
+        if view == FileView.OUTLINE:
+            return self._outline(file)
+        elif view == FileView.DESCRIPTION:
+            return describe(file)
+        return file.content.content
+
+
+__all__ = ["FileView", "FileTokenBudget", "count_tokens", "count_file_tokens", "count_file_lines", "outline"]
@@ -9,8 +9,11 @@ from sqlalchemy import inspect, select
 from tenacity import retry, stop_after_attempt, wait_fixed
 
 from core.config import FileSystemType, get_config
-from core.db.models import Branch, ExecLog, File, FileContent, LLMRequest, Project, ProjectState, UserInput
+from core.db.models import Branch, ExecLog, File, FileContent, LLMMessage, Project, ProjectState, UserInput
+from core.db.models.file_content import file_content_cache
+from core.db.models.project import ProjectSummary
 from core.db.models.specification import Complexity, Specification
+from core.db.request_writer import LLMRequestWriter
 from core.db.session import SessionManager
 from core.disk.ignore import IgnoreMatcher
 from core.disk.vfs import LocalDiskVFS, MemoryVFS, VirtualFileSystem
@@ -42,6 +45,7 @@ class StateManager:
 
     def __init__(self, session_manager: SessionManager, ui: Optional[UIBase] = None):
         self.session_manager = session_manager
+        self.request_writer = LLMRequestWriter(session_manager)
         self.ui = ui
         self.file_system = None
         self.project = None
@@ -65,14 +69,22 @@ class StateManager:
         finally:
             self.blockDb = False  # Unset the block
 
-    async def list_projects(self) -> list[Project]:
+    async def list_projects(
+        self,
+        include_steps: bool = True,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> list[ProjectSummary]:
         """
         List projects with branches
 
-        :return: List of projects with all their branches.
+        :param include_steps: Whether to include the steps in the branches.
+        :param limit: Maximum number of projects to return (default: all).
+        :param offset: Number of projects to skip.
+        :return: List of summaries of the projects with all their branches.
         """
         async with self.session_manager as session:
-            return await Project.get_all_projects(session)
+            return await Project.get_summaries(session, include_steps=include_steps, limit=limit, offset=offset)
 
     async def create_project(self, name: str, folder_name: Optional[str] = None) -> Project:
         """
@@ -109,11 +121,13 @@ class StateManager:
         return project
 
     async def delete_project(self, project_id: UUID) -> bool:
+        await self.request_writer.flush()
         session = await self.session_manager.start()
         rows = await Project.delete_by_id(session, project_id)
         if rows > 0:
             await Specification.delete_orphans(session)
             await FileContent.delete_orphans(session)
+            await LLMMessage.delete_orphans(session)
 
         await session.commit()
 
@@ -148,6 +162,7 @@ class StateManager:
         :param step_index: Step index within the branch (keyword-only, optional).
         :return: The ProjectState object if found, None otherwise.
         """
+        await self.request_writer.flush()
 
         if self.current_session:
             log.info("Current session exists, rolling back changes.")
@@ -257,25 +272,32 @@ class StateManager:
 
             # Having a shorter-lived sessions is considered a good practice in SQLAlchemy,
             # so we close and recreate the session for each state. This uses db
-            # connection from a connection pool, so it is fast. Note that SQLite uses
-            # no connection pool by default because it's all in-process so it's fast anyway.
+            # connection from a connection pool, so it is fast (for SQLite, this
+            # depends on `DBConfig.sqlite_profile`).
             self.current_session.expunge_all()
             await self.session_manager.close()
+            await self.request_writer.schedule()
             self.current_session = await self.session_manager.start()
 
             self.current_state = self.next_state
             self.current_session.add(self.next_state)
+            self.current_session.add_all(await self.next_state.awaitable_attrs.files)
             self.next_state = await self.current_state.create_next_state()
 
-            # After the next_state becomes the current_state, we need to load
-            # the FileContent model, which was previously loaded by the load_project(),
-            # but is not populated by the `create_next_state()`
-            for f in self.current_state.files:
-                await f.awaitable_attrs.content
+            # The files (and their contents) are shared with the previous state, so
+            # there's nothing to load here. Only the current state is needed to compute
+            # the delta of the new state (and the current state may still be updated
+            # along with it), so drop the references to the older states to keep the
+            # memory use flat.
+            prev_state = self.current_state.__dict__.get("prev_state")
+            if prev_state is not None:
+                prev_state.__dict__.pop("prev_state", None)
+            self.current_session.expire(self.next_state.branch, ["states"])
+            self.current_session.expire(self.next_state.specification, ["project_states"])
 
             telemetry.inc("num_steps")
+            log.debug(f"File content cache: {file_content_cache.stats()}")
 
-            # FIXME: write a test to verify files (and file content) are preloaded
             return self.current_state
 
         except Exception as e:
@@ -292,6 +314,7 @@ class StateManager:
         await self.current_session.rollback()
         await self.session_manager.close()
         self.current_session = None
+        await self.request_writer.flush()
         return
 
     async def log_llm_request(self, request_log: LLMRequestLog, agent: Optional["BaseAgent"] = None):
@@ -303,20 +326,34 @@ class StateManager:
         depend on the current state, it makes it easier to analyze the
         database by just looking at a single project state later.
 
+        The request is written to the database in the background after
+        the next commit (see `LLMRequestWriter`), or on `flush_llm_requests()`.
+
         :param request_log: The request log to log.
+        :param agent: Agent that made the request (if the caller was an agent).
         """
-        async with self.db_blocker():
-            try:
-                telemetry.record_llm_request(
-                    request_log.prompt_tokens + request_log.completion_tokens,
-                    request_log.duration,
-                    request_log.status != LLMRequestStatus.SUCCESS,
-                )
-                LLMRequest.from_request_log(self.current_state, agent, request_log)
+        try:
+            telemetry.record_llm_request(
+                request_log.prompt_tokens + request_log.completion_tokens,
+                request_log.duration,
+                request_log.status != LLMRequestStatus.SUCCESS,
+            )
+            self.request_writer.add(
+                request_log,
+                branch_id=self.current_state.branch_id,
+                project_state_id=self.current_state.id,
+                agent=agent.agent_type if agent else None,
+            )
 
-            except Exception as e:
-                if self.ui:
-                    await self.ui.send_message(f"An error occurred: {e}")
+        except Exception as e:
+            if self.ui:
+                await self.ui.send_message(f"An error occurred: {e}")
+
+    async def flush_llm_requests(self):
+        """
+        Write all the logged LLM requests to the database.
+        """
+        await self.request_writer.flush()
 
     async def log_user_input(self, question: str, response: UserInputData):
         """
@@ -401,26 +438,48 @@ class StateManager:
         :param metadata: Optional metadata (eg. description) to save with the file.
         :param from_template: Whether the file is part of a template.
         """
-        try:
-            original_content = self.file_system.read(path)
-        except ValueError:
-            original_content = ""
+        await self.save_files({path: content}, {path: metadata} if metadata else None, from_template)
+
+    async def save_files(
+        self,
+        files: dict[str, str],
+        metadata: Optional[dict[str, dict]] = None,
+        from_template: bool = False,
+    ):
+        """
+        Save multiple files to the project.
 
-        # FIXME: VFS methods should probably be async
-        self.file_system.save(path, content)
+        This works the same as calling `save_file()` for each file, but
+        the file contents are stored to the database in bulk.
+
+        :param files: Dictionary mapping file paths to the file contents.
+        :param metadata: Optional dictionary mapping file paths to the metadata to save with the file.
+        :param from_template: Whether the files are part of a template.
+        """
+        metadata = metadata or {}
+        hashes = {}
+        delta_lines = 0
+        original_files = await self.file_system.read_many(files)
+        await self.file_system.save_many(files)
+        for path, content in files.items():
+            hashes[path] = self.file_system.hash_string(content)
+            original_content = original_files.get(path, "")
+            delta_lines += len(content.splitlines()) - len(original_content.splitlines())
 
-        hash = self.file_system.hash_string(content)
         async with self.db_blocker():
-            file_content = await FileContent.store(self.current_session, hash, content)
+            file_contents = await FileContent.store_many(
+                self.current_session,
+                {hashes[path]: content for path, content in files.items()},
+            )
 
-        file = self.next_state.save_file(path, file_content)
-        # if self.ui and not from_template:
-        #     await self.ui.open_editor(self.file_system.get_full_path(path))
-        if metadata:
-            file.meta = metadata
+        for path, hash in hashes.items():
+            self.next_state.save_file(path, file_contents[hash])
+            # if self.ui and not from_template:
+            #     await self.ui.open_editor(self.file_system.get_full_path(path))
+            if metadata.get(path):
+                self.next_state.update_file_meta(path, metadata[path])
 
         if not from_template:
-            delta_lines = len(content.splitlines()) - len(original_content.splitlines())
             telemetry.inc("created_lines", delta_lines)
 
     async def init_file_system(self, load_existing: bool) -> VirtualFileSystem:
@@ -440,6 +499,9 @@ class StateManager:
         """
         config = get_config()
 
+        if self.file_system is not None:
+            self.file_system.close()
+
         if config.fs.type == FileSystemType.MEMORY:
             return MemoryVFS()
 
@@ -452,10 +514,16 @@ class StateManager:
                 root,
                 config.fs.ignore_paths,
                 ignore_size_threshold=config.fs.ignore_size_threshold,
+                use_gitignore=config.fs.use_gitignore,
             )
 
             try:
-                return LocalDiskVFS(root, allow_existing=load_existing, ignore_matcher=ignore_matcher)
+                return LocalDiskVFS(
+                    root,
+                    allow_existing=load_existing,
+                    ignore_matcher=ignore_matcher,
+                    watch=config.fs.watch,
+                )
             except FileExistsError:
                 self.project.folder_name = self.project.folder_name + "-" + uuid4().hex[:7]
                 log.warning(f"Directory {root} already exists, changing project folder to {self.project.folder_name}")
@@ -473,40 +541,45 @@ class StateManager:
             raise ValueError("No project loaded")
         return os.path.join(config.fs.workspace_root, self.project.folder_name)
 
-    async def import_files(self) -> tuple[list[File], list[File]]:
+    async def import_files(self, rescan: bool = False) -> tuple[list[File], list[File]]:
         """
         Scan the file system, import new/modified files, delete removed files.
 
         The files are saved to / removed from `next_state`, but not committed
         to database until the new state is committed.
 
+        :param rescan: Whether to re-read all the files (by default, files that
+            haven't changed since the last scan are not read).
         :return: Tuple with the list of imported files and the list of removed files.
         """
         known_files = {file.path: file for file in self.current_state.files}
-        files_in_workspace = set()
+        files_in_workspace = await self.file_system.scan(rescan=rescan)
         imported_files = []
         removed_files = []
 
-        for path in self.file_system.list():
-            files_in_workspace.add(path)
-            content = self.file_system.read(path)
-            saved_file = known_files.get(path)
-
-            if saved_file and saved_file.content.content == content:
-                continue
+        changed_files = await self.file_system.read_many(
+            [
+                path
+                for path, hash in files_in_workspace.items()
+                if path not in known_files or known_files[path].content_id != hash
+            ]
+        )
 
-            # TODO: unify this with self.save_file() / refactor that whole bit
-            hash = self.file_system.hash_string(content)
-            log.debug(f"Importing file {path} (hash={hash}, size={len(content)} bytes)")
-            file_content = await FileContent.store(self.current_session, hash, content)
-            file = self.next_state.save_file(path, file_content, external=True)
+        # TODO: unify this with self.save_file() / refactor that whole bit
+        hashes = {path: self.file_system.hash_string(content) for path, content in changed_files.items()}
+        file_contents = await FileContent.store_many(
+            self.current_session,
+            {hashes[path]: content for path, content in changed_files.items()},
+        )
+        for path, content in changed_files.items():
+            log.debug(f"Importing file {path} (hash={hashes[path]}, size={len(content)} bytes)")
+            file = self.next_state.save_file(path, file_contents[hashes[path]], external=True)
             imported_files.append(file)
 
         for path, file in known_files.items():
             if path not in files_in_workspace:
                 log.debug(f"File {path} was removed from workspace, deleting from project")
-                next_state_file = self.next_state.get_file_by_path(path)
-                self.next_state.files.remove(next_state_file)
+                self.next_state.delete_file(path)
                 removed_files.append(file.path)
 
         return imported_files, removed_files
@@ -520,32 +593,28 @@ class StateManager:
         :return: List of restored files.
         """
         known_files = {file.path: file for file in self.current_state.files}
-        files_in_workspace = self.file_system.list()
+        files_in_workspace = await self.file_system.alist()
 
         for disk_f in files_in_workspace:
             if disk_f not in known_files:
-                self.file_system.remove(disk_f)
-
-        restored_files = []
-        for path, file in known_files.items():
-            restored_files.append(file)
-            self.file_system.save(path, file.content.content)
+                await self.file_system.aremove(disk_f)
 
-        return restored_files
+        await self.file_system.save_many({path: file.content.content for path, file in known_files.items()})
+        return list(known_files.values())
 
-    async def get_modified_files(self) -> list[str]:
+    async def get_modified_files(self, rescan: bool = False) -> list[str]:
         """
         Return a list of new or modified files from the file system.
 
+        :param rescan: Whether to re-read all the files (see `import_files()`).
         :return: List of paths for new or modified files.
         """
 
         modified_files = []
-        files_in_workspace = self.file_system.list()
-        for path in files_in_workspace:
-            content = self.file_system.read(path)
+        files_in_workspace = await self.file_system.scan(rescan=rescan)
+        for path in sorted(files_in_workspace):
             saved_file = self.current_state.get_file_by_path(path)
-            if saved_file and saved_file.content.content == content:
+            if saved_file and saved_file.content_id == files_in_workspace[path]:
                 continue
             modified_files.append(path)
 
@@ -557,32 +626,33 @@ class StateManager:
 
         return modified_files
 
-    async def get_modified_files_with_content(self) -> list[dict]:
+    async def get_modified_files_with_content(self, rescan: bool = False) -> list[dict]:
         """
         Return a list of new or modified files from the file system,
         including their paths, old content, and new content.
 
+        :param rescan: Whether to re-read all the files (see `import_files()`).
         :return: List of dictionaries containing paths, old content,
                 and new content for new or modified files.
         """
 
         modified_files = []
-        files_in_workspace = self.file_system.list()
+        files_in_workspace = await self.file_system.scan(rescan=rescan)
 
-        for path in files_in_workspace:
-            content = self.file_system.read(path)
+        changed_paths = []
+        for path in sorted(files_in_workspace):
             saved_file = self.current_state.get_file_by_path(path)
-
-            # If there's a saved file, serialize its content; otherwise, set it to None
-            saved_file_content = saved_file.content.content if saved_file else None
-
-            if saved_file_content == content:
+            if saved_file and saved_file.content_id == files_in_workspace[path]:
                 continue
+            changed_paths.append(path)
 
+        for path, content in (await self.file_system.read_many(changed_paths)).items():
+            saved_file = self.current_state.get_file_by_path(path)
             modified_files.append(
                 {
                     "path": path,
-                    "file_old": saved_file_content,  # Serialized content
+                    # If there's a saved file, serialize its content; otherwise, set it to None
+                    "file_old": saved_file.content.content if saved_file else None,  # Serialized content
                     "file_new": content,
                 }
             )
@@ -601,11 +671,11 @@ class StateManager:
 
         return modified_files
 
-    def workspace_is_empty(self) -> bool:
+    async def workspace_is_empty(self) -> bool:
         """
         Returns whether the workspace has any files in them or is empty.
         """
-        return not bool(self.file_system.list())
+        return not bool(await self.file_system.alist())
 
     def get_implemented_pages(self) -> list[str]:
         """
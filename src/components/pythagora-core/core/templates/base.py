@@ -1,3 +1,4 @@
+import asyncio
 from json import loads
 from os.path import dirname, join
 from typing import TYPE_CHECKING, Any, Optional, Type
@@ -93,7 +94,10 @@ class BaseProjectTemplate:
 
         log.info(f"Applying project template {self.name} with options: {self.options_dict}")
 
-        files = self.file_renderer.render_tree(
+        # Rendering reads the template tree (and copies binary assets) from disk,
+        # so it's done in a thread to keep the event loop responsive
+        files = await asyncio.to_thread(
+            self.file_renderer.render_tree,
             self.path,
             {
                 "project_name": project_name,
@@ -106,15 +110,12 @@ class BaseProjectTemplate:
             self.filter,
         )
 
-        for file_name, file_content in files.items():
-            desc = self.file_descriptions.get(file_name)
-            metadata = {"description": desc} if desc else None
-            await self.state_manager.save_file(
-                file_name,
-                file_content,
-                metadata=metadata,
-                from_template=True,
-            )
+        metadata = {
+            file_name: {"description": self.file_descriptions[file_name]}
+            for file_name in files
+            if self.file_descriptions.get(file_name)
+        }
+        await self.state_manager.save_files(files, metadata=metadata, from_template=True)
 
         try:
             await self.install_hook()
@@ -1,8 +1,8 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from pydantic import BaseModel, Field
 
-from core.agents.convo import AgentConvo
+from core.agents.convo import AgentConvo, _schema_text
 
 
 def test_init():
@@ -27,6 +27,19 @@ def test_fork():
 
     assert len(convo.messages) == 1
     assert len(child.messages) == 2
+    assert convo.prompt_log == []
+    assert len(child.prompt_log) == 1
+
+
+def test_fork_does_not_render_system_prompt():
+    agent = MagicMock(agent_type="spec-writer", current_state=None)
+    convo = AgentConvo(agent)
+
+    with patch.object(AgentConvo, "render") as mock_render:
+        child = convo.fork()
+
+    mock_render.assert_not_called()
+    assert child.messages == convo.messages
 
 
 def test_require_schema():
@@ -41,3 +54,41 @@ def test_require_schema():
 
     assert len(convo.messages) == 2
     assert '"description": "User name"' in convo.messages[1]["content"]
+
+
+def test_schema_text_is_cached_and_inlined():
+    """Test that _schema_text() inlines the nested models and caches the result."""
+
+    class Child(BaseModel):
+        name: str
+
+    class Parent(BaseModel):
+        children: list[Child]
+
+    schema_txt = _schema_text(Parent)
+    assert "$ref" not in schema_txt
+    assert '"name"' in schema_txt
+    assert _schema_text(Parent) is schema_txt
+
+
+def test_render_fits_files_into_token_budget():
+    """Test that render() reduces lower-priority files to fit the agent's token budget."""
+    big = MagicMock(path="server/big.js", content=MagicMock(id="big", content="x = 1;\n" * 100), meta={})
+    small = MagicMock(path="server/small.js", content=MagicMock(id="small", content="y = 2;\n"), meta={})
+    state = MagicMock(relevant_files=["server/small.js", "server/big.js"], modified_files={})
+    state.relevant_file_objects = [big, small]
+    agent = MagicMock(agent_type="spec-writer", current_state=state)
+    convo = AgentConvo(agent)
+
+    with patch.object(AgentConvo, "_files_token_budget", return_value=50):
+        convo.prompt_loader = MagicMock(
+            side_effect=lambda name, file_content, file_lines, **kwargs: [
+                (file_content(f), file_lines(f)) for f in state.relevant_file_objects
+            ]
+        )
+        (big_content, big_lines), (small_content, small_lines) = convo.render("test")
+
+    assert small_content == "y = 2;\n"
+    assert "File description" in big_content
+    # The line count is for the full content, even if it's not included
+    assert (big_lines, small_lines) == (100, 1)
@@ -1,4 +1,4 @@
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock
 
 import pytest
 
@@ -8,7 +8,7 @@ from core.agents.orchestrator import Orchestrator
 @pytest.mark.asyncio
 async def test_offline_changes_check_restores_if_workspace_empty():
     sm = AsyncMock()
-    sm.workspace_is_empty = Mock(return_value=False)
+    sm.workspace_is_empty = AsyncMock(return_value=False)
     ui = AsyncMock()
     orca = Orchestrator(state_manager=sm, ui=ui)
     await orca.offline_changes_check()
@@ -18,7 +18,7 @@ async def test_offline_changes_check_restores_if_workspace_empty():
 @pytest.mark.asyncio
 async def test_offline_changes_check_imports_changes_from_disk():
     sm = AsyncMock()
-    sm.workspace_is_empty = Mock(return_value=False)
+    sm.workspace_is_empty = AsyncMock(return_value=False)
     sm.import_files = AsyncMock(return_value=([], []))
     ui = AsyncMock()
     ui.ask_question.return_value.button = "yes"
@@ -31,7 +31,7 @@ async def test_offline_changes_check_imports_changes_from_disk():
 @pytest.mark.asyncio
 async def test_offline_changes_check_restores_changes_from_db():
     sm = AsyncMock()
-    sm.workspace_is_empty = Mock(return_value=False)
+    sm.workspace_is_empty = AsyncMock(return_value=False)
     ui = AsyncMock()
     ui.ask_question.return_value.button = "no"
     orca = Orchestrator(state_manager=sm, ui=ui)
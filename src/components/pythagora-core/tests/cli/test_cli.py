@@ -47,6 +47,7 @@ def test_parse_arguments(mock_ArgumentParser):
         "--version",
         "--list",
         "--list-json",
+        "--audit-indexes",
         "--project",
         "--delete",
         "--branch",
@@ -169,7 +170,7 @@ async def test_list_projects_json(mock_StateManager, capsys):
 
     branch = MagicMock(
         id=MagicMock(hex="1234"),
-        states=[
+        steps=[
             MagicMock(step_index=1, action="foo", created_at=datetime(2021, 1, 1)),
             MagicMock(step_index=2, action=None, created_at=datetime(2021, 1, 2)),
             MagicMock(step_index=3, action="baz", created_at=datetime(2021, 1, 3)),
@@ -180,6 +181,7 @@ async def test_list_projects_json(mock_StateManager, capsys):
     project = MagicMock(
         id=MagicMock(hex="abcd"),
         branches=[branch],
+        updated_at=datetime(2021, 1, 3),
     )
     project.name = "project1"
     sm.list_projects = AsyncMock(return_value=[project])
@@ -215,13 +217,7 @@ async def test_list_projects_json(mock_StateManager, capsys):
 async def test_list_projects(mock_StateManager, capsys):
     sm = mock_StateManager.return_value
 
-    branch = MagicMock(
-        id="1234",
-        states=[
-            MagicMock(step_index=1),
-            MagicMock(step_index=2),
-        ],
-    )
+    branch = MagicMock(id="1234", latest_step_index=2)
     branch.name = "branch1"
 
     project = MagicMock(
@@ -233,12 +229,12 @@ async def test_list_projects(mock_StateManager, capsys):
     await list_projects(None)
 
     mock_StateManager.assert_called_once_with(None)
-    sm.list_projects.assert_awaited_once_with()
+    sm.list_projects.assert_awaited_once_with(include_steps=False)
 
     data = capsys.readouterr().out
 
     assert "* project1 (abcd)" in data
-    assert "- branch1 (1234)" in data
+    assert "- branch1 (1234) - last step: 2" in data
 
 
 @pytest.mark.asyncio
@@ -286,6 +282,7 @@ def test_init(tmp_path):
     [
         (["--list"], False, True),
         (["--list-json"], False, True),
+        (["--audit-indexes"], False, True),
         (["--show-config"], False, True),
         (["--project", "ca7a0cc9-767f-472a-aefb-0c8d3377c9bc"], False, False),
         (["--branch", "ca7a0cc9-767f-472a-aefb-0c8d3377c9bc"], False, False),
@@ -7,6 +7,7 @@ import pytest_asyncio
 
 from core.config import DBConfig
 from core.db.models import Base
+from core.db.models.file_content import file_content_cache
 from core.db.session import SessionManager
 from core.state.state_manager import StateManager
 
@@ -16,6 +17,12 @@ def disable_test_telemetry(monkeypatch):
     os.environ["DISABLE_TELEMETRY"] = "1"
 
 
+@pytest.fixture(autouse=True)
+def clear_file_content_cache():
+    # Tests reuse the content IDs (hashes) for different contents
+    file_content_cache.clear()
+
+
 @pytest_asyncio.fixture
 async def testmanager():
     """
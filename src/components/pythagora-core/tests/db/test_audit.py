@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import text
+
+from core.db.audit import audit_queries, get_hot_queries
+
+
+@pytest.mark.asyncio
+async def test_audit_queries(testdb):
+    plans = await audit_queries(testdb)
+
+    assert [plan.name for plan in plans] == [query.name for query in get_hot_queries()]
+    assert all(plan.plan for plan in plans)
+    assert [plan for plan in plans if plan.scans] == []
+
+
+@pytest.mark.asyncio
+async def test_audit_queries_flags_scans(testdb):
+    await testdb.execute(text("DROP INDEX ix_files_content_id"))
+
+    plans = {plan.name: plan for plan in await audit_queries(testdb)}
+
+    assert plans["Check file content references (foreign key)"].scans == ["files"]
+    assert plans["Delete orphaned file contents (FileContent.delete_orphans)"].scans == ["files"]
+    assert plans["Load project state files"].scans == []
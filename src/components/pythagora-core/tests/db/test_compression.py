@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+
+from core.config import DBConfig
+from core.db.compression import ZLIB_V1, compress, decompress, train_dictionary
+from core.db.models import Base, FileContent
+from core.db.session import SessionManager
+
+SOURCE = """import React from "react"
+import { Button } from "@/components/ui/button"
+
+export default function Home() {
+  return (
+    <div className="min-h-screen flex items-center justify-center">
+      <Button onClick={() => console.log("clicked")}>Click me ☺</Button>
+    </div>
+  )
+}
+"""
+
+
+def test_compress_roundtrip():
+    compressed = compress(SOURCE)
+    assert len(compressed) < len(SOURCE) / 2
+    assert decompress(compressed) == SOURCE
+
+
+def test_compress_zlib_fallback():
+    with patch("core.db.compression.zstandard", None):
+        compressed = compress(SOURCE)
+    assert compressed[0] == ZLIB_V1
+    assert decompress(compressed) == SOURCE
+
+
+def test_compress_skips_incompressible_text():
+    assert compress("") is None
+    assert compress("x") is None
+
+
+def test_decompress_unknown_format():
+    with pytest.raises(ValueError, match="Unknown file content compression format"):
+        decompress(b"\xff1234")
+
+
+def test_train_dictionary():
+    samples = ["import a from 'a'\nconst x = 1\n", "import a from 'a'\nconst y = 2\n", "unrelated line here\n"]
+    assert train_dictionary(samples) == b"import a from 'a'\n"
+    assert train_dictionary(samples, size=5) == b""
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("enabled", [True, False])
+async def test_file_content_storage(enabled):
+    manager = SessionManager(DBConfig(url="sqlite+aiosqlite:///:memory:", compress_file_contents=enabled))
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with manager as db:
+        db.add(FileContent(id="source", content=SOURCE))
+        db.add(FileContent(id="short", content="x"))
+        await db.commit()
+        db.expunge_all()
+
+        source = (await db.execute(select(FileContent).where(FileContent.id == "source"))).scalar_one()
+        assert source.content == SOURCE
+        assert (source.plain_content is None) == enabled
+        assert (source.compressed_content is not None) == enabled
+
+        # Content that doesn't compress is stored as is
+        short = (await db.execute(select(FileContent).where(FileContent.id == "short"))).scalar_one()
+        assert short.plain_content == "x"
+        assert short.compressed_content is None
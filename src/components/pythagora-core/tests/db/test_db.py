@@ -1,8 +1,10 @@
 import pytest
-from sqlalchemy import func, select
+from sqlalchemy import func, select, text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
 from core.config import DBConfig
 from core.db.models import Project, ProjectState
+from core.db.session import SessionManager
 from core.db.setup import run_migrations
 
 from .factories import create_project_state
@@ -13,6 +15,28 @@ def test_migrations(tmp_path):
     run_migrations(db_cfg)
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("profile", "pool_class", "journal_mode", "synchronous"),
+    [
+        ("default", NullPool, "delete", 2),
+        ("performance", AsyncAdaptedQueuePool, "wal", 1),
+    ],
+)
+async def test_sqlite_profile(profile, pool_class, journal_mode, synchronous, tmp_path):
+    manager = SessionManager(DBConfig(url=f"sqlite+aiosqlite:///{tmp_path}/test.db", sqlite_profile=profile))
+    assert isinstance(manager.engine.pool, pool_class)
+
+    async with manager as session:
+        pragmas = {
+            name: (await session.execute(text(f"pragma {name}"))).scalar()
+            for name in ["foreign_keys", "journal_mode", "synchronous"]
+        }
+    await manager.engine.dispose()
+
+    assert pragmas == {"foreign_keys": 1, "journal_mode": journal_mode, "synchronous": synchronous}
+
+
 @pytest.mark.asyncio
 async def test_select_empty(testdb):
     q = await testdb.execute(select(func.count()).select_from(Project))
@@ -0,0 +1,95 @@
+import sys
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import func, select
+
+from core.config import DBConfig
+from core.db.models import Base, FileContent
+from core.db.models.file_content import FileContentCache, file_content_cache
+from core.db.session import SessionManager
+
+
+def test_cache_evicts_least_recently_used():
+    size = sys.getsizeof("a" * 100)
+    cache = FileContentCache(max_bytes=size * 2)
+
+    cache.put("a", "a" * 100)
+    cache.put("b", "b" * 100)
+    assert cache.get("a", lambda: "not cached") == "a" * 100
+    cache.put("c", "c" * 100)
+
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.resident_bytes == size * 2
+    assert cache.get("b", lambda: "B" * 100) == "B" * 100
+    assert list(cache.entries) == ["c", "b"]
+    assert cache.stats() == {
+        "entries": 2,
+        "resident_bytes": size * 2,
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
+
+
+def test_cache_skips_large_contents():
+    cache = FileContentCache(max_bytes=100)
+    assert cache.get("a", lambda: "a" * 1000) == "a" * 1000
+    assert cache.entries == {}
+    assert cache.resident_bytes == 0
+
+
+def test_cache_resize():
+    cache = FileContentCache()
+    cache.put("a", "a" * 100)
+    cache.put("b", "b" * 100)
+
+    cache.resize(sys.getsizeof("b" * 100))
+    assert list(cache.entries) == ["b"]
+
+    cache.resize(0)
+    assert cache.entries == {}
+    assert cache.resident_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_compressed_content_is_cached():
+    manager = SessionManager(DBConfig(url="sqlite+aiosqlite:///:memory:", compress_file_contents=True))
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    content = "export const x = 1;\n" * 100
+    async with manager as session:
+        fc = FileContent(id="x", content=content)
+        session.add(fc)
+        await session.commit()
+
+        # The text is only kept in the cache, which was populated on save
+        assert fc.plain_content is None
+        assert fc.content == content
+        assert file_content_cache.hits == 1
+
+        # When evicted, the text is decompressed (and cached) again
+        file_content_cache.clear()
+        assert fc.content == content
+        assert fc.content == content
+        assert file_content_cache.stats()["misses"] == 1
+        assert file_content_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_store_many(testdb):
+    existing = await FileContent.store(testdb, "a", "content a")
+    await testdb.commit()
+
+    with patch("core.db.models.file_content.STORE_CHUNK_SIZE", 2):
+        stored = await FileContent.store_many(testdb, {"a": "content a", "b": "content b", "c": "content c"})
+    assert stored["a"] is existing
+    assert {hash: fc.content for hash, fc in stored.items()} == {
+        "a": "content a",
+        "b": "content b",
+        "c": "content c",
+    }
+
+    await testdb.commit()
+    assert (await testdb.execute(select(func.count(FileContent.id)))).scalar_one() == 3
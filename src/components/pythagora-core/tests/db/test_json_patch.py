@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from core.db.json_patch import apply_patch, make_patch
+
+
+@pytest.mark.parametrize(
+    ("old", "new"),
+    [
+        ([], []),
+        (None, ["a"]),
+        (["a"], None),
+        ([], [{"a": 1}]),
+        ([{"a": 1}, {"b": 2}], [{"a": 1}]),
+        ([{"a": 1}], [{"a": 1}, {"b": 2}, {"c": 3}]),
+        ({"src/a.js": "x", "a~b": 1}, {"src/a.js": "y", "a~b/c": 2}),
+        ({"a": [1, 2, 3]}, {"a": [3, 2]}),
+        ({"a": {"b": {"c": 1}}}, {"a": {"b": {"c": "1"}}}),
+        ({"a": 1}, {}),
+        ({"a": True}, {"a": 1}),
+    ],
+)
+def test_patch_roundtrip(old, new):
+    patch = make_patch(old, new)
+    # The patch is applied to the value as loaded from the database
+    assert apply_patch(json.loads(json.dumps(old)), json.loads(json.dumps(patch))) == new
+
+
+def test_patch_is_minimal():
+    old = [{"description": "Task 1", "status": "todo"}, {"description": "Task 2", "status": "todo"}]
+    new = [{"description": "Task 1", "status": "done"}, {"description": "Task 2", "status": "todo"}]
+
+    assert make_patch(old, new) == [{"op": "replace", "path": "/0/status", "value": "done"}]
+    assert make_patch(new, new) == []
+
+
+def test_patch_values_are_copied():
+    new = [{"a": []}]
+    patch = make_patch([], new)
+    new[0]["a"].append(1)
+
+    assert patch == [{"op": "replace", "path": "", "value": [{"a": []}]}]
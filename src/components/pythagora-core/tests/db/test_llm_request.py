@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import delete, func, select
+
+from core.db.models import LLMMessage, LLMRequest, LLMRequestMessage
+from core.llm.request_log import LLMRequestLog, LLMRequestStatus
+
+from .factories import create_project_state
+
+
+def make_request_log(messages: list[dict], **kwargs) -> LLMRequestLog:
+    return LLMRequestLog(
+        provider="openai",
+        model="gpt-4o",
+        temperature=0.5,
+        messages=messages,
+        response="response",
+        prompt_tokens=10,
+        completion_tokens=20,
+        duration=1.5,
+        **kwargs,
+    )
+
+
+async def count(session, model) -> int:
+    return (await session.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_from_request_log_deduplicates_messages(testdb):
+    state = create_project_state()
+    testdb.add(state)
+    await testdb.commit()
+
+    system = {"role": "system", "content": "You are a helpful assistant."}
+    user = {"role": "user", "content": "Hello"}
+    assistant = {"role": "assistant", "content": "Hi"}
+    logs = [
+        make_request_log([system, user]),
+        make_request_log([system, user, assistant, user]),
+        make_request_log([], status=LLMRequestStatus.ERROR, error="failed"),
+    ]
+    requests = [
+        await LLMRequest.from_request_log(
+            testdb, log, branch_id=state.branch_id, project_state_id=state.id, agent="test-agent"
+        )
+        for log in logs
+    ]
+    await testdb.commit()
+
+    assert await count(testdb, LLMMessage) == 3
+    assert await count(testdb, LLMRequestMessage) == 6
+
+    for request, log in zip(requests, logs):
+        assert request.messages is None
+        assert request.agent == "test-agent"
+        assert await request.to_request_log(testdb) == log
+
+
+@pytest.mark.asyncio
+async def test_get_messages_inline(testdb):
+    state = create_project_state()
+    testdb.add(state)
+    await testdb.commit()
+
+    # Requests logged before the messages were stored separately
+    messages = [{"role": "user", "content": "Hello"}]
+    request = await LLMRequest.from_request_log(
+        testdb, make_request_log([]), branch_id=state.branch_id, project_state_id=state.id
+    )
+    request.messages = messages
+    await testdb.commit()
+
+    assert await request.get_messages(testdb) == messages
+
+
+@pytest.mark.asyncio
+async def test_delete_orphans(testdb):
+    state = create_project_state()
+    testdb.add(state)
+    await testdb.commit()
+
+    shared = {"role": "system", "content": "shared"}
+    first = await LLMRequest.from_request_log(
+        testdb,
+        make_request_log([shared, {"role": "user", "content": "first"}]),
+        branch_id=state.branch_id,
+        project_state_id=state.id,
+    )
+    second = await LLMRequest.from_request_log(
+        testdb,
+        make_request_log([shared, {"role": "user", "content": "second"}]),
+        branch_id=state.branch_id,
+        project_state_id=state.id,
+    )
+    await testdb.commit()
+
+    await testdb.execute(delete(LLMRequest).where(LLMRequest.id == first.id))
+    await LLMMessage.delete_orphans(testdb)
+    await testdb.commit()
+
+    assert await count(testdb, LLMMessage) == 2
+    assert await second.get_messages(testdb) == [shared, {"role": "user", "content": "second"}]
@@ -84,6 +84,37 @@ async def test_get_all_projects(testdb):
     assert state2.branch.project in projects
 
 
+@pytest.mark.asyncio
+async def test_get_summaries(testdb):
+    state1 = create_project_state(project_name="B")
+    state2 = create_project_state(project_name="A")
+    empty = Project(name="C")
+    testdb.add_all([state1, state2, empty, Branch(project=empty)])
+    await testdb.commit()
+    next_state = await state1.create_next_state()
+    next_state.action = "Next"
+    await testdb.commit()
+
+    summaries = await Project.get_summaries(testdb)
+    assert [p.name for p in summaries] == ["A", "B"]
+    branch = summaries[1].branches[0]
+    assert branch.id == state1.branch_id
+    assert branch.latest_step_index == 2
+    assert [(s.step_index, s.action) for s in branch.steps] == [(1, None), (2, "Next")]
+    assert summaries[1].updated_at == branch.updated_at == branch.steps[-1].created_at
+
+    summaries = await Project.get_summaries(testdb, include_steps=False, limit=1, offset=1)
+    assert [p.name for p in summaries] == ["B"]
+    assert summaries[0].branches[0].steps == []
+
+    # Deleting the later steps updates the latest step
+    await state1.delete_after()
+    await testdb.commit()
+    summaries = await Project.get_summaries(testdb)
+    assert summaries[1].branches[0].latest_step_index == 1
+    assert [s.step_index for s in summaries[1].branches[0].steps] == [1]
+
+
 @pytest.mark.asyncio
 async def test_default_folder_name(testdb):
     project = Project(name="test project")
@@ -1,5 +1,5 @@
 import pytest
-from sqlalchemy import select
+from sqlalchemy import func, select
 
 from core.db.models import Branch, File, FileContent, Project, ProjectState
 from core.db.models.project_state import IterationStatus
@@ -48,7 +48,7 @@ async def test_get_by_id_preloads_branch_project_files(testdb):
 
 
 @pytest.mark.asyncio
-async def test_create_next_state_clones_files(testdb):
+async def test_create_next_state_shares_files(testdb):
     f = File(path="test.txt", content=FileContent(id="test", content="hello world"))
 
     state = create_project_state()
@@ -58,10 +58,85 @@ async def test_create_next_state_clones_files(testdb):
     await testdb.commit()
 
     next_state = await state.create_next_state()
+    await testdb.commit()
+
+    # The new state uses the same file row until the file is modified
+    assert next_state.files[0] is f
+    assert (await testdb.execute(select(func.count(File.id)))).scalar_one() == 1
 
-    # Check that the new state has a new file with the same content
-    assert next_state.files[0].id != state.files[0].id
-    assert next_state.files[0].content_id == f.content_id
+
+async def _load_files(testdb, state_id) -> dict[str, str]:
+    testdb.expunge_all()
+    s = (await testdb.execute(select(ProjectState).where(ProjectState.id == state_id))).scalar_one()
+    return {file.path: file.content.content for file in s.files}
+
+
+@pytest.mark.asyncio
+async def test_file_changes_create_new_rows(testdb):
+    state = create_project_state()
+    for name in ["a.txt", "b.txt", "c.txt"]:
+        state.files.append(File(path=name, content=FileContent(id=name, content=name)))
+    testdb.add(state)
+    await testdb.commit()
+
+    next_state = await state.create_next_state()
+    next_state.save_file("a.txt", FileContent(id="a2", content="changed"))
+    next_state.update_file_meta("b.txt", {"description": "B"})
+    next_state.files.remove(next_state.get_file_by_path("c.txt"))
+    next_state.save_file("d.txt", FileContent(id="d", content="new"))
+    await testdb.commit()
+
+    # Only the changed files were written, the original rows are kept for the previous state
+    assert (await testdb.execute(select(func.count(File.id)))).scalar_one() == 6
+    assert state.get_file_content_by_path("a.txt") == "a.txt"
+    assert state.get_file_by_path("b.txt").meta == {}
+
+    state_id, next_state_id = state.id, next_state.id
+    assert await _load_files(testdb, state_id) == {"a.txt": "a.txt", "b.txt": "b.txt", "c.txt": "c.txt"}
+    assert await _load_files(testdb, next_state_id) == {"a.txt": "changed", "b.txt": "b.txt", "d.txt": "new"}
+
+
+@pytest.mark.asyncio
+async def test_delete_after_restores_files(testdb):
+    state = create_project_state()
+    state.files.append(File(path="a.txt", content=FileContent(id="a", content="a")))
+    testdb.add(state)
+    await testdb.commit()
+
+    next_state = await state.create_next_state()
+    next_state.save_file("a.txt", FileContent(id="a2", content="changed"))
+    await testdb.commit()
+
+    await state.delete_after()
+    await testdb.commit()
+
+    state_id = state.id
+    assert (await testdb.execute(select(func.count(File.id)))).scalar_one() == 1
+    assert await _load_files(testdb, state_id) == {"a.txt": "a"}
+
+    # The restored file is shared with the new next state
+    s = (await testdb.execute(select(ProjectState).where(ProjectState.id == state_id))).scalar_one()
+    next_state = await s.create_next_state()
+    await testdb.commit()
+    assert await _load_files(testdb, next_state.id) == {"a.txt": "a"}
+
+
+@pytest.mark.asyncio
+async def test_delete_file(testdb):
+    state = create_project_state()
+    state.files.append(File(path="a.txt", content=FileContent(id="a", content="a")))
+    state.files.append(File(path="b.txt", content=FileContent(id="b", content="b")))
+    testdb.add(state)
+    await testdb.commit()
+
+    next_state = await state.create_next_state()
+    next_state.delete_file("a.txt")
+    with pytest.raises(ValueError):
+        next_state.delete_file("a.txt")
+    await testdb.commit()
+
+    assert await _load_files(testdb, state.id) == {"a.txt": "a", "b.txt": "b"}
+    assert await _load_files(testdb, next_state.id) == {"b.txt": "b"}
 
 
 @pytest.mark.asyncio
@@ -219,3 +294,54 @@ async def test_completing_unfinished_epics(testdb):
     await testdb.refresh(state)
 
     assert state.current_epic is None
+
+
+@pytest.mark.asyncio
+async def test_current_task_cursor(testdb):
+    state = create_project_state()
+    state.tasks = [{"description": f"task {i}", "status": "todo"} for i in range(3)]
+    testdb.add(state)
+    await testdb.commit()
+
+    assert state.current_task["description"] == "task 0"
+    state.complete_task()
+    assert state.current_task["description"] == "task 1"
+
+    # Changes to the earlier tasks are picked up once flagged as modified
+    state.tasks[0]["status"] = "todo"
+    state.flag_tasks_as_modified()
+    assert state.current_task["description"] == "task 0"
+
+    # Tasks appended after all were done
+    state.tasks = [{"description": "done", "status": "done"}]
+    assert state.current_task is None
+    state.tasks.append({"description": "new", "status": "todo"})
+    assert state.current_task["description"] == "new"
+
+
+@pytest.mark.asyncio
+async def test_get_file_by_path_index(testdb):
+    state = create_project_state()
+    state.files.append(File(path="a.txt", content=FileContent(id="a", content="a")))
+    testdb.add(state)
+    await testdb.commit()
+
+    assert state.get_file_by_path("a.txt").content.content == "a"
+    next_state = await state.create_next_state()
+
+    new_file = next_state.save_file("b.txt", FileContent(id="b", content="b"))
+    assert next_state.get_file_by_path("b.txt") is new_file
+    assert state.get_file_by_path("b.txt") is None
+
+    changed_file = next_state.save_file("a.txt", FileContent(id="a2", content="changed"))
+    assert next_state.get_file_by_path("a.txt") is changed_file
+    assert state.get_file_by_path("a.txt").content.content == "a"
+
+    next_state.delete_file("b.txt")
+    assert next_state.get_file_by_path("b.txt") is None
+    await testdb.commit()
+
+    # Reloaded files are indexed again
+    await testdb.refresh(next_state, ["files"])
+    assert next_state.get_file_by_path("a.txt").content.content == "changed"
+    assert next_state.get_file_by_path("b.txt") is None
@@ -1,12 +1,20 @@
-from io import StringIO
+import os
 from os.path import join
-from unittest.mock import MagicMock, patch
+from typing import Union
+from unittest.mock import patch
 
 import pytest
 
 from core.disk.ignore import IgnoreMatcher
 
 
+def create_file(root, path: str, content: Union[str, bytes] = ""):
+    full_path = join(root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb" if isinstance(content, bytes) else "w") as f:
+        f.write(content)
+
+
 @pytest.mark.parametrize(
     ("path", "expected"),
     [
@@ -23,11 +31,10 @@ from core.disk.ignore import IgnoreMatcher
         (join("module", "migrations", "0001_initial.json"), False),
     ],
 )
-@patch("os.path.isfile", return_value=True)
-@patch("builtins.open", return_value=MagicMock(read=StringIO("")))
-def test_ignore_paths(_mock_open, _mock_isfile, path, expected):
+def test_ignore_paths(tmp_path, path, expected):
+    create_file(tmp_path, path)
     matcher = IgnoreMatcher(
-        "/tmp",
+        tmp_path,
         [
             "*.pyc",
             "node_modules",
@@ -46,27 +53,72 @@ def test_ignore_paths(_mock_open, _mock_isfile, path, expected):
         ("test.py", 101, True),
     ],
 )
-@patch("os.path.isfile", return_value=True)
-@patch("builtins.open", return_value=MagicMock(read=StringIO("")))
-@patch("os.path.getsize")
-def test_ignore_large_files(
-    _mock_getsize,
-    _mock_open,
-    _mock_isfile,
-    path,
-    size,
-    expected,
-):
-    _mock_getsize.return_value = size
-    matcher = IgnoreMatcher("/tmp", [], ignore_size_threshold=100)
+def test_ignore_large_files(tmp_path, path, size, expected):
+    create_file(tmp_path, path, "x" * size)
+    matcher = IgnoreMatcher(tmp_path, [], ignore_size_threshold=100)
     assert matcher.ignore(path) == expected
 
 
-@patch("os.path.isfile", return_value=True)
-@patch("builtins.open")
-def test_ignore_binary(_mock_open, _mock_isfile):
-    _mock_open.return_value.__enter__.return_value.read.side_effect = UnicodeDecodeError(
-        "utf-8", b"", 0, 1, "invalid start byte"
-    )
-    matcher = IgnoreMatcher("/tmp", [])
+def test_ignore_binary(tmp_path):
+    create_file(tmp_path, "test.py", b"\xff\xfe\x00binary")
+    matcher = IgnoreMatcher(tmp_path, [])
     assert matcher.ignore("test.py") is True
+
+
+def test_ignore_missing_and_directories(tmp_path):
+    os.makedirs(join(tmp_path, "subdir"))
+    matcher = IgnoreMatcher(tmp_path, [], ignore_size_threshold=100)
+    assert matcher.ignore("subdir") is False
+    assert matcher.ignore("missing.txt") is True
+
+
+def test_ignore_caches_verdicts(tmp_path):
+    create_file(tmp_path, "test.py", "print('hello')")
+    matcher = IgnoreMatcher(tmp_path, [])
+
+    assert matcher.ignore("test.py") is False
+    with patch("builtins.open", side_effect=AssertionError("file was read")):
+        assert matcher.ignore("test.py") is False
+
+    # Changed files are checked again
+    create_file(tmp_path, "test.py", b"\xff\xfe\x00binary, and a different size")
+    assert matcher.ignore("test.py") is True
+
+
+def test_ignore_gitignore(tmp_path):
+    create_file(tmp_path, ".gitignore", "# Comment\n*.log\n!keep.log\n/build/\ndocs/*.md\n")
+    create_file(tmp_path, join("src", ".gitignore"), "generated/\n!debug.log\n")
+    for path in [
+        "app.log",
+        "keep.log",
+        join("build", "out.js"),
+        join("src", "build", "out.js"),
+        join("src", "app.log"),
+        join("src", "debug.log"),
+        join("src", "generated", "api.js"),
+        join("docs", "index.md"),
+        join("docs", "api", "index.md"),
+    ]:
+        create_file(tmp_path, path)
+
+    matcher = IgnoreMatcher(tmp_path, [], use_gitignore=True)
+    assert matcher.ignore("app.log") is True
+    assert matcher.ignore("keep.log") is False
+    # Anchored, directory-only pattern
+    assert matcher.ignore("build") is True
+    assert matcher.ignore(join("build", "out.js")) is True
+    assert matcher.ignore(join("src", "build", "out.js")) is False
+    # Nested .gitignore files take precedence
+    assert matcher.ignore(join("src", "app.log")) is True
+    assert matcher.ignore(join("src", "debug.log")) is False
+    assert matcher.ignore(join("src", "generated", "api.js")) is True
+    # "*" doesn't match "/" in .gitignore patterns
+    assert matcher.ignore(join("docs", "index.md")) is True
+    assert matcher.ignore(join("docs", "api", "index.md")) is False
+
+    assert IgnoreMatcher(tmp_path, []).ignore("app.log") is False
+
+    create_file(tmp_path, ".gitignore", "")
+    assert matcher.ignore("app.log") is True
+    matcher.reload_gitignores()
+    assert matcher.ignore("app.log") is False
@@ -0,0 +1,55 @@
+import os
+import time
+from os.path import join
+
+from core.disk.scan_cache import SCAN_CACHE_PATH, ScanCache
+
+
+def write(path, content, age=10):
+    with open(path, "w") as f:
+        f.write(content)
+    # Files modified in the last couple of seconds are not cached
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return os.stat(path)
+
+
+def test_scan_cache(tmp_path):
+    cache = ScanCache()
+    stat = write(join(tmp_path, "file.txt"), "hello")
+
+    assert cache.get("file.txt", stat) is None
+    cache.set("file.txt", stat, "hash")
+    assert cache.get("file.txt", stat) == "hash"
+
+    stat = write(join(tmp_path, "file.txt"), "hello world", age=5)
+    assert cache.get("file.txt", stat) is None
+
+    cache.discard("file.txt")
+    assert cache.entries == {}
+
+
+def test_scan_cache_skips_recently_modified_files(tmp_path):
+    cache = ScanCache()
+    stat = write(join(tmp_path, "file.txt"), "hello", age=0)
+
+    cache.set("file.txt", stat, "hash")
+    assert cache.get("file.txt", stat) is None
+
+
+def test_scan_cache_persistence(tmp_path):
+    path = join(tmp_path, SCAN_CACHE_PATH)
+    cache = ScanCache(path)
+    stat = write(join(tmp_path, "file.txt"), "hello")
+    cache.set("file.txt", stat, "hash")
+    cache.save()
+
+    assert ScanCache(path).get("file.txt", stat) == "hash"
+
+    cache.prune(["other.txt"])
+    cache.save()
+    assert ScanCache(path).entries == {}
+
+    with open(path, "w") as f:
+        f.write("invalid")
+    assert ScanCache(path).entries == {}
@@ -1,7 +1,16 @@
+import asyncio
+import os
+import shutil
+import time
 from os.path import exists, join
+from unittest.mock import patch
+
+import pytest
 
 from core.disk.ignore import IgnoreMatcher
+from core.disk.scan_cache import SCAN_CACHE_PATH
 from core.disk.vfs import LocalDiskVFS, MemoryVFS
+from core.disk.watcher import InotifyWatcher
 
 
 def test_memory_vfs():
@@ -86,3 +95,221 @@ def test_local_disk_vfs_with_matcher(tmp_path):
 
     vfs.remove("test.log")
     assert exists(join(tmp_path, "test.log"))
+
+
+def test_local_disk_vfs_get_hashes(tmp_path):
+    vfs = LocalDiskVFS(tmp_path)
+    vfs.save("test.txt", "hello world")
+    vfs.save("subdir/another.txt", "hello again")
+
+    # Make the files old enough to be cached
+    for path in vfs.list():
+        os.utime(vfs.get_full_path(path), (1_000_000_000, 1_000_000_000))
+
+    expected = {
+        "test.txt": vfs.hash_string("hello world"),
+        "subdir/another.txt": vfs.hash_string("hello again"),
+    }
+    assert vfs.get_hashes() == expected
+    assert exists(join(tmp_path, SCAN_CACHE_PATH))
+    assert vfs.list() == ["subdir/another.txt", "test.txt"]
+
+    # Unchanged files are not read, even by a new VFS instance
+    vfs = LocalDiskVFS(tmp_path)
+    with patch.object(vfs, "read", side_effect=AssertionError("file was read")):
+        assert vfs.get_hashes() == expected
+
+    with open(join(tmp_path, "test.txt"), "w") as f:
+        f.write("changed")
+    os.remove(join(tmp_path, "subdir", "another.txt"))
+    assert vfs.get_hashes() == {"test.txt": vfs.hash_string("changed")}
+
+    with patch.object(vfs, "read", wraps=vfs.read) as mock_read:
+        vfs.get_hashes(rescan=True)
+        mock_read.assert_called_once_with("test.txt")
+
+
+@pytest.mark.skipif(not InotifyWatcher.is_supported(), reason="inotify is not supported")
+def test_local_disk_vfs_watch(tmp_path):
+    matcher = IgnoreMatcher(tmp_path, ["node_modules"])
+    vfs = LocalDiskVFS(tmp_path, ignore_matcher=matcher, watch=True)
+    vfs.save("test.txt", "hello world")
+    vfs.save("subdir/another.txt", "hello again")
+    assert vfs.get_hashes() == {
+        "test.txt": vfs.hash_string("hello world"),
+        "subdir/another.txt": vfs.hash_string("hello again"),
+    }
+
+    with open(join(tmp_path, "test.txt"), "w") as f:
+        f.write("changed")
+    os.makedirs(join(tmp_path, "new", "nested"))
+    with open(join(tmp_path, "new", "nested", "file.txt"), "w") as f:
+        f.write("new file")
+    os.makedirs(join(tmp_path, "node_modules", "pkg"))
+    with open(join(tmp_path, "node_modules", "pkg", "index.js"), "w") as f:
+        f.write("ignored")
+    shutil.rmtree(join(tmp_path, "subdir"))
+
+    # Only the changes are checked, without walking the whole tree
+    with patch("core.disk.vfs.os.walk", wraps=os.walk) as mock_walk:
+        assert vfs.get_hashes() == {
+            "test.txt": vfs.hash_string("changed"),
+            "new/nested/file.txt": vfs.hash_string("new file"),
+        }
+        # New directories are walked to watch them and to find the files in them
+        assert {call.args[0] for call in mock_walk.call_args_list} == {join(tmp_path, "new")}
+
+    assert vfs.list() == ["new/nested/file.txt", "test.txt"]
+
+    # Files in directories created after the last check are watched too
+    with open(join(tmp_path, "new", "nested", "file.txt"), "w") as f:
+        f.write("updated")
+    assert vfs.get_hashes()["new/nested/file.txt"] == vfs.hash_string("updated")
+
+    vfs.close()
+    assert vfs.watcher is None
+
+
+@pytest.mark.skipif(not InotifyWatcher.is_supported(), reason="inotify is not supported")
+def test_local_disk_vfs_watch_rescan(tmp_path):
+    vfs = LocalDiskVFS(tmp_path, watch=True)
+    vfs.save("subdir/test.txt", "hello world")
+    vfs.get_hashes()
+
+    # Moving a watched directory makes the journal unreliable
+    os.rename(join(tmp_path, "subdir"), join(tmp_path, "moved"))
+    assert vfs.get_hashes() == {"moved/test.txt": vfs.hash_string("hello world")}
+
+    with open(join(tmp_path, "moved", "test.txt"), "w") as f:
+        f.write("changed")
+    assert vfs.get_hashes() == {"moved/test.txt": vfs.hash_string("changed")}
+    vfs.close()
+
+
+@pytest.mark.skipif(not InotifyWatcher.is_supported(), reason="inotify is not supported")
+def test_local_disk_vfs_watch_gitignore(tmp_path):
+    vfs = LocalDiskVFS(tmp_path, ignore_matcher=IgnoreMatcher(tmp_path, [], use_gitignore=True), watch=True)
+    vfs.save("generated/api.js", "generated")
+    vfs.save("test.txt", "hello world")
+    assert set(vfs.get_hashes()) == {"generated/api.js", "test.txt"}
+
+    # Changing the ignore rules rescans the project
+    with open(join(tmp_path, ".gitignore"), "w") as f:
+        f.write("generated/\n")
+    assert set(vfs.get_hashes()) == {".gitignore", "test.txt"}
+
+    os.remove(join(tmp_path, ".gitignore"))
+    assert set(vfs.get_hashes()) == {"generated/api.js", "test.txt"}
+    vfs.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("local", [False, True])
+async def test_async_operations(tmp_path, local):
+    vfs = LocalDiskVFS(tmp_path) if local else MemoryVFS()
+
+    assert await vfs.alist() == []
+
+    await vfs.asave("test.txt", "hello world")
+    await vfs.asave("subdir/another.txt", "hello world")
+    assert await vfs.aread("test.txt") == "hello world"
+    assert await vfs.alist() == ["subdir/another.txt", "test.txt"]
+    assert await vfs.alist("subdir") == ["subdir/another.txt"]
+
+    with pytest.raises(ValueError):
+        await vfs.aread("nonexistent.txt")
+
+    await vfs.aremove("test.txt")
+    await vfs.aremove("nonexistent.txt")
+    assert await vfs.alist() == ["subdir/another.txt"]
+    assert vfs.list() == ["subdir/another.txt"]
+
+
+@pytest.mark.asyncio
+async def test_local_disk_vfs_aremove_updates_scan_cache(tmp_path):
+    vfs = LocalDiskVFS(tmp_path)
+    await vfs.asave("test.txt", "hello world")
+
+    # Backdate the file so it's not considered racily modified
+    full_path = join(tmp_path, "test.txt")
+    os.utime(full_path, ns=(time.time_ns() - 10_000_000_000,) * 2)
+    await vfs.scan()
+    assert "test.txt" in vfs.scan_cache.entries
+
+    await vfs.aremove("test.txt")
+    assert "test.txt" not in vfs.scan_cache.entries
+    assert not exists(full_path)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("local", [False, True])
+async def test_bulk_operations(tmp_path, local):
+    vfs = LocalDiskVFS(tmp_path) if local else MemoryVFS()
+    files = {f"dir{i % 3}/file{i}.txt": f"content {i}" for i in range(20)}
+
+    await vfs.save_many(files)
+    assert vfs.list() == sorted(files)
+
+    paths = list(files) + ["missing.txt"]
+    assert await vfs.read_many(paths) == files
+    hashes = {path: vfs.hash_string(content) for path, content in files.items()}
+    assert await vfs.hash_many(paths) == hashes
+    assert await vfs.scan() == hashes
+
+
+@pytest.mark.asyncio
+async def test_local_disk_vfs_limits_bytes_in_flight(tmp_path):
+    vfs = LocalDiskVFS(tmp_path)
+    await vfs.save_many({f"file{i}.txt": "x" * 100 for i in range(10)})
+
+    in_flight = 0
+    max_in_flight = 0
+    read = vfs.read
+
+    def tracking_read(path):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.01)
+        in_flight -= 1
+        return read(path)
+
+    # Each file is a batch on its own, and only two fit in the budget
+    with (
+        patch("core.disk.vfs.BATCH_BYTES", 100),
+        patch("core.disk.vfs.MAX_IN_FLIGHT_BYTES", 250),
+        patch.object(vfs, "read", side_effect=tracking_read),
+    ):
+        contents = await vfs.read_many(vfs.list())
+
+    assert len(contents) == 10
+    assert max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_local_disk_vfs_keeps_event_loop_responsive(tmp_path):
+    vfs = LocalDiskVFS(tmp_path)
+    await vfs.save_many({f"file{i}.txt": "x" for i in range(4)})
+
+    def slow_hash(path):
+        time.sleep(0.1)
+        return "hash"
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    with (
+        patch("core.disk.vfs.IO_WORKERS", 1),
+        patch("core.disk.vfs.BATCH_FILES", 1),
+        patch.object(vfs, "_read_hash", side_effect=slow_hash),
+    ):
+        await vfs.hash_many(vfs.list())
+    task.cancel()
+
+    assert ticks > 10
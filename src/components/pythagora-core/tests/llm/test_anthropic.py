@@ -0,0 +1,176 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.config import LLMConfig, LLMProvider
+from core.llm.anthropic_client import AnthropicClient
+from core.llm.convo import Convo
+from core.llm.parser import JSONParser
+
+FILES_LIST = "~~RELEVANT_FILES_IMPLEMENTATION~~\nfile listing\n~~END_OF_RELEVANT_FILES_IMPLEMENTATION~~"
+
+
+class StubStream:
+    """Stub for the Anthropic message stream context manager."""
+
+    def __init__(self, *content, cache_read: int = 0, cache_write: int = 0):
+        self.content = content
+        self.final_message = MagicMock()
+        self.final_message.usage = MagicMock(
+            input_tokens=10,
+            output_tokens=2,
+            cache_read_input_tokens=cache_read,
+            cache_creation_input_tokens=cache_write,
+        )
+        self.current_message_snapshot = MagicMock()
+        self.current_message_snapshot.usage = MagicMock(
+            input_tokens=10,
+            output_tokens=1,
+            cache_read_input_tokens=cache_read,
+            cache_creation_input_tokens=cache_write,
+        )
+        self.final_message_requested = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    @property
+    async def text_stream(self):
+        for item in self.content:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def get_final_message(self):
+        self.final_message_requested = True
+        return self.final_message
+
+
+@pytest.mark.asyncio
+@patch("core.llm.anthropic_client.AsyncAnthropic")
+async def test_anthropic_without_prompt_caching(mock_AsyncAnthropic):
+    cfg = LLMConfig(provider=LLMProvider.ANTHROPIC, model="claude-3-haiku", base_url="https://api.anthropic.com")
+    convo = Convo("system hello").user("user hello")
+
+    stream = MagicMock(return_value=StubStream("hello", " world"))
+    mock_AsyncAnthropic.return_value.messages.stream = stream
+
+    llm = AnthropicClient(cfg)
+    response, req_log = await llm(convo)
+
+    assert response == "hello world"
+    stream.assert_called_once_with(
+        max_tokens=4096,
+        model="claude-3-haiku",
+        temperature=0.5,
+        messages=[{"role": "user", "content": "system hello\n\nuser hello"}],
+    )
+    assert req_log.cache_read_tokens == 0
+    assert req_log.cache_write_tokens == 0
+
+
+@pytest.mark.asyncio
+@patch("core.llm.anthropic_client.AsyncAnthropic")
+async def test_anthropic_prompt_caching_breakpoints(mock_AsyncAnthropic):
+    cfg = LLMConfig(
+        provider=LLMProvider.ANTHROPIC,
+        model="claude-3-haiku",
+        base_url="https://api.anthropic.com",
+        prompt_caching=True,
+    )
+    convo = (
+        Convo("system hello")
+        .user(f"task description\n{FILES_LIST}\nwhat to do next")
+        .assistant("response")
+        .user("follow-up")
+    )
+
+    stream = MagicMock(return_value=StubStream("hello", cache_read=100, cache_write=50))
+    mock_AsyncAnthropic.return_value.beta.prompt_caching.messages.stream = stream
+
+    llm = AnthropicClient(cfg)
+    response, req_log = await llm(convo)
+
+    assert response == "hello"
+    mock_AsyncAnthropic.return_value.messages.stream.assert_not_called()
+
+    kwargs = stream.call_args.kwargs
+    assert kwargs["system"] == [{"type": "text", "text": "system hello", "cache_control": {"type": "ephemeral"}}]
+    assert kwargs["messages"] == [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": f"task description\n{FILES_LIST}", "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": "\nwhat to do next"},
+            ],
+        },
+        {"role": "assistant", "content": [{"type": "text", "text": "response"}]},
+        {
+            "role": "user",
+            "content": [{"type": "text", "text": "follow-up", "cache_control": {"type": "ephemeral"}}],
+        },
+    ]
+
+    assert req_log.cache_read_tokens == 100
+    assert req_log.cache_write_tokens == 50
+
+
+def test_anthropic_prompt_caching_disabled_on_bedrock():
+    cfg = LLMConfig(
+        provider=LLMProvider.ANTHROPIC,
+        model="claude-3-haiku",
+        base_url="https://example.com/bedrock/anthropic",
+        prompt_caching=True,
+    )
+    assert AnthropicClient(cfg).prompt_caching is False
+
+
+def test_anthropic_prompt_caching_limits_breakpoints():
+    cfg = LLMConfig(provider=LLMProvider.ANTHROPIC, model="claude-3-haiku", prompt_caching=True)
+    convo = Convo("system").user(FILES_LIST).assistant("ok").user(FILES_LIST)
+
+    system, messages = AnthropicClient(cfg)._adapt_messages_for_caching(convo)
+
+    blocks = system + [block for msg in messages for block in msg["content"]]
+    assert sum(1 for block in blocks if "cache_control" in block) <= 4
+    assert all("files_list" not in block for block in blocks)
+
+
+@pytest.mark.asyncio
+@patch("core.llm.anthropic_client.AsyncAnthropic")
+async def test_anthropic_stops_stream_when_json_is_complete(mock_AsyncAnthropic):
+    cfg = LLMConfig(provider=LLMProvider.ANTHROPIC, model="claude-3-haiku", base_url="https://api.anthropic.com")
+    convo = Convo("system hello").user("user hello")
+
+    stub_stream = StubStream('{"a": ', "1}", "\nSome explanation", " that we don't need")
+    mock_AsyncAnthropic.return_value.messages.stream = MagicMock(return_value=stub_stream)
+
+    llm = AnthropicClient(cfg)
+    response, req_log = await llm(convo, parser=JSONParser())
+
+    assert response == {"a": 1}
+    assert req_log.response == '{"a": 1}'
+    assert req_log.prompt_tokens == 10
+    assert req_log.completion_tokens > 0
+    assert stub_stream.final_message_requested is False
+
+
+@pytest.mark.asyncio
+@patch("core.llm.anthropic_client.AsyncAnthropic")
+async def test_anthropic_aborts_invalid_json_stream(mock_AsyncAnthropic):
+    cfg = LLMConfig(provider=LLMProvider.ANTHROPIC, model="claude-3-haiku", base_url="https://api.anthropic.com")
+    convo = Convo("system hello").user("user hello")
+
+    first = StubStream("Sure, here's the JSON", " you asked for:", AssertionError("stream not aborted"))
+    second = StubStream('{"a": 1}')
+    mock_AsyncAnthropic.return_value.messages.stream = MagicMock(side_effect=[first, second])
+
+    llm = AnthropicClient(cfg)
+    response, req_log = await llm(convo, parser=JSONParser())
+
+    assert response == {"a": 1}
+    assert req_log.messages[-2] == {"role": "assistant", "content": "Sure, here's the JSON"}
+    assert req_log.messages[-1]["content"].startswith("Error parsing response: JSON is not valid")
@@ -0,0 +1,172 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from core.config import LLMCacheConfig, LLMCacheMode, LLMConfig, LLMProvider
+from core.llm.base import BaseLLMClient
+from core.llm.cache import LLMResponseCache
+from core.llm.convo import Convo
+from core.llm.parser import JSONParser
+
+
+class CachedClient(BaseLLMClient):
+    provider = LLMProvider.OPENAI
+
+    def _init_client(self):
+        pass
+
+
+def make_cache(**kwargs) -> LLMResponseCache:
+    return LLMResponseCache(LLMCacheConfig(path=":memory:", **kwargs))
+
+
+def test_cache_key_depends_on_request():
+    messages = [{"role": "user", "content": "hello"}]
+    key = LLMResponseCache.key("openai", "gpt-4o", 0.0, False, messages)
+
+    assert key == LLMResponseCache.key("openai", "gpt-4o", 0.0, False, [{"content": "hello", "role": "user"}])
+    assert key != LLMResponseCache.key("anthropic", "gpt-4o", 0.0, False, messages)
+    assert key != LLMResponseCache.key("openai", "gpt-4o-mini", 0.0, False, messages)
+    assert key != LLMResponseCache.key("openai", "gpt-4o", 0.5, False, messages)
+    assert key != LLMResponseCache.key("openai", "gpt-4o", 0.0, True, messages)
+    assert key != LLMResponseCache.key("openai", "gpt-4o", 0.0, False, [{"role": "user", "content": "hi"}])
+
+
+def test_cache_get_put():
+    cache = make_cache(mode=LLMCacheMode.REPLAY)
+
+    assert cache.get("k") is None
+    cache.put("k", "response", 10, 2)
+
+    cached = cache.get("k")
+    assert cached.response == "response"
+    assert cached.prompt_tokens == 10
+    assert cached.completion_tokens == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_ttl_expires_entries():
+    cache = make_cache(mode=LLMCacheMode.REPLAY, ttl=60)
+
+    with patch("core.llm.cache.time", return_value=1000.0):
+        cache.put("k", "response", 0, 0)
+    with patch("core.llm.cache.time", return_value=1059.0):
+        assert cache.get("k") is not None
+    with patch("core.llm.cache.time", return_value=1061.0):
+        assert cache.get("k") is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = make_cache(mode=LLMCacheMode.REPLAY, max_size=10, ttl=None)
+
+    with patch("core.llm.cache.time", return_value=1.0):
+        cache.put("a", "aaaa", 0, 0)
+    with patch("core.llm.cache.time", return_value=2.0):
+        cache.put("b", "bbbb", 0, 0)
+    with patch("core.llm.cache.time", return_value=3.0):
+        cache.get("a")
+    with patch("core.llm.cache.time", return_value=4.0):
+        cache.put("c", "cccc", 0, 0)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_cache_keeps_running_total_size():
+    cache = make_cache(mode=LLMCacheMode.REPLAY, ttl=100)
+
+    def stored_size():
+        return cache.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    with patch("core.llm.cache.time", return_value=1.0):
+        cache.put("a", "aaaa", 0, 0)
+        cache.put("b", "bb", 0, 0)
+        cache.put("a", "aaaaaa", 0, 0)
+    assert cache.total_size == stored_size() == 8
+
+    cache.remove("b")
+    assert cache.total_size == stored_size() == 6
+
+    with patch("core.llm.cache.time", return_value=200.0):
+        cache.put("c", "cc", 0, 0)
+    assert cache.total_size == stored_size() == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_async_methods():
+    cache = make_cache(mode=LLMCacheMode.REPLAY)
+
+    assert await cache.aget("k") is None
+    await cache.aput("k", "response", 10, 2)
+    cached = await cache.aget("k")
+    assert (cached.response, cached.prompt_tokens, cached.completion_tokens) == ("response", 10, 2)
+    await cache.aremove("k")
+    assert await cache.aget("k") is None
+
+
+def test_cache_deterministic_only():
+    assert make_cache(mode=LLMCacheMode.OFF).should_cache(0) is False
+    assert make_cache(mode=LLMCacheMode.RECORD).should_cache(0) is True
+    assert make_cache(mode=LLMCacheMode.RECORD).should_cache(0.5) is False
+    assert make_cache(mode=LLMCacheMode.RECORD, deterministic_only=False).should_cache(0.5) is True
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_without_network():
+    cache = make_cache(mode=LLMCacheMode.RECORD)
+    cfg = LLMConfig(model="gpt-4o", temperature=0.0)
+    convo = Convo("system").user("user")
+
+    llm = CachedClient(cfg, cache=cache)
+    llm._make_request = AsyncMock(return_value=('{"a": 1}', 10, 5))
+    response, req_log = await llm(convo, parser=JSONParser())
+    assert response == {"a": 1}
+    assert req_log.cached is False
+    llm._make_request.assert_awaited_once()
+
+    cache.config.mode = LLMCacheMode.REPLAY
+    stream_handler = AsyncMock()
+    llm = CachedClient(cfg, cache=cache, stream_handler=stream_handler)
+    llm._make_request = AsyncMock(side_effect=AssertionError("network call in replay mode"))
+    response, req_log = await llm(convo, parser=JSONParser())
+
+    assert response == {"a": 1}
+    assert req_log.cached is True
+    assert req_log.response == '{"a": 1}'
+    assert req_log.prompt_tokens == 0
+    stream_handler.assert_any_await('{"a": 1}')
+    llm._make_request.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_replay_miss_or_unparseable_goes_to_network():
+    cache = make_cache(mode=LLMCacheMode.REPLAY)
+    cfg = LLMConfig(model="gpt-4o", temperature=0.0)
+    convo = Convo("system").user("user")
+    key = cache.key("openai", "gpt-4o", 0.0, False, convo.messages)
+    cache.put(key, "not json", 1, 1)
+
+    llm = CachedClient(cfg, cache=cache)
+    llm._make_request = AsyncMock(return_value=('{"a": 1}', 10, 5))
+    response, req_log = await llm(convo, parser=JSONParser())
+
+    assert response == {"a": 1}
+    assert req_log.cached is False
+    llm._make_request.assert_awaited_once()
+    assert cache.get(key).response == '{"a": 1}'
+
+
+@pytest.mark.asyncio
+async def test_non_deterministic_requests_are_not_cached():
+    cache = make_cache(mode=LLMCacheMode.REPLAY)
+    cfg = LLMConfig(model="gpt-4o", temperature=0.5)
+    convo = Convo("system").user("user")
+
+    llm = CachedClient(cfg, cache=cache)
+    llm._make_request = AsyncMock(return_value=("hello", 10, 5))
+    await llm(convo)
+    await llm(convo)
+
+    assert llm._make_request.await_count == 2
+    assert cache.get(cache.key("openai", "gpt-4o", 0.5, False, convo.messages)) is None
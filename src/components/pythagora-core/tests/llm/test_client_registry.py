@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from core.config import LLMConfig, LLMProvider
+from core.llm.client_registry import ClientRegistry
+
+
+@pytest.mark.asyncio
+async def test_registry_reuses_client_for_same_config():
+    registry = ClientRegistry()
+    cfg = LLMConfig(model="gpt-4o", api_key="key")
+
+    client1 = registry.get(cfg)
+    client2 = registry.get(LLMConfig(model="gpt-4o-mini", api_key="key", temperature=0.0))
+    assert client1 is client2
+
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_registry_separates_clients_by_key():
+    registry = ClientRegistry()
+
+    openai_client = registry.get(LLMConfig(model="gpt-4o", api_key="key"))
+    anthropic_client = registry.get(LLMConfig(provider=LLMProvider.ANTHROPIC, model="claude", api_key="key"))
+    other_key_client = registry.get(LLMConfig(model="gpt-4o", api_key="other-key"))
+    slow_client = registry.get(LLMConfig(model="gpt-4o", api_key="key", read_timeout=120.0))
+
+    assert len({id(openai_client), id(anthropic_client), id(other_key_client), id(slow_client)}) == 4
+    assert len(registry.stats()) == 4
+
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_registry_stats_and_close():
+    registry = ClientRegistry()
+    cfg = LLMConfig(model="gpt-4o", base_url="http://localhost:1234/v1")
+    client = registry.get(cfg)
+
+    stats = registry.stats()
+    assert stats == [
+        {
+            "provider": "openai",
+            "base_url": "http://localhost:1234/v1",
+            "connect_timeout": 60.0,
+            "read_timeout": 60.0,
+            "requests": 0,
+            "open_connections": 0,
+            "idle_connections": 0,
+            "closed": False,
+            "stale": False,
+        }
+    ]
+
+    await registry.aclose()
+    assert client.is_closed
+    assert registry.stats() == []
+
+    # Closing again is a no-op, and the client is recreated on demand
+    await registry.aclose()
+    assert registry.get(cfg) is not client
+    await registry.aclose()
+
+
+def test_registry_closes_clients_from_stale_event_loops():
+    registry = ClientRegistry()
+    cfg = LLMConfig(model="gpt-4o", api_key="key")
+
+    async def get_client():
+        return registry.get(cfg)
+
+    old_client = asyncio.run(get_client())
+    new_client = asyncio.run(get_client())
+    assert new_client is not old_client
+    assert [s["stale"] for s in registry.stats()] == [False, True]
+
+    asyncio.run(registry.aclose())
+    assert old_client.is_closed
+    assert new_client.is_closed
+    assert registry.stats() == []
@@ -205,6 +205,35 @@ def test_convo_fork_with_multiple_messages():
     assert convo1.messages != convo2.messages
 
 
+def test_convo_fork_shares_messages_until_modified():
+    convo1 = Convo("Hello").user("Hello LLM!")
+    convo1.log_prompt({"template": "test"})
+    messages = convo1.messages
+    convo2 = convo1.fork()
+
+    assert convo2.messages is messages
+    assert convo2.prompt_log is convo1.prompt_log
+
+    convo2.user("New message in convo2")
+    convo2.log_prompt({"template": "other"})
+
+    assert convo1.messages is messages
+    assert len(messages) == 2
+    assert convo1.prompt_log == [{"template": "test"}]
+    # The messages themselves are shared, not copied
+    assert convo2.messages[0] is messages[0]
+
+
+def test_convo_assigned_messages_are_not_modified():
+    messages = [{"role": "user", "content": "Hello"}]
+    convo = Convo()
+    convo.messages = messages
+    convo.assistant("Hi!")
+
+    assert messages == [{"role": "user", "content": "Hello"}]
+    assert len(convo.messages) == 2
+
+
 def test_after_with_empty_convos():
     convo1 = Convo()
     convo2 = Convo()
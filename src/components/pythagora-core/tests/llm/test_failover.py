@@ -0,0 +1,167 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import openai
+import pytest
+
+from core.config import LLMCacheConfig, LLMCacheMode, LLMConfig, LLMProvider
+from core.llm.base import BaseLLMClient
+from core.llm.cache import LLMResponseCache
+from core.llm.convo import Convo
+from core.llm.health import MIN_TTFT_SAMPLES, HealthTracker
+
+
+class StubClient(BaseLLMClient):
+    """LLM client whose behavior depends on the model name."""
+
+    provider = LLMProvider.OPENAI
+    models = {}
+
+    def _init_client(self):
+        pass
+
+    async def _make_request(self, convo, temperature=None, json_mode=False, request_log=None, stream_parser=None):
+        delay, response = self.models[self.config.model]
+        await asyncio.sleep(delay)
+        if isinstance(response, Exception):
+            raise response
+        if self.stream_handler:
+            await self.stream_handler(response)
+            await self.stream_handler(None)
+        return response, 10, 2
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.example.com"))
+
+
+@pytest.fixture
+def tracker():
+    tracker = HealthTracker()
+    with (
+        patch("core.llm.base.health_tracker", tracker),
+        patch.object(BaseLLMClient, "for_provider", return_value=StubClient),
+    ):
+        yield tracker
+
+
+def make_config(model: str, *fallback: str, hedge_after: float = None) -> LLMConfig:
+    return LLMConfig(
+        model=model,
+        fallback=[LLMConfig(model=name) for name in fallback],
+        hedge_after=hedge_after,
+    )
+
+
+def test_health_tracker_select_and_cooldown():
+    tracker = HealthTracker()
+    a, b = LLMConfig(model="a"), LLMConfig(model="b")
+
+    assert tracker.select([a, b]) is a
+
+    with patch("core.llm.health.monotonic", return_value=100.0):
+        tracker.record_failure(a)
+    with patch("core.llm.health.monotonic", return_value=110.0):
+        assert tracker.select([a, b]) is b
+        tracker.record_failure(b)
+        tracker.record_failure(b)
+        # Neither is healthy, pick the one that recovers first
+        assert tracker.select([a, b]) is a
+    with patch("core.llm.health.monotonic", return_value=131.0):
+        assert tracker.select([a, b]) is a
+
+    tracker.record_success(b)
+    assert tracker.get(b).failures == 0
+
+
+def test_health_tracker_separates_api_keys():
+    tracker = HealthTracker()
+    a, b = LLMConfig(model="a", api_key="k1"), LLMConfig(model="a", api_key="k2")
+
+    tracker.record_failure(a)
+    assert not tracker.is_healthy(a)
+    assert tracker.is_healthy(b)
+    assert tracker.select([a, b]) is b
+    assert len(tracker.stats()) == 2
+
+
+def test_health_tracker_ttft_p95():
+    tracker = HealthTracker()
+    cfg = LLMConfig(model="a")
+
+    for _ in range(MIN_TTFT_SAMPLES - 1):
+        tracker.record_ttft(cfg, 1.0)
+    assert tracker.ttft_p95(cfg) is None
+
+    for i in range(81):
+        tracker.record_ttft(cfg, 1.0 if i < 75 else 10.0)
+    assert tracker.ttft_p95(cfg) == 10.0
+
+
+@pytest.mark.asyncio
+async def test_failover_to_next_healthy_llm(tracker):
+    StubClient.models = {"primary": (0, connection_error()), "backup": (0, "hello")}
+    llm = StubClient(make_config("primary", "backup"))
+
+    response, request_log = await llm(Convo("system").user("user"))
+
+    assert response == "hello"
+    assert request_log.model == "backup"
+    assert not tracker.is_healthy(llm.config)
+
+    # Unhealthy primary is skipped for the following requests
+    StubClient.models["primary"] = (0, "primary hello")
+    response, request_log = await llm(Convo("system").user("user"))
+    assert response == "hello"
+
+
+@pytest.mark.asyncio
+async def test_fallback_response_is_not_cached(tracker):
+    StubClient.models = {"primary": (0, connection_error()), "backup": (0, "hello")}
+    cache = LLMResponseCache(LLMCacheConfig(path=":memory:", mode=LLMCacheMode.RECORD, deterministic_only=False))
+    llm = StubClient(make_config("primary", "backup"), cache=cache)
+    convo = Convo("system").user("user")
+
+    response, request_log = await llm(convo)
+
+    assert request_log.model == "backup"
+    assert cache.get(cache.key("openai", "primary", llm.config.temperature, False, convo.messages)) is None
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_takes_first_response(tracker):
+    StubClient.models = {"primary": (10, "slow"), "backup": (0, "fast")}
+    stream_handler = AsyncMock()
+    llm = StubClient(make_config("primary", "backup", hedge_after=0.05), stream_handler=stream_handler)
+
+    response, request_log = await asyncio.wait_for(llm(Convo("system").user("user")), 2)
+
+    assert response == "fast"
+    assert request_log.model == "backup"
+    assert [call.args[0] for call in stream_handler.await_args_list] == ["fast", None]
+    assert len(tracker.get(llm.config.fallback[0]).ttft) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_not_sent_if_primary_is_fast(tracker):
+    StubClient.models = {"primary": (0, "fast"), "backup": (0, AssertionError("backup should not be called"))}
+    llm = StubClient(make_config("primary", "backup", hedge_after=1))
+
+    response, request_log = await llm(Convo("system").user("user"))
+
+    assert response == "fast"
+    assert request_log.model == "primary"
+    assert tracker.get(llm.config.fallback[0]).failures == 0
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_survives_failed_backup(tracker):
+    StubClient.models = {"primary": (0.1, "slow"), "backup": (0, connection_error())}
+    llm = StubClient(make_config("primary", "backup", hedge_after=0.01))
+
+    response, request_log = await llm(Convo("system").user("user"))
+
+    assert response == "slow"
+    assert request_log.model == "primary"
+    assert not tracker.is_healthy(llm.config.fallback[0])
@@ -7,6 +7,8 @@ from core.config import LLMConfig
 from core.llm.base import APIError
 from core.llm.convo import Convo
 from core.llm.openai_client import OpenAIClient
+from core.llm.parser import CodeBlockParser, JSONParser
+from core.llm.token_budget import count_tokens
 
 
 async def mock_response_generator(*content):
@@ -65,6 +67,63 @@ async def test_openai_stream_handler(mock_AsyncOpenAI):
     stream_handler.assert_has_awaits([call("hello"), call("world")])
 
 
+class MockStream:
+    def __init__(self, *content):
+        self.chunks = mock_response_generator(*content)
+        self.close = AsyncMock()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.chunks.__anext__()
+        chunk.usage = None
+        return chunk
+
+
+@pytest.mark.asyncio
+@patch("core.llm.openai_client.AsyncOpenAI")
+async def test_openai_stops_stream_when_response_is_complete(mock_AsyncOpenAI):
+    cfg = LLMConfig(model="gpt-4-turbo")
+    convo = Convo("system").user("user")
+
+    stream = MockStream("```py\n", "code\n", "```", "\ntrailing text")
+    stream_handler = AsyncMock()
+    mock_AsyncOpenAI.return_value.chat.completions.create = AsyncMock(return_value=stream)
+
+    llm = OpenAIClient(cfg, stream_handler=stream_handler)
+    with patch("core.llm.openai_client.log") as mock_log:
+        response, req_log = await llm(convo, parser=CodeBlockParser())
+
+    assert response == "code"
+    assert req_log.response == "```py\ncode\n```"
+    stream.close.assert_awaited_once()
+    stream_handler.assert_has_awaits([call("```py\n"), call("code\n"), call("```"), call(None)])
+
+    # The usage chunk at the end of the stream was not waited for, so the tokens are estimated
+    assert req_log.prompt_tokens == sum(3 + count_tokens(msg["content"]) for msg in convo.messages)
+    assert req_log.completion_tokens == count_tokens("```py\ncode\n```")
+    mock_log.warning.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("core.llm.openai_client.AsyncOpenAI")
+async def test_openai_aborted_stream_closes_stream_handler(mock_AsyncOpenAI):
+    cfg = LLMConfig(model="gpt-4-turbo")
+    convo = Convo("system").user("user")
+
+    streams = [MockStream("not json"), MockStream('{"a": 1}')]
+    stream_handler = AsyncMock()
+    mock_AsyncOpenAI.return_value.chat.completions.create = AsyncMock(side_effect=streams)
+
+    llm = OpenAIClient(cfg, stream_handler=stream_handler)
+    response, _ = await llm(convo, parser=JSONParser())
+
+    assert response == {"a": 1}
+    streams[0].close.assert_awaited_once()
+    stream_handler.assert_has_awaits([call("not json"), call(None), call('{"a": 1}'), call(None)])
+
+
 @pytest.mark.asyncio
 @patch("core.llm.openai_client.AsyncOpenAI")
 async def test_openai_parser_with_retries(mock_AsyncOpenAI):
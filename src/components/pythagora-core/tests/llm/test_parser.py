@@ -1,10 +1,22 @@
+import json
 from enum import Enum
-from typing import Tuple
+from typing import Annotated, Literal, Tuple, Union
 
 import pytest
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
-from core.llm.parser import CodeBlockParser, EnumParser, JSONParser, MultiCodeBlockParser, OptionalCodeBlockParser
+from core.agents.code_monkey import FileDescription, ReviewChanges
+from core.agents.developer import TaskSteps
+from core.agents.mixins import RelevantFiles
+from core.llm.parser import (
+    CodeBlockParser,
+    EnumParser,
+    JSONParser,
+    MultiCodeBlockParser,
+    OptionalCodeBlockParser,
+    StreamParseError,
+    extended_model,
+)
 
 
 @pytest.mark.parametrize(
@@ -145,6 +157,62 @@ def test_parse_json_with_spec(input, expected):
         assert result.model_dump() == {**expected, "original_response": input.strip()}
 
 
+def test_parse_json_reuses_extended_model():
+    class TestModel(BaseModel):
+        name: str
+        tags: list[str] = []
+
+    text = '```json\n{"name": "John", "tags": ["a", "b"]}\n```'
+    parser = JSONParser(spec=TestModel)
+
+    first = parser(text)
+    second = parser(text)
+    assert extended_model(TestModel) is extended_model(TestModel)
+    assert type(first) is extended_model(TestModel)
+    assert type(second) is type(first)
+    assert second.model_dump() == first.model_dump()
+    assert second.original_response == text
+
+
+@pytest.mark.parametrize(
+    ("spec", "data"),
+    [
+        (
+            ReviewChanges,
+            {
+                "hunks": [{"number": 1, "reason": "Needed for the feature.", "decision": "apply"}],
+                "review_notes": "",
+            },
+        ),
+        (
+            FileDescription,
+            {"summary": "Express server setup.", "references": ["src/routes/auth.js"]},
+        ),
+        (
+            TaskSteps,
+            {
+                "steps": [
+                    {"type": "save_file", "save_file": {"path": "src/app.js"}},
+                    {"type": "command", "command": {"command": "npm install", "timeout": 60, "success_message": ""}},
+                ]
+            },
+        ),
+        (RelevantFiles, {"action": {"read_files": ["src/app.js"]}}),
+    ],
+    ids=lambda value: value.__name__ if isinstance(value, type) else "",
+)
+def test_parse_json_agent_specs(spec, data):
+    text = f"```json\n{json.dumps(data, indent=2)}\n```"
+    parser = JSONParser(spec=spec)
+
+    result = parser(text)
+    assert type(result) is extended_model(spec)
+    assert result.model_dump() == {**spec.model_validate(data).model_dump(), "original_response": text}
+    # Nested models are validated too, not just copied as dicts
+    for name, value in spec.model_validate(data):
+        assert type(getattr(result, name)) is type(value)
+
+
 def test_parse_json_schema():
     class TestModel(BaseModel):
         name: str
@@ -204,3 +272,82 @@ def test_enum_parser(input, expected):
 def test_optional_block_parser(input, expected):
     parser = OptionalCodeBlockParser()
     assert parser(input) == expected
+
+
+def feed_all(stream_parser, chunks: list[str]) -> list[bool]:
+    return [stream_parser.feed(chunk) for chunk in chunks]
+
+
+def test_incremental_code_block_parser_stops_when_block_is_closed():
+    stream_parser = CodeBlockParser().streaming()
+
+    assert feed_all(stream_parser, ["Here:\n``", "`py\nco", "de\n``", "`\nmore"]) == [False, False, False, True]
+    assert CodeBlockParser()(stream_parser.text) == "code"
+
+
+@pytest.mark.parametrize(
+    ("chunks", "expected"),
+    [
+        (['{"a": "}",', ' "b": [1, {"c": 2}]', "}", "\ntrailing text"], [False, False, True, True]),
+        (['{"a": "\\"}"', ', "b": 1}'], [False, True]),
+        (["```json\n", '{"a": 1}', "\n``", "`"], [False, False, False, True]),
+        (['  ```json\n{"a": 1}\n```'], [True]),
+    ],
+)
+def test_incremental_json_parser_stops_when_json_is_closed(chunks, expected):
+    assert feed_all(JSONParser().streaming(), chunks) == expected
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        ["Sure! Here's the JSON"],
+        ['{"a": 1', " 2, "],
+        ['{"count": "many"', ', "items": ["a"'],
+        ['{"count": 1, "items": ["a", 2, "c"'],
+        ['{"count": 1, "items": [], "extra": 1, "b"'],
+    ],
+)
+def test_incremental_json_parser_aborts_on_invalid_json(chunks):
+    class Spec(BaseModel):
+        count: int
+        items: list[str]
+
+        model_config = {"extra": "forbid"}
+
+    stream_parser = JSONParser(Spec).streaming()
+    with pytest.raises(StreamParseError) as exc_info:
+        feed_all(stream_parser, chunks)
+    assert exc_info.value.response == "".join(chunks)
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        ['{"items": ["a", "b', 'c"], "cou', 'nt": 4', "2}"],
+        ['{"steps": [{"type": "command", "command": {"command": "npm i",', ' "timeout": 60}}, {"type": "sa'],
+    ],
+)
+def test_incremental_json_parser_accepts_valid_partial_json(chunks):
+    class Command(BaseModel):
+        command: str
+        timeout: int
+
+    class CommandStep(BaseModel):
+        type: Literal["command"]
+        command: Command
+
+    class SaveFileStep(BaseModel):
+        type: Literal["save_file"]
+        path: str
+
+    class Spec(BaseModel):
+        count: int = 0
+        items: list[str] = []
+        steps: list[Annotated[Union[CommandStep, SaveFileStep], Field(discriminator="type")]] = []
+
+    feed_all(JSONParser(Spec).streaming(), chunks)
+
+
+def test_incremental_json_parser_not_strict_does_not_abort():
+    assert feed_all(JSONParser(strict=False).streaming(), ["not json, at all"]) == [False]
@@ -0,0 +1,73 @@
+"""
+Parse cost per call for the specs used by CodeMonkey, Developer and the
+relevant-files loop. Skipped by default, run with:
+
+    RUN_BENCHMARKS=1 pytest -s tests/llm/test_parser_benchmark.py
+"""
+
+import json
+import os
+from time import perf_counter
+
+import pytest
+
+from core.agents.code_monkey import FileDescription, ReviewChanges
+from core.agents.convo import _schema_text
+from core.agents.developer import TaskSteps
+from core.agents.mixins import RelevantFiles
+from core.llm.parser import JSONParser, extended_model
+
+pytestmark = pytest.mark.skipif(not os.environ.get("RUN_BENCHMARKS"), reason="set RUN_BENCHMARKS=1 to run")
+
+ITERATIONS = 200
+
+RESPONSES = {
+    ReviewChanges: {
+        "hunks": [
+            {"number": i, "reason": "Looks good, the change is needed for the feature.", "decision": "apply"}
+            for i in range(1, 11)
+        ],
+        "review_notes": "",
+    },
+    FileDescription: {
+        "summary": "Express server setup with routes for authentication and the REST API. " * 5,
+        "references": [f"src/routes/route{i}.js" for i in range(10)],
+    },
+    TaskSteps: {
+        "steps": [{"type": "save_file", "save_file": {"path": f"src/file{i}.js"}} for i in range(10)]
+        + [{"type": "command", "command": {"command": "npm install", "timeout": 60, "success_message": ""}}],
+    },
+    RelevantFiles: {"action": {"read_files": [f"src/file{i}.js" for i in range(20)]}},
+}
+
+
+@pytest.mark.parametrize("spec", list(RESPONSES), ids=lambda spec: spec.__name__)
+def test_json_parser_cost_per_call(spec):
+    text = f"```json\n{json.dumps(RESPONSES[spec], indent=2)}\n```"
+    parser = JSONParser(spec=spec)
+
+    first = parser(text)
+    assert type(first) is extended_model(spec)
+
+    start = perf_counter()
+    for _ in range(ITERATIONS):
+        result = parser(text)
+    elapsed = perf_counter() - start
+
+    assert type(result) is type(first)
+    assert result.model_dump() == first.model_dump()
+    assert result.original_response == text
+    print(f"{spec.__name__}: {elapsed / ITERATIONS * 1e6:.0f} µs per parse")
+
+
+@pytest.mark.parametrize("spec", list(RESPONSES), ids=lambda spec: spec.__name__)
+def test_schema_text_cost_per_call(spec):
+    schema_txt = _schema_text(spec)
+    assert "$ref" not in schema_txt
+
+    start = perf_counter()
+    for _ in range(ITERATIONS):
+        assert _schema_text(spec) is schema_txt
+    elapsed = perf_counter() - start
+
+    print(f"{spec.__name__}: {elapsed / ITERATIONS * 1e6:.2f} µs per schema")
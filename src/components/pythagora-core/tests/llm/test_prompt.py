@@ -1,5 +1,7 @@
+from unittest.mock import MagicMock
+
 import pytest
-from jinja2 import UndefinedError
+from jinja2 import FileSystemBytecodeCache, UndefinedError
 
 from core.llm.prompt import FormatTemplate, JinjaFileTemplate, JinjaStringTemplate
 
@@ -57,3 +59,39 @@ def test_jinja_file_template():
 def test_jinja_file_template_nonexistent_directory():
     with pytest.raises(ValueError):
         JinjaFileTemplate(["nonexistent"])
+
+
+def test_jinja_file_template_precompile(tmp_path):
+    template = JinjaFileTemplate(["tests/llm/prompts"], bytecode_cache=FileSystemBytecodeCache(str(tmp_path)))
+
+    assert template.precompile() == 3
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_jinja_file_template_memoizes_partials():
+    template = JinjaFileTemplate(["tests/llm/prompts"], memoize_prefix="partials/")
+    user = MagicMock(cache_key="user-1")
+    user.name = "Alice"
+
+    assert template("with_partial.txt", name="world") == "Hello world!\nHow are you?\n"
+    assert template("with_partial.txt", name="world") == "Hello world!\nHow are you?\n"
+    assert template("partials/greeting.txt", name="world") == "Hello world!\n"
+    assert (template.env.hits, template.env.misses) == (2, 1)
+
+    assert template("with_partial.txt", name="world", user=user) == "Hello world (Alice)!\nHow are you?\n"
+    user.name = "Bob"
+    assert template("with_partial.txt", name="world", user=user) == "Hello world (Alice)!\nHow are you?\n"
+    user.cache_key = "user-2"
+    assert template("with_partial.txt", name="world", user=user) == "Hello world (Bob)!\nHow are you?\n"
+    assert (template.env.hits, template.env.misses) == (3, 3)
+
+
+def test_jinja_file_template_does_not_memoize_unkeyable_values():
+    template = JinjaFileTemplate(["tests/llm/prompts"], memoize_prefix="partials/")
+
+    for name in ["Alice", "Bob"]:
+        user = MagicMock(cache_key=None)
+        user.name = name
+        assert template("with_partial.txt", name="world", user=user) == f"Hello world ({name})!\nHow are you?\n"
+
+    assert (template.env.hits, template.env.misses) == (0, 0)
@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from core.config import LLMConfig, LLMProvider
+from core.llm.scheduler import LLMScheduler, RateLimiter, RequestPriority, parse_reset
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("1s", 1.0),
+        ("6m0s", 360.0),
+        ("1h2m3s", 3723.0),
+        ("7.66s", 7.66),
+        ("20ms", 0.02),
+        ("2024-06-01T12:00:30Z", 30.0),
+        ("2024-06-01T12:00:30+00:00", 30.0),
+        ("invalid", None),
+    ],
+)
+def test_parse_reset(value, expected):
+    now = datetime(2024, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+    result = parse_reset(value, now=now)
+    if expected is None:
+        assert result is None
+    else:
+        assert result == pytest.approx(expected)
+
+
+def test_limiter_tracks_openai_headers():
+    limiter = RateLimiter("test")
+
+    with patch("core.llm.scheduler.monotonic", return_value=0.0):
+        limiter.update_from_headers(
+            {
+                "x-ratelimit-limit-requests": "100",
+                "x-ratelimit-remaining-requests": "0",
+                "x-ratelimit-reset-requests": "2s",
+                "x-ratelimit-limit-tokens": "1000",
+                "x-ratelimit-remaining-tokens": "500",
+                "x-ratelimit-reset-tokens": "1s",
+            }
+        )
+
+    assert (limiter.requests.limit, limiter.tokens.limit) == (100, 1000)
+    assert limiter._retry_at(10, 1.0) == 2.0
+    assert limiter._retry_at(10, 2.0) is None
+
+
+def test_limiter_tracks_anthropic_token_headers():
+    limiter = RateLimiter("test")
+
+    with patch("core.llm.scheduler.monotonic", return_value=0.0):
+        limiter.update_from_headers(
+            {
+                "anthropic-ratelimit-tokens-limit": "1000",
+                "anthropic-ratelimit-tokens-remaining": "100",
+                "anthropic-ratelimit-tokens-reset": "2099-01-01T00:00:00Z",
+            }
+        )
+
+    assert limiter.tokens.remaining == 100
+    assert limiter._retry_at(50, 1.0) is None
+    assert limiter._retry_at(200, 1.0) == limiter.tokens.reset_at
+    # Requests larger than the whole limit are let through if nothing else is running
+    assert limiter._retry_at(2000, 1.0) is None
+
+
+def test_limiter_retry_after_blocks_requests():
+    limiter = RateLimiter("test")
+    with patch("core.llm.scheduler.monotonic", return_value=10.0):
+        limiter.update_from_headers({"retry-after": "5"})
+    assert limiter._retry_at(0, 12.0) == 15.0
+    assert limiter._retry_at(0, 15.0) is None
+
+
+@pytest.mark.asyncio
+async def test_scheduler_respects_max_concurrency_and_priority():
+    scheduler = LLMScheduler()
+    cfg = LLMConfig(provider=LLMProvider.OPENAI, model="gpt-4o", max_concurrent_requests=1)
+    order = []
+    release = asyncio.Event()
+
+    async def request(name, priority):
+        async with scheduler.slot(cfg, 10, priority):
+            order.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(request("first", RequestPriority.NORMAL))
+    await asyncio.sleep(0)
+    background = asyncio.create_task(request("background", RequestPriority.BACKGROUND))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(request("interactive", RequestPriority.INTERACTIVE))
+    await asyncio.sleep(0)
+
+    assert order == ["first"]
+    assert scheduler.stats()[0]["queued"] == 2
+
+    release.set()
+    await asyncio.gather(first, background, interactive)
+
+    assert order == ["first", "interactive", "background"]
+    assert scheduler.stats()[0]["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_attributes_headers_to_current_slot():
+    scheduler = LLMScheduler()
+    cfg = LLMConfig(provider=LLMProvider.ANTHROPIC, model="claude-3-haiku")
+
+    scheduler.update_from_headers({"x-ratelimit-remaining-requests": "0"})
+    assert scheduler.limiters == {}
+
+    async with scheduler.slot(cfg) as limiter:
+        scheduler.update_from_headers({"x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "1m"})
+
+    assert limiter.requests.remaining == 5
+
+
+@pytest.mark.asyncio
+async def test_scheduler_cancelled_waiter_does_not_leak_slot():
+    scheduler = LLMScheduler()
+    cfg = LLMConfig(provider=LLMProvider.OPENAI, model="gpt-4o", max_concurrent_requests=1)
+
+    async with scheduler.slot(cfg) as limiter:
+        waiter = asyncio.create_task(limiter.acquire(0, RequestPriority.NORMAL))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    assert limiter.in_flight == 0
+    async with scheduler.slot(cfg):
+        assert limiter.in_flight == 1
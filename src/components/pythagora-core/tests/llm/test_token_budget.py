@@ -0,0 +1,97 @@
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import pytest
+
+from core.db.models import File, FileContent
+from core.llm.token_budget import FileTokenBudget, FileView, count_file_lines, count_file_tokens, outline
+
+JS_SOURCE = """import express from 'express';
+const router = express.Router();
+
+export async function getUser(id) {
+  const user = await User.findById(id);
+  return user;
+}
+
+router.get('/users/:id', async (req, res) => {
+  res.json(await getUser(req.params.id));
+});
+
+export default router;
+"""
+
+
+def make_file(path: str, content: str, description: str = None) -> File:
+    return File(
+        path=path,
+        content=FileContent(id=f"hash-{path}", content=content),
+        meta={"description": description} if description else {},
+    )
+
+
+@pytest.fixture(autouse=True)
+def char_token_counts():
+    with patch("core.llm.token_budget.count_tokens", side_effect=len):
+        with patch("core.llm.token_budget._token_counts", {}), patch("core.llm.token_budget._line_counts", {}):
+            yield
+
+
+def test_outline_keeps_signatures():
+    assert outline(JS_SOURCE) == "\n".join(
+        [
+            "import express from 'express';",
+            "export async function getUser(id) {",
+            "router.get('/users/:id', async (req, res) => {",
+            "export default router;",
+        ]
+    )
+
+
+def test_count_file_tokens_is_cached_by_content_hash():
+    f1 = make_file("a.js", "x" * 10)
+    f2 = File(path="b.js", content=FileContent(id="hash-a.js", content="x" * 10))
+
+    with patch("core.llm.token_budget.count_tokens", side_effect=len) as mock_count:
+        assert count_file_tokens(f1) == 10
+        assert count_file_tokens(f2) == 10
+        mock_count.assert_called_once()
+
+
+def test_count_file_lines_is_cached_by_content_hash():
+    f1 = make_file("a.js", "a\nb\nc\n")
+    f2 = MagicMock(path="b.js")
+    f2.content.id = "hash-a.js"
+    type(f2.content).content = PropertyMock(side_effect=AssertionError("content was decoded"))
+
+    assert count_file_lines(f1) == 3
+    # The content of a file with the same hash is not decoded again
+    assert count_file_lines(f2) == 3
+
+
+def test_budget_keeps_full_content_when_it_fits():
+    files = [make_file("a.js", JS_SOURCE), make_file("b.js", JS_SOURCE)]
+    budget = FileTokenBudget(files, 10000)
+
+    assert budget.degraded == {}
+    assert budget.content(files[1]) == JS_SOURCE
+    assert budget.tokens_before == budget.tokens_after == 2 * len(JS_SOURCE)
+
+
+def test_budget_outlines_lowest_priority_files_first():
+    files = [make_file("a.js", JS_SOURCE), make_file("b.js", JS_SOURCE), make_file("c.js", JS_SOURCE)]
+    budget = FileTokenBudget(files, 2 * len(JS_SOURCE) + 250)
+
+    assert budget.degraded == {"c.js": FileView.OUTLINE}
+    assert budget.content(files[0]) == JS_SOURCE
+    assert budget.content(files[2]).startswith("[Outline only")
+    assert "export async function getUser(id) {" in budget.content(files[2])
+    assert budget.tokens_after <= budget.max_tokens < budget.tokens_before
+
+
+def test_budget_falls_back_to_descriptions():
+    files = [make_file("a.js", JS_SOURCE, "User routes"), make_file("b.js", JS_SOURCE, "Other routes")]
+    budget = FileTokenBudget(files, 300)
+
+    assert budget.degraded == {"a.js": FileView.OUTLINE, "b.js": FileView.DESCRIPTION}
+    assert "Other routes" in budget.content(files[1])
+    assert budget.tokens_after <= 300
@@ -1,9 +1,14 @@
 import os
+from copy import deepcopy
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from sqlalchemy import select
 
-from core.config import FileSystemConfig
+from core.config import DBConfig, FileSystemConfig
+from core.db.models import Base, LLMMessage, LLMRequest, ProjectState
+from core.db.session import SessionManager
+from core.llm.request_log import LLMRequestLog
 from core.state.state_manager import StateManager
 
 
@@ -31,7 +36,7 @@ async def test_create_project(mock_get_config, testmanager):
     assert sm.current_state == initial_state
 
     projects = await sm.list_projects()
-    assert projects == [project]
+    assert [p.id for p in projects] == [project.id]
 
 
 @pytest.mark.asyncio
@@ -54,7 +59,7 @@ async def test_delete_project(mock_get_config, testmanager):
     project = await sm.create_project("test")
 
     projects = await sm.list_projects()
-    assert projects == [project]
+    assert [p.id for p in projects] == [project.id]
 
     await sm.delete_project(project.id)
     projects = await sm.list_projects()
@@ -161,6 +166,52 @@ async def test_save_file(mock_get_config, testmanager):
     assert file.content.content == "Hello, world!"
 
 
+@pytest.mark.asyncio
+@patch("core.state.state_manager.get_config")
+async def test_save_files(mock_get_config, testmanager):
+    mock_get_config.return_value.fs.type = "memory"
+    sm = StateManager(testmanager)
+    await sm.create_project("test")
+    await sm.commit()
+
+    await sm.save_files(
+        {"a.txt": "Same", "b.txt": "Same", "c.txt": "Other"},
+        metadata={"c.txt": {"description": "Other file"}},
+    )
+    await sm.commit()
+
+    assert sm.file_system.list() == ["a.txt", "b.txt", "c.txt"]
+    files = {file.path: file for file in sm.current_state.files}
+    assert files["a.txt"].content is files["b.txt"].content
+    assert files["c.txt"].content.content == "Other"
+    assert files["c.txt"].meta == {"description": "Other file"}
+    assert files["a.txt"].meta == {}
+
+
+@pytest.mark.asyncio
+@patch("core.state.state_manager.get_config")
+async def test_commit_releases_old_states(mock_get_config, testmanager):
+    mock_get_config.return_value.fs.type = "memory"
+    sm = StateManager(testmanager)
+    await sm.create_project("test")
+    await sm.commit()
+
+    await sm.save_file("test.txt", "Hello, world!")
+    first = await sm.commit()
+    await sm.save_file("other.txt", "Other")
+    second = await sm.commit()
+
+    # Only the previous state is kept around
+    assert "prev_state" not in first.__dict__
+    assert second.__dict__["prev_state"] is first
+
+    # File contents are available without loading them
+    assert {f.path: f.content.content for f in sm.next_state.files} == {
+        "test.txt": "Hello, world!",
+        "other.txt": "Other",
+    }
+
+
 @pytest.mark.asyncio
 @patch("core.state.state_manager.get_config")
 async def test_importing_changed_files_to_db(mock_get_config, tmpdir, testmanager):
@@ -220,3 +271,105 @@ async def test_restoring_files_from_db(mock_get_config, tmpdir, testmanager):
         assert open(os.path.join(tmpdir, "test1", "file1.txt")).read() == "this is the content 1"
         assert open(os.path.join(tmpdir, "test1", "file2.txt")).read() == "this is the content 2"
         assert open(os.path.join(tmpdir, "test1", "file3.txt")).read() == "this is the content 3"
+
+
+@pytest.mark.asyncio
+@patch("core.state.state_manager.get_config")
+async def test_commit_stores_deltas(mock_get_config):
+    mock_get_config.return_value.fs.type = "memory"
+    manager = SessionManager(DBConfig(url="sqlite+aiosqlite:///:memory:", state_snapshot_interval=3))
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    sm = StateManager(manager)
+    project = await sm.create_project("test")
+    project_id = project.id
+
+    expected = {}
+    for i in range(8):
+        state = sm.next_state
+        state.tasks.append({"description": f"Task {i}", "status": "todo"})
+        state.flag_tasks_as_modified()
+        state.modified_files = {**state.modified_files, f"src/file{i}.js": "old"}
+        state.relevant_files = [f"src/file{i}.js"]
+        if i == 5:
+            state.steps = [{"type": "command"}]
+            state.knowledge_base = {"pages": ["a/b"]}
+        committed = await sm.commit()
+        expected[committed.step_index] = {
+            field: deepcopy(getattr(committed, field))
+            for field in ["tasks", "modified_files", "relevant_files", "steps"]
+        }
+        assert committed.tasks[-1]["description"] == f"Task {i}"
+
+    rows = (
+        await sm.current_session.execute(select(ProjectState.step_index, ProjectState.delta, ProjectState.tasks))
+    ).all()
+    for step_index, delta, tasks in rows:
+        if step_index not in expected:
+            continue
+        if step_index == 1 or step_index % 3 == 0:
+            assert delta is None
+            assert len(tasks) == step_index
+        else:
+            assert delta["tasks"] == [
+                {"op": "add", "path": f"/{step_index - 1}", "value": expected[step_index]["tasks"][-1]}
+            ]
+            assert tasks == []
+
+    # Loading a step deletes the steps after it, so go backwards
+    for step_index, values in sorted(expected.items(), reverse=True):
+        state = await sm.load_project(project_id=project_id, step_index=step_index)
+        for field, value in values.items():
+            assert getattr(state, field) == value, f"{field} at step {step_index}"
+
+        # States loaded from the database can be used as the base for new deltas
+        if step_index == 4:
+            sm.next_state.tasks[0]["status"] = "done"
+            sm.next_state.flag_tasks_as_modified()
+            await sm.commit()
+            state = await sm.load_project(project_id=project_id)
+            assert state.step_index == 5
+            assert state.delta is not None
+            assert state.tasks[0]["status"] == "done"
+            assert len(state.tasks) == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("db_file", [False, True])
+@patch("core.state.state_manager.get_config")
+async def test_log_llm_request(mock_get_config, db_file, tmp_path):
+    mock_get_config.return_value.fs.type = "memory"
+    # In-memory database is written in the foreground, database files in the background
+    url = f"sqlite+aiosqlite:///{tmp_path / 'test.db'}" if db_file else "sqlite+aiosqlite:///:memory:"
+    manager = SessionManager(DBConfig(url=url))
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    sm = StateManager(manager)
+    project = await sm.create_project("test")
+    assert sm.request_writer.background == db_file
+
+    system = {"role": "system", "content": "You are a helpful assistant."}
+    for i in range(3):
+        messages = [system, {"role": "user", "content": f"Request {i}"}]
+        await sm.log_llm_request(LLMRequestLog(provider="openai", model="gpt-4o", temperature=0.5, messages=messages))
+        await sm.commit()
+
+    # Nothing is written to the main session
+    assert not any(isinstance(obj, LLMRequest) for obj in sm.current_session.new)
+
+    await sm.flush_llm_requests()
+    async with manager as session:
+        requests = (await session.execute(select(LLMRequest).order_by(LLMRequest.id))).scalars().all()
+        assert [(await r.get_messages(session))[-1]["content"] for r in requests] == [
+            "Request 0",
+            "Request 1",
+            "Request 2",
+        ]
+        assert len((await session.execute(select(LLMMessage))).all()) == 4
+
+    await sm.delete_project(project.id)
+    async with manager as session:
+        assert (await session.execute(select(LLMMessage))).all() == []
+    await manager.engine.dispose()